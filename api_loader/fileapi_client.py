@@ -1,12 +1,17 @@
 import re
-import io
-import json
+import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Dict, Any, List
 
 import requests
-import streamlit as st
-from huggingface_hub import HfApi, hf_hub_url
+
+from utils import metrics
+from utils.secrets import get_secret
+from api_loader.frame_store import decode_png, get_publish_store
+from utils.tiles import DEFAULT_TILE_PX, build_tile_pack
+from utils.mosaic import Mosaic, get_mosaic_index
+from utils.station_registry import stations_from_config
 
 FILEAPI_BASE = "https://opendata.cwa.gov.tw/fileapi/v1/opendataapi"
 
@@ -51,19 +56,115 @@ def parse_fileapi_image(j: Dict[str, Any]) -> List[dict]:
     return ([{"obsTime": t, "imageUrl": url, "desc": desc}] if url else [])
 
 
-def ensure_latest_to_hf_streaming(cfg: Dict[str, Any], max_age_minutes: int = 2, debug: bool = False) -> Optional[dict]:
+def _format_utc_z(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _fetch_station_image(
+    base_url: str,
+    api_key: str,
+    dataset: str,
+    prev: Optional[dict] = None,
+    timeout: int = 20,
+    debug: bool = False,
+    tile_px: Optional[int] = None,
+    decode: bool = False,
+) -> Optional[dict]:
+    """
+    單站：取 JSON → 解析 → 視需要下載 PNG bytes。
+    - prev：上一版 meta.json 的 frames[dataset]（obs_time_utc / rev / sha256）
+    - obsTime 與上一版相同 → 不下載；下載後 sha256 相同 → 不上傳
+    - rev：已發布檔案的版本（內容有變那一刻的 obsTime）；內容沒變時沿用上一版，
+      obs_time_utc 則一律是 CWA 最新的觀測時間
+    - tile_px：有給時，新圖順便產生 tile 金字塔（由解碼後的 dBZ 格點產生；每張圖只編碼一次）
+    - decode：新圖順便解碼成 dBZ 格點（給全台拼圖與本地 store 用）
+    回傳 {'obs_time_utc','rev','imageUrl','sha256','bytes'/'tiles'/'dbz'(僅有變動時),'changed'}；無資料回 None。
+    """
+    with metrics.span("ingest.fetch_json", dataset=dataset):
+        items = parse_fileapi_image(fetch_fileapi_json(base_url, api_key, dataset, timeout=timeout, debug=debug))
+    if not items or not items[0].get("imageUrl") or not items[0].get("obsTime"):
+        if debug: print(f"[ensure_latest_to_hf_streaming] {dataset} 無資料")
+        return None
+    prev = prev or {}
+    url = items[0]["imageUrl"]
+    obs = _format_utc_z(_parse_obs_time_iso8601(items[0]["obsTime"]))
+    prev_rev = prev.get("rev") or prev.get("obs_time_utc")
+    item = {"obs_time_utc": obs, "rev": prev_rev, "imageUrl": url, "sha256": prev.get("sha256"), "changed": False}
+    if prev.get("obs_time_utc") == obs and prev.get("sha256"):
+        metrics.inc("ingest_frames_total", dataset=dataset, result="same_obs_time")
+        return item
+
+    with metrics.span("ingest.download_png", dataset=dataset):
+        img_bytes = _download_image_bytes(url, timeout=timeout)
+    metrics.inc("bytes_fetched_total", len(img_bytes), source="cwa_png")
+    sha = hashlib.sha256(img_bytes).hexdigest()
+    item["sha256"] = sha
+    if sha != prev.get("sha256"):
+        item.update(bytes=img_bytes, rev=obs, changed=True)
+        dbz = None
+        if decode or tile_px:
+            with metrics.span("ingest.decode", dataset=dataset):
+                dbz = decode_png(img_bytes)
+        if decode:
+            item["dbz"] = dbz
+        if tile_px:
+            with metrics.span("ingest.build_tiles", dataset=dataset):
+                item["tiles"] = build_tile_pack(dbz, tile_px)
+    metrics.inc("ingest_frames_total", dataset=dataset, result="changed" if item["changed"] else "same_sha256")
+    return item
+
+
+def _build_mosaic(cfg: Dict[str, Any], store, frames: Dict[str, dict], decoded: Dict[str, Any]) -> Mosaic:
+    """
+    ### 各站最新格點 → 全台拼圖（utils.mosaic）
+    - decoded：本輪剛解碼的站 {id: int8 dBZ}；其餘站從 store 讀上一版
+    - obs_time 取各站最新的一個（任何一站更新，拼圖 revision 就會變）
+    """
+    stations = stations_from_config(cfg)
+    index = get_mosaic_index(cfg, stations)
+    dbz = dict(decoded)
+    for s in stations:
+        if s.id in dbz or s.id not in frames:
+            continue
+        try:
+            dbz[s.id] = store.get_frame(s.id).dbz
+        except Exception as e:
+            print(f"[mosaic] 讀取 {s.id} 失敗，拼圖略過此站：{e}")
+    if not dbz:
+        raise RuntimeError("沒有可用的雷達格點")
+    obs = max(frames[ds]["obs_time_utc"] for ds in dbz)
+    return Mosaic(obs, index.geom, index.merge(dbz))
+
+
+def ensure_latest_to_hf_streaming(
+    cfg: Dict[str, Any],
+    max_age_minutes: int = 2,
+    debug: bool = False,
+    still_leader: Optional[Callable[[], bool]] = None,
+) -> Optional[dict]:
     """
     更新邏輯（不分日期資料夾）：
-      1. 從 HF 讀取現有 meta.json（若沒有 → 視為需更新）
+      1. 從 frame store（cfg['frame_store']，預設 HF；shm 時改用 shm.source）讀取現有 meta.json（若沒有 → 視為需更新）
       2. 比對 meta.json["obs_time_utc"] 是否超過 max_age_minutes
-      3. 若需要更新 → 下載 CWA 最新各 dataset 的 PNG（bytes）並覆蓋上傳
+      3. 若需要更新 → 以 thread pool 並行下載 CWA 最新各 dataset 的 PNG（bytes），
+         obsTime 或內容 sha256 與 meta.json["frames"] 相同的站直接略過，
+         再把有變動的 PNG 與 meta.json 一次發布（HF：單一 commit；local：最後才換 meta.json）
          - PNG 路徑：CWA_dataset/radar_new_png/{dataset_id}.png
          - META 路徑：CWA_dataset/radar_new_png/meta.json
       4. 回傳狀態資訊
+    - still_leader：發布前呼叫；回傳 False（已不是 ingest leader）時不發布
     """
+    metrics.configure(cfg)
+    with metrics.span("ingest.refresh"):
+        return _ensure_latest(cfg, max_age_minutes, debug, still_leader)
+
+
+def _ensure_latest(
+    cfg: Dict[str, Any], max_age_minutes: int, debug: bool, still_leader: Optional[Callable[[], bool]] = None
+) -> Optional[dict]:
     c = cfg["fileapi"]
     base_url = c.get("base_url", FILEAPI_BASE)
-    api_key = st.secrets["CWA_API_KEY"]
+    api_key = get_secret("CWA_API_KEY")
     timeout = int(c.get("timeout", 20))
 
     datasets: List[str] = [
@@ -73,37 +174,33 @@ def ensure_latest_to_hf_streaming(cfg: Dict[str, Any], max_age_minutes: int = 2,
     if not datasets:
         raise RuntimeError("cfg['fileapi']['datasets'] 為空，請設定至少一個 dataset id")
     
-    repo_id = st.secrets["HF_REPO_ID"]
-    hf_token = st.secrets["HF_TOKEN"]
-    api = HfApi(token=hf_token)
-    prefix = "radar_new_png"
-
-    # === 讀取 HF 既有 meta.json ===
-    meta_url = hf_hub_url(repo_id=repo_id, filename=f"{prefix}/meta.json", repo_type="dataset")
-    headers = {"authorization": f"Bearer {hf_token}"}
+    store = get_publish_store(cfg)
+    prefix = getattr(store, "prefix", store.name)
+
+    # === 讀取已發布的 meta.json ===
     need_update = True
     last_obs_time_str = None
     age_min = None
+    prev_meta: Dict[str, Any] = {}
 
     try:
-        r = requests.get(meta_url, headers=headers, timeout=timeout)
-        if r.status_code == 200:
-            meta = r.json()
-            last_obs_time_str = meta.get("obs_time_utc")
-            if last_obs_time_str:
-                last_dt = _parse_obs_time_iso8601(last_obs_time_str)
-                now_utc = datetime.now(timezone.utc)
-                age = now_utc - last_dt
-                age_min = round(age.total_seconds() / 60.0, 2)
-                need_update = age > timedelta(minutes=max_age_minutes)
-                if debug:
-                    print(f"[HF-meta] last={last_dt} age(min)={age_min} need_update={need_update}")
-        else:
+        with metrics.span("ingest.read_meta", store=store.name):
+            prev_meta = store.get_meta(force=True)
+        last_obs_time_str = prev_meta.get("obs_time_utc")
+        if last_obs_time_str:
+            last_dt = _parse_obs_time_iso8601(last_obs_time_str)
+            now_utc = datetime.now(timezone.utc)
+            age = now_utc - last_dt
+            age_min = round(age.total_seconds() / 60.0, 2)
+            metrics.set_gauge("published_frame_age_seconds", age.total_seconds())
+            need_update = age > timedelta(minutes=max_age_minutes)
             if debug:
-                print(f"[HF-meta] 無現有 meta.json（status={r.status_code}），視為需更新")
+                print(f"[{store.name}-meta] last={last_dt} age(min)={age_min} need_update={need_update}")
+        elif debug:
+            print(f"[{store.name}-meta] 無現有 meta.json，視為需更新")
     except Exception as e:
         if debug:
-            print(f"[HF-meta] 無法讀取 meta.json：{e}")
+            print(f"[{store.name}-meta] 無法讀取 meta.json：{e}")
         need_update = True
 
     # === 若時間在 10 分內，就不更新 ===
@@ -115,54 +212,93 @@ def ensure_latest_to_hf_streaming(cfg: Dict[str, Any], max_age_minutes: int = 2,
             "hf_path_prefix": prefix
         }
 
-    # === 超過時 → 重新抓最新 CWA 圖片 ===
-    ds0 = datasets[0]
-    j0 = fetch_fileapi_json(base_url, api_key, ds0, timeout=timeout, debug=debug)
-    items0 = parse_fileapi_image(j0)
-    if not items0:
+    # === 超過時 → 並行抓各站最新 JSON；只有 obsTime 變了才下載 PNG ===
+    prev_frames = prev_meta.get("frames") or {}
+    tc = cfg.get("tiles") or {}
+    tile_px = int(tc.get("tile_px", DEFAULT_TILE_PX)) if tc.get("enabled", False) else None
+    mosaic_on = bool((cfg.get("mosaic") or {}).get("enabled", False))
+    decode = mosaic_on or store.name == "local"   # 本地 store 存解碼後格點：在抓取執行緒順便解碼，發布時不再解一次
+    max_workers = max(1, min(len(datasets), int(c.get("max_workers", 8))))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futs = {
+            pool.submit(_fetch_station_image, base_url, api_key, ds, prev_frames.get(ds), timeout, debug, tile_px, decode): ds
+            for ds in datasets
+        }
+        fetched: Dict[str, dict] = {}
+        for fut in as_completed(futs):
+            ds = futs[fut]
+            try:
+                item = fut.result()
+            except Exception as e:
+                metrics.inc("ingest_frames_total", dataset=ds, result="failed")
+                if debug: print(f"[ensure_latest_to_hf_streaming] 抓取 {ds} 失敗：{e}")
+                continue
+            if item:
+                fetched[ds] = item
+
+    # 依 config 順序整理；obs_time 以第一個成功的站為準
+    available = [ds for ds in datasets if ds in fetched]
+    if not available:
         if debug: print("[ensure_latest_to_hf_streaming] CWA 無資料")
         return None
-    obs_time_str = items0[0].get("obsTime")
-    obs_dt_utc = _parse_obs_time_iso8601(obs_time_str)
-
-    urls_map, uploaded = {}, []
-    for ds in datasets:
-        j2 = fetch_fileapi_json(base_url, api_key, ds, timeout=timeout, debug=debug)
-        items2 = parse_fileapi_image(j2)
-        if not items2:
-            if debug: print(f"[ensure_latest_to_hf_streaming] {ds} 無資料")
-            continue
-        url2 = items2[0].get("imageUrl")
-        if not url2:
-            continue
-        try:
-            img_bytes = _download_image_bytes(url2, timeout=timeout)
-            api.upload_file(
-                repo_id=repo_id,
-                path_or_fileobj=io.BytesIO(img_bytes),
-                path_in_repo=f"{prefix}/{ds}.png",
-                repo_type="dataset"
-            )
-            uploaded.append(ds)
-            urls_map[ds] = url2
-            if debug: print(f"[ensure_latest_to_hf_streaming] uploaded {ds}.png")
-        except Exception as e:
-            if debug: print(f"上傳 {ds} 失敗：{e}")
+    changed = [ds for ds in available if fetched[ds]["changed"]]
+    obs_time_utc = fetched[available[0]]["obs_time_utc"]
+
+    # 抓取失敗的站沿用上一版紀錄
+    frames = {ds: prev_frames[ds] for ds in datasets if ds in prev_frames and ds not in fetched}
+    for ds in available:
+        it = fetched[ds]
+        frames[ds] = {"obs_time_utc": it["obs_time_utc"], "rev": it["rev"], "sha256": it["sha256"], "url": it["imageUrl"]}
+        if it.get("tiles") or (not it["changed"] and (prev_frames.get(ds) or {}).get("tiles")):
+            frames[ds]["tiles"] = True
+
+    need_mosaic = mosaic_on and not prev_meta.get("mosaic")
+    if not changed and not need_mosaic and frames == prev_frames and obs_time_utc == last_obs_time_str:
+        if debug: print("[ensure_latest_to_hf_streaming] CWA 尚無新圖，不上傳")
+        return {
+            "need_update": False,
+            "obs_time_utc": last_obs_time_str,
+            "age_minutes": age_min,
+            "hf_path_prefix": prefix,
+            "changed": [],
+        }
 
-    # === 上傳新的 meta.json ===
+    # === 有變動的 PNG + meta.json 一次發布（讀取端不會看到更新一半的組合） ===
     new_meta = {
-        "obs_time_utc": obs_dt_utc.replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+        "obs_time_utc": obs_time_utc,
         "source": "CWA FileAPI",
-        "datasets": uploaded,
-        "urls": urls_map,
+        "datasets": [ds for ds in datasets if ds in frames],
+        "urls": {ds: f["url"] for ds, f in frames.items()},
+        "frames": frames,
     }
-    meta_bytes = io.BytesIO(json.dumps(new_meta, ensure_ascii=False, indent=2).encode("utf-8"))
-    api.upload_file(
-        repo_id=repo_id,
-        path_or_fileobj=meta_bytes,
-        path_in_repo=f"{prefix}/meta.json",
-        repo_type="dataset"
-    )
+
+    # === 全台拼圖：有變動的站用剛解碼的格點，其餘讀已發布的版本；失敗時沿用上一版 ===
+    mosaic = None
+    if mosaic_on and (changed or need_mosaic):
+        try:
+            with metrics.span("ingest.mosaic"):
+                mosaic = _build_mosaic(cfg, store, frames, {ds: fetched[ds]["dbz"] for ds in changed})
+            new_meta["mosaic"] = mosaic.meta()
+        except Exception as e:
+            if debug: print(f"[ensure_latest_to_hf_streaming] 拼圖失敗：{e}")
+    if "mosaic" not in new_meta and prev_meta.get("mosaic"):
+        new_meta["mosaic"] = prev_meta["mosaic"]
+
+    if still_leader is not None and not still_leader():
+        if debug: print("[ensure_latest_to_hf_streaming] 已不是 leader，不發布")
+        return {"need_update": False, "obs_time_utc": last_obs_time_str, "age_minutes": age_min,
+                "hf_path_prefix": prefix, "changed": [], "lost_leader": True}
+
+    with metrics.span("ingest.publish", store=store.name):
+        store.put_frames(
+            {ds: fetched[ds]["bytes"] for ds in changed},
+            new_meta,
+            tiles={ds: fetched[ds]["tiles"] for ds in changed if fetched[ds].get("tiles")},
+            mosaic=mosaic.dbz if mosaic is not None else None,
+            decoded={ds: fetched[ds]["dbz"] for ds in changed if "dbz" in fetched[ds]},
+        )
+    metrics.set_gauge("published_frame_age_seconds",
+                      (datetime.now(timezone.utc) - _parse_obs_time_iso8601(obs_time_utc)).total_seconds())
 
     if debug:
         print(f"[ensure_latest_to_hf_streaming] 覆蓋更新完成 → obs={new_meta['obs_time_utc']}")
@@ -171,5 +307,6 @@ def ensure_latest_to_hf_streaming(cfg: Dict[str, Any], max_age_minutes: int = 2,
         "need_update": True,
         "obs_time_utc": new_meta["obs_time_utc"],
         "age_minutes": 0.0,
-        "hf_path_prefix": prefix
+        "hf_path_prefix": prefix,
+        "changed": changed,
     }
\ No newline at end of file
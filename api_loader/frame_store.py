@@ -0,0 +1,345 @@
+from __future__ import annotations
+import io
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from utils import metrics
+from utils.frame_cache import RadarFrame
+from utils.mosaic import MOSAIC_ID
+from utils.palette import get_palette_decoder
+from utils.secrets import get_secret
+
+DEFAULT_BACKEND = "hf"
+DEFAULT_LOCAL_DIR = "frame_store"
+DEFAULT_KEEP_REVISIONS = 6
+
+
+def decode_png(data: bytes | str | Path) -> np.ndarray:
+    """PNG（bytes 或路徑）→ int8 dBZ 格點"""
+    src = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    with Image.open(src) as img:
+        return get_palette_decoder().decode(np.asarray(img.convert("RGB")))
+
+
+class FrameReader(ABC):
+    """
+    ### 雷達圖讀取介面（唯讀；shm 鏡像只實作這一層）
+    - get_frame：讀單站最新 revision，回傳解碼後的 RadarFrame
+    - get_tiles：單站最新 revision 的 tile 金字塔（utils.tiles，ingest 時產生；沒有則 None）
+    - get_mosaic：最新的全台拼圖格點（utils.mosaic，ingest 時產生；沒有則 None），幾何在 meta["mosaic"]
+    - get_meta / revision / list_revisions：查詢已發布的版本
+    """
+
+    name = ""
+
+    @abstractmethod
+    def get_meta(self, force: bool = False) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get_frame(self, dataset_id: str) -> RadarFrame:
+        ...
+
+    @abstractmethod
+    def get_tiles(self, dataset_id: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def get_mosaic(self) -> Optional[np.ndarray]:
+        ...
+
+    @abstractmethod
+    def list_revisions(self, dataset_id: str) -> List[str]:
+        ...
+
+    def revision(self, dataset_id: str, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """單站 revision：meta["frames"][id]["rev"]（已發布檔案的版本，內容沒變時不隨 obs_time_utc 前進；舊版 meta 退回 obs_time_utc）。"""
+        meta = self.get_meta() if meta is None else meta
+        frame = (meta.get("frames") or {}).get(dataset_id) or {}
+        return frame.get("rev") or frame.get("obs_time_utc") or meta.get("obs_time_utc")
+
+    def mosaic_revision(self, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """拼圖 revision：meta["mosaic"]["obs_time_utc"]（沒有拼圖 → None）"""
+        meta = self.get_meta() if meta is None else meta
+        return (meta.get("mosaic") or {}).get("obs_time_utc")
+
+
+class FrameStore(FrameReader):
+    """
+    ### 可發布的雷達圖儲存（hf / local）
+    - put_frames：一次發布多站 PNG + meta.json（讀取端只會看到完整的一組）
+    """
+
+    @abstractmethod
+    def put_frames(
+        self,
+        frames: Dict[str, bytes],
+        meta: Dict[str, Any],
+        tiles: Optional[Dict[str, bytes]] = None,
+        mosaic: Optional[np.ndarray] = None,
+        decoded: Optional[Dict[str, np.ndarray]] = None,
+    ) -> None:
+        """decoded：呼叫端已解碼好的 {dataset_id: int8 dBZ}（有給的站不再解碼）"""
+
+    def put_frame(self, dataset_id: str, png_bytes: bytes, meta: Dict[str, Any], tiles: Optional[bytes] = None) -> None:
+        self.put_frames({dataset_id: png_bytes}, meta, {dataset_id: tiles} if tiles else None)
+
+
+def _npy_bytes(arr: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    np.save(buf, arr)
+    return buf.getvalue()
+
+
+class HFFrameStore(FrameStore):
+    """Hugging Face dataset repo（radar_new_png/*.png + meta.json）"""
+
+    name = "hf"
+
+    def __init__(self, repo_id: str, token: Optional[str], cfg: Optional[Dict[str, Any]] = None):
+        from api_loader.hf_fetch import get_hf_fetcher
+
+        self.repo_id = repo_id
+        self.token = token
+        self.fetcher = get_hf_fetcher(repo_id, token, cfg)
+        self.prefix = self.fetcher.prefix
+
+    def get_meta(self, force: bool = False) -> Dict[str, Any]:
+        return self.fetcher.get_meta(force=force)
+
+    def get_frame(self, dataset_id: str) -> RadarFrame:
+        try:
+            with metrics.span("frame_store.download", store=self.name, dataset=dataset_id):
+                img_path = self.fetcher.fetch_png(dataset_id)
+        except Exception as e:
+            raise FileNotFoundError(f"❌ 從 Hugging Face Hub 下載圖檔失敗：{e}")
+        with metrics.span("frame_store.decode", store=self.name, dataset=dataset_id):
+            dbz = decode_png(img_path)
+        return RadarFrame(dataset_id, self.revision(dataset_id), dbz, image_path=img_path)
+
+    def get_tiles(self, dataset_id: str) -> Optional[bytes]:
+        if not ((self.get_meta().get("frames") or {}).get(dataset_id) or {}).get("tiles"):
+            return None
+        with open(self.fetcher.fetch_file(dataset_id, ".tiles.zip"), "rb") as f:
+            return f.read()
+
+    def get_mosaic(self) -> Optional[np.ndarray]:
+        rev = self.mosaic_revision()
+        if rev is None:
+            return None
+        return np.load(self.fetcher.fetch_file(MOSAIC_ID, ".npy", rev=rev))
+
+    def put_frames(
+        self,
+        frames: Dict[str, bytes],
+        meta: Dict[str, Any],
+        tiles: Optional[Dict[str, bytes]] = None,
+        mosaic: Optional[np.ndarray] = None,
+        decoded: Optional[Dict[str, np.ndarray]] = None,
+    ) -> None:
+        from huggingface_hub import CommitOperationAdd, HfApi
+
+        operations = [
+            CommitOperationAdd(path_in_repo=f"{self.prefix}/{ds}.png", path_or_fileobj=data)
+            for ds, data in frames.items()
+        ]
+        operations += [
+            CommitOperationAdd(path_in_repo=f"{self.prefix}/{ds}.tiles.zip", path_or_fileobj=data)
+            for ds, data in (tiles or {}).items()
+        ]
+        if mosaic is not None:
+            operations.append(CommitOperationAdd(path_in_repo=f"{self.prefix}/{MOSAIC_ID}.npy", path_or_fileobj=_npy_bytes(mosaic)))
+        operations.append(CommitOperationAdd(
+            path_in_repo=f"{self.prefix}/meta.json",
+            path_or_fileobj=json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8"),
+        ))
+        HfApi(token=self.token).create_commit(
+            repo_id=self.repo_id,
+            operations=operations,
+            commit_message=f"radar update obs={meta.get('obs_time_utc')} changed={','.join(frames) or '-'}",
+            repo_type="dataset",
+        )
+
+    def list_revisions(self, dataset_id: str) -> List[str]:
+        # HF 上同一路徑每次覆蓋，只保留最新一版
+        rev = self.revision(dataset_id)
+        return [rev] if rev else []
+
+
+def _rev_name(rev: str) -> str:
+    """obs_time_utc → 檔名安全的字串（2025-10-23T06:42:00Z → 20251023T064200Z）"""
+    return rev.replace("-", "").replace(":", "")
+
+
+def _rev_from_name(name: str) -> str:
+    """20251023T064200Z → 2025-10-23T06:42:00Z"""
+    d, t = name.split("T", 1)
+    return f"{d[:4]}-{d[4:6]}-{d[6:8]}T{t[:2]}:{t[2:4]}:{t[4:]}"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class LocalFrameStore(FrameStore):
+    """
+    ### 本地目錄儲存（零網路）
+    - {root}/meta.json
+    - {root}/{dataset_id}/{rev}.npy：解碼後的 int8 dBZ，讀取時 np.load(mmap_mode="r")
+    - {root}/{dataset_id}/{rev}.png：原始 PNG（預覽用）
+    - {root}/{dataset_id}/{rev}.tiles.zip：tile 金字塔（有產生時）
+    - {root}/mosaic/{rev}.npy：全台拼圖（有產生時）
+    - 每站保留最近 keep 個 revision
+    """
+
+    name = "local"
+
+    def __init__(self, root: str | Path = DEFAULT_LOCAL_DIR, keep: int = DEFAULT_KEEP_REVISIONS):
+        self.root = Path(root)
+        self.keep = max(1, int(keep))
+        self._meta: Dict[str, Any] = {}
+        self._meta_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _paths(self, dataset_id: str, rev: str) -> tuple:
+        d = self.root / dataset_id
+        name = _rev_name(rev)
+        return d / f"{name}.npy", d / f"{name}.png", d / f"{name}.tiles.zip"
+
+    def get_meta(self, force: bool = False) -> Dict[str, Any]:
+        p = self.root / "meta.json"
+        try:
+            mtime = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if force or mtime != self._meta_mtime:
+                with open(p, "r", encoding="utf-8") as f:
+                    self._meta = json.load(f)
+                self._meta_mtime = mtime
+            return self._meta
+
+    def get_frame(self, dataset_id: str) -> RadarFrame:
+        rev = self.revision(dataset_id)
+        if rev is None:
+            raise FileNotFoundError(f"❌ 本地快取沒有 {dataset_id}")
+        npy, png, _ = self._paths(dataset_id, rev)
+        if not npy.exists():
+            raise FileNotFoundError(f"❌ 本地快取缺少 {npy}")
+        with metrics.span("frame_store.load", store=self.name, dataset=dataset_id):
+            dbz = np.load(npy, mmap_mode="r")
+        return RadarFrame(dataset_id, rev, dbz, image_path=str(png) if png.exists() else None)
+
+    def get_tiles(self, dataset_id: str) -> Optional[bytes]:
+        rev = self.revision(dataset_id)
+        if rev is None:
+            return None
+        try:
+            return self._paths(dataset_id, rev)[2].read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def get_mosaic(self) -> Optional[np.ndarray]:
+        rev = self.mosaic_revision()
+        if rev is None:
+            return None
+        try:
+            return np.load(self._paths(MOSAIC_ID, rev)[0], mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+    def put_frames(
+        self,
+        frames: Dict[str, bytes],
+        meta: Dict[str, Any],
+        tiles: Optional[Dict[str, bytes]] = None,
+        mosaic: Optional[np.ndarray] = None,
+        decoded: Optional[Dict[str, np.ndarray]] = None,
+    ) -> None:
+        # 先寫各站檔案（新 revision 檔名，不覆蓋讀取中的舊檔），最後才換 meta.json
+        for ds, data in frames.items():
+            rev = self.revision(ds, meta)
+            npy, png, zp = self._paths(ds, rev)
+            npy.parent.mkdir(parents=True, exist_ok=True)
+            dbz = (decoded or {}).get(ds)
+            _atomic_write(npy, _npy_bytes(dbz if dbz is not None else decode_png(data)))
+            _atomic_write(png, data)
+            if tiles and tiles.get(ds):
+                _atomic_write(zp, tiles[ds])
+        if mosaic is not None:
+            npy = self._paths(MOSAIC_ID, self.mosaic_revision(meta))[0]
+            npy.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write(npy, _npy_bytes(mosaic))
+        self.root.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self.root / "meta.json", json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8"))
+        for ds in frames:
+            self._prune(ds)
+        if mosaic is not None:
+            self._prune(MOSAIC_ID)
+
+    def _prune(self, dataset_id: str) -> None:
+        for old in self.list_revisions(dataset_id)[:-self.keep]:
+            for p in self._paths(dataset_id, old):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def list_revisions(self, dataset_id: str) -> List[str]:
+        d = self.root / dataset_id
+        if not d.is_dir():
+            return []
+        return sorted(_rev_from_name(p.stem) for p in d.glob("*.npy"))
+
+
+_stores: Dict[str, FrameReader] = {}
+_stores_lock = threading.Lock()
+
+
+def get_frame_store(cfg: Optional[Dict[str, Any]] = None, backend: Optional[str] = None) -> FrameReader:
+    """
+    ### 依 cfg['frame_store'] 取得共用的 store（讀取用；shm 只能讀，發布請用 get_publish_store）
+    #### para:
+    - backend: 覆寫 config 的 backend（"hf" | "local" | "shm"），例如設定頁的選擇
+    """
+    c = (cfg or {}).get("frame_store") or {}
+    backend = (backend or c.get("backend") or DEFAULT_BACKEND).lower()
+    with _stores_lock:
+        store = _stores.get(backend)
+        if store is None:
+            if backend == "hf":
+                store = HFFrameStore(get_secret("HF_REPO_ID"), get_secret("HF_TOKEN", None), cfg)
+            elif backend == "local":
+                store = LocalFrameStore(c.get("local_dir", DEFAULT_LOCAL_DIR), keep=c.get("keep_revisions", DEFAULT_KEEP_REVISIONS))
+            elif backend == "shm":
+                from api_loader.shm_store import DEFAULT_SHM_DIR, ShmFrameStore
+                store = ShmFrameStore(((cfg or {}).get("shm") or {}).get("dir") or DEFAULT_SHM_DIR)
+            else:
+                raise ValueError(f"未知的 frame_store.backend：{backend}（可用 hf / local / shm）")
+            _stores[backend] = store
+        return store
+
+
+def get_publish_store(cfg: Optional[Dict[str, Any]] = None) -> FrameStore:
+    """
+    ### ingest 發布用的 store
+    - frame_store.backend 為唯讀的 shm 時改用 shm.source（預設 hf）
+    - 解析結果仍是 shm（shm.source: shm）→ ValueError
+    """
+    backend = ((cfg or {}).get("frame_store") or {}).get("backend") or DEFAULT_BACKEND
+    if backend == "shm":
+        backend = ((cfg or {}).get("shm") or {}).get("source") or DEFAULT_BACKEND
+    store = get_frame_store(cfg, backend)
+    if not isinstance(store, FrameStore):
+        raise ValueError(f"frame store「{store.name}」是唯讀的，不能發布；請把 shm.source 設為 hf 或 local")
+    return store
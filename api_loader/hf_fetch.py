@@ -0,0 +1,151 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from huggingface_hub import hf_hub_download, hf_hub_url, try_to_load_from_cache
+
+from utils import metrics
+
+DEFAULT_PREFIX = "radar_new_png"
+DEFAULT_FRESHNESS_S = 60
+
+
+class HFRadarFetcher:
+    """
+    ### HF 雷達圖讀取層（取代 force_download=True）
+    - meta.json：每個 freshness 視窗最多檢查一次，帶 If-None-Match 做條件式請求
+    - PNG：只有該站 revision（meta 內容）變了才呼叫 hf_hub_download；
+      hf_hub_download 本身會比對 ETag，內容沒變就沿用本地 HF 快取
+    - stats：
+        hits          → 直接用本地檔，零網路
+        revalidations → 有發出條件式檢查，但沒有下載新 bytes
+        misses        → 真的下載了新 bytes
+    """
+
+    def __init__(
+        self,
+        repo_id: str,
+        token: Optional[str] = None,
+        *,
+        prefix: str = DEFAULT_PREFIX,
+        freshness_s: float = DEFAULT_FRESHNESS_S,
+        timeout: int = 20,
+    ):
+        self.repo_id = repo_id
+        self.token = token
+        self.prefix = prefix
+        self.freshness_s = float(freshness_s)
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Any] = {}
+        self._meta_etag: Optional[str] = None
+        self._meta_checked_at = float("-inf")
+        self._paths: Dict[str, Tuple[Optional[str], str]] = {}  # dataset_id + suffix -> (revision, local path)
+        self._ds_locks: Dict[str, threading.Lock] = {}
+        self.stats = {
+            "meta_hits": 0, "meta_revalidations": 0, "meta_misses": 0,
+            "hits": 0, "revalidations": 0, "misses": 0,
+        }
+
+    # ---------- meta.json ----------
+    def get_meta(self, force: bool = False) -> Dict[str, Any]:
+        """取得 meta.json（freshness 視窗內直接回傳記憶體中的版本）。"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._meta_checked_at < self.freshness_s:
+                self.stats["meta_hits"] += 1
+                metrics.inc("hf_meta_total", result="hit")
+                return self._meta
+
+            url = hf_hub_url(repo_id=self.repo_id, filename=f"{self.prefix}/meta.json", repo_type="dataset")
+            headers = {"authorization": f"Bearer {self.token}"} if self.token else {}
+            if self._meta_etag:
+                headers["If-None-Match"] = self._meta_etag
+            try:
+                r = requests.get(url, headers=headers, timeout=self.timeout)
+                if r.status_code == 304:
+                    self.stats["meta_revalidations"] += 1
+                    metrics.inc("hf_meta_total", result="revalidation")
+                elif r.status_code == 200:
+                    self.stats["meta_misses"] += 1
+                    metrics.inc("hf_meta_total", result="miss")
+                    metrics.inc("bytes_fetched_total", len(r.content), source="hf_meta")
+                    self._meta = r.json()
+                    self._meta_etag = r.headers.get("ETag")
+            except Exception:
+                pass  # 網路失敗 → 沿用上次的 meta
+            self._meta_checked_at = now
+            return self._meta
+
+    def revision(self, dataset_id: str, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """單站 revision：meta.json["frames"][id]["rev"]（已發布檔案的版本，內容沒變時不隨 obs_time_utc 前進；舊版 meta 退回 obs_time_utc）。"""
+        meta = self.get_meta() if meta is None else meta
+        frame = (meta.get("frames") or {}).get(dataset_id) or {}
+        return frame.get("rev") or frame.get("obs_time_utc") or meta.get("obs_time_utc")
+
+    # ---------- PNG / tile pack ----------
+    def fetch_png(self, dataset_id: str) -> str:
+        """回傳該站 PNG 的本地路徑；revision 沒變就不碰網路。"""
+        return self.fetch_file(dataset_id, ".png")
+
+    def fetch_file(self, dataset_id: str, suffix: str, rev: Optional[str] = None) -> str:
+        """{prefix}/{dataset_id}{suffix} 的本地路徑（.png、.tiles.zip）；revision 沒變就不碰網路。"""
+        rev = rev or self.revision(dataset_id)
+        key = dataset_id + suffix
+        with self._lock:
+            ds_lock = self._ds_locks.setdefault(key, threading.Lock())
+
+        with ds_lock:
+            cached = self._paths.get(key)
+            if cached and rev is not None and cached[0] == rev:
+                with self._lock:
+                    self.stats["hits"] += 1
+                metrics.inc("hf_fetch_total", result="hit")
+                return cached[1]
+
+            filename = f"{self.prefix}/{key}"
+            prev = try_to_load_from_cache(repo_id=self.repo_id, filename=filename, repo_type="dataset")
+            path = hf_hub_download(
+                repo_id=self.repo_id,
+                filename=filename,
+                repo_type="dataset",
+                token=self.token,
+            )
+            # 每次 dataset commit 的 snapshot 路徑都不同；內容相同時兩者都連到同一個 blob（以 ETag 命名）
+            revalidated = isinstance(prev, str) and os.path.realpath(prev) == os.path.realpath(path)
+            with self._lock:
+                self.stats["revalidations" if revalidated else "misses"] += 1
+            metrics.inc("hf_fetch_total", result="revalidation" if revalidated else "miss")
+            if not revalidated and metrics.enabled():
+                metrics.inc("bytes_fetched_total", os.path.getsize(path), source="hf")
+            self._paths[key] = (rev, path)
+            return path
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+
+_fetchers: Dict[str, HFRadarFetcher] = {}
+_fetchers_lock = threading.Lock()
+
+
+def get_hf_fetcher(repo_id: str, token: Optional[str] = None, cfg: Optional[Dict[str, Any]] = None) -> HFRadarFetcher:
+    """取得 process 共用的 fetcher（同一 repo 只建一個，讓 freshness 視窗與計數器跨 session 共用）。"""
+    with _fetchers_lock:
+        f = _fetchers.get(repo_id)
+        if f is None:
+            c = (cfg or {}).get("hf_fetch") or {}
+            f = HFRadarFetcher(
+                repo_id,
+                token,
+                prefix=c.get("prefix", DEFAULT_PREFIX),
+                freshness_s=float(c.get("freshness_s", DEFAULT_FRESHNESS_S)),
+                timeout=int(c.get("timeout", 20)),
+            )
+            _fetchers[repo_id] = f
+        return f
@@ -0,0 +1,329 @@
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.grid_geometry import GridGeometry
+
+# ---- 量化：uint8，0 = NaN（稀疏檔未寫入的區塊讀出來就是 NaN），1..255 = dBZ ----
+DBZ_MIN = -32.0
+DBZ_STEP = 0.5
+NODATA = 0
+FORMAT_VERSION = 1
+DEFAULT_INTERVAL_MIN = 10   # O-A0059-001 每 10 分鐘一張
+DEFAULT_CHUNK_HOURS = 24    # 每個 chunk 檔放一天（UTC）
+
+
+def quantize_dbz(dbz: np.ndarray) -> np.ndarray:
+    """float dBZ（NaN 為無資料）→ uint8"""
+    dbz = np.asarray(dbz, dtype=np.float32)
+    q = np.clip(np.rint((dbz - DBZ_MIN) / DBZ_STEP) + 1, 1, 255)
+    q[np.isnan(dbz)] = NODATA
+    return q.astype(np.uint8)
+
+
+def dequantize_dbz(q: np.ndarray) -> np.ndarray:
+    """uint8 → float32 dBZ（NODATA → NaN）"""
+    q = np.asarray(q)
+    out = (q.astype(np.float32) - 1) * DBZ_STEP + DBZ_MIN
+    out[q == NODATA] = np.nan
+    return out
+
+
+def to_utc(dt: str | datetime) -> datetime:
+    """ISO 8601 字串 / datetime → UTC datetime（無時區視為 UTC）"""
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _utc_key(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class HistoryCube:
+    """
+    ### 合成雷達格點的時間立方體（可 memory-map）
+    - {root}/header.json：dt 間隔、nx、ny、dx_deg、lon0、lat0、量化參數
+    - {root}/chunk_YYYYMMDD.npy：(slots, ny, nx) uint8，slot = 當日分鐘 // interval
+    - {root}/index.json：已寫入的 dt（UTC）→ [chunk, slot]
+    讀一張圖 = 一次 memmap 切片；讀一個像素的時間序列 = 每張圖讀一格
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.header: Dict[str, Any] = {}
+        self.index: Dict[str, Tuple[str, int]] = {}
+        self._index_mtime: Optional[int] = None
+        self._chunks: Dict[str, np.memmap] = {}
+        self._tindex: Optional[Tuple[Optional[int], np.ndarray, np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self._load_header()
+
+    # ---------- header / index ----------
+    def _load_header(self) -> None:
+        p = self.root / "header.json"
+        if p.exists():
+            self.header = json.loads(p.read_text(encoding="utf-8"))
+
+    def _refresh_index(self) -> None:
+        p = self.root / "index.json"
+        try:
+            mtime = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._index_mtime:
+            self.index = {k: tuple(v) for k, v in json.loads(p.read_text(encoding="utf-8")).items()}
+            self._index_mtime = mtime
+            if not self.header:
+                self._load_header()
+
+    def _init_header(self, meta: Dict[str, Any], interval_min: int, chunk_hours: int) -> None:
+        self.header = {
+            "version": FORMAT_VERSION,
+            "interval_min": int(interval_min),
+            "chunk_hours": int(chunk_hours),
+            "nx": int(meta["nx"]), "ny": int(meta["ny"]),
+            "dx_deg": float(meta["dx_deg"]),
+            "lon0": float(meta["lon0"]), "lat0": float(meta["lat0"]),
+            "dtype": "uint8", "dbz_min": DBZ_MIN, "dbz_step": DBZ_STEP, "nodata": NODATA,
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(self.root / "header.json", json.dumps(self.header, indent=2))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.header["ny"], self.header["nx"]
+
+    @property
+    def geometry(self) -> GridGeometry:
+        return GridGeometry.from_meta(self.header)
+
+    @property
+    def slots_per_chunk(self) -> int:
+        return self.header["chunk_hours"] * 60 // self.header["interval_min"]
+
+    def locate(self, dt: str | datetime) -> Tuple[str, str, int]:
+        """
+        ### dt → (UTC key, chunk 名稱, slot)
+        - dt 必須落在 interval_min 的格線上；不在格線上（例如 interval 10 時的 12:47）會與整點的 slot 撞在一起，
+          因此直接 raise ValueError，不默默覆寫
+        """
+        t = to_utc(dt)
+        hours = self.header["chunk_hours"]
+        interval = self.header["interval_min"]
+        if t.second or t.microsecond or t.minute % interval:
+            raise ValueError(f"{_utc_key(t)} 不在 {interval} 分鐘的時間格線上")
+        start_hour = t.hour // hours * hours
+        minutes = (t.hour - start_hour) * 60 + t.minute
+        chunk = t.strftime("%Y%m%d") + (f"T{start_hour:02d}" if hours < 24 else "")
+        return _utc_key(t), chunk, minutes // interval
+
+    def _chunk(self, name: str, create: bool = False) -> Optional[np.memmap]:
+        mm = self._chunks.get(name)
+        if mm is not None:
+            return mm
+        p = self.root / f"chunk_{name}.npy"
+        if p.exists():
+            mm = np.load(p, mmap_mode="r+" if create else "r")
+        elif create:
+            mm = np.lib.format.open_memmap(p, mode="w+", dtype=np.uint8, shape=(self.slots_per_chunk, *self.shape))
+        else:
+            return None
+        self._chunks[name] = mm
+        return mm
+
+    # ---------- 寫入 ----------
+    def append(
+        self,
+        meta: Dict[str, Any],
+        interval_min: int = DEFAULT_INTERVAL_MIN,
+        chunk_hours: int = DEFAULT_CHUNK_HOURS,
+    ) -> str:
+        """
+        ### 寫入一張格點（parse_grid_xml 的結果）
+        #### return:
+        - UTC dt key
+        """
+        with self._lock:
+            if not self.header:
+                self._init_header(meta, interval_min, chunk_hours)
+            geo = ("nx", "ny", "dx_deg", "lon0", "lat0")
+            if any(float(meta[k]) != float(self.header[k]) for k in geo):
+                raise ValueError(f"格點幾何與 cube 不符：{ {k: meta[k] for k in geo} }")
+
+            key, chunk, slot = self.locate(meta["dt"])
+            mm = self._chunk(chunk, create=True)
+            if mm.mode == "r":  # 先前以唯讀開過 → 改開可寫
+                self._chunks.pop(chunk, None)
+                mm = self._chunk(chunk, create=True)
+            mm[slot] = quantize_dbz(meta["dbz"])
+            mm.flush()
+
+            self._refresh_index()
+            self.index[key] = (chunk, slot)
+            _atomic_write_text(self.root / "index.json", json.dumps(dict(sorted(self.index.items()))))
+            self._index_mtime = (self.root / "index.json").stat().st_mtime_ns
+            return key
+
+    # ---------- 讀取 ----------
+    def times(self) -> List[str]:
+        self._refresh_index()
+        return sorted(self.index)
+
+    def __contains__(self, dt) -> bool:
+        self._refresh_index()
+        if not self.header:
+            return False
+        try:
+            return self.locate(dt)[0] in self.index
+        except ValueError:
+            return False
+
+    def frame(self, dt: str | datetime, raw: bool = False) -> np.ndarray:
+        """
+        ### 讀一張格點
+        #### para:
+        - raw: True → uint8 memmap 切片（零複製）；False → float32 dBZ（NaN 為無資料）
+        """
+        self._refresh_index()
+        try:
+            key, chunk, slot = self.locate(dt)
+        except ValueError as e:
+            raise KeyError(str(e)) from None
+        if key not in self.index:
+            raise KeyError(f"cube 中沒有 {key}")
+        mm = self._chunk(chunk)
+        # index.json 有列但 chunk 檔不在（清理過 / 複製不完整）→ 整張視為無資料
+        q = mm[slot] if mm is not None else np.full(self.shape, NODATA, dtype=np.uint8)
+        return q if raw else dequantize_dbz(q)
+
+    def time_index(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        ### 時間索引（index.json 變動時才重建）
+        #### return:
+        - (times: datetime64[s] 升冪, chunk 名稱: object 陣列, slot: int64 陣列)
+        """
+        self._refresh_index()
+        t = self._tindex
+        if t is None or t[0] != self._index_mtime:
+            keys = sorted(self.index)
+            times = np.array([k.rstrip("Z") for k in keys], dtype="datetime64[s]")
+            chunks = np.array([self.index[k][0] for k in keys], dtype=object)
+            slots = np.array([self.index[k][1] for k in keys], dtype=np.int64)
+            t = self._tindex = (self._index_mtime, times, chunks, slots)
+        return t[1], t[2], t[3]
+
+    def _time_range(self, start, end) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        times, chunks, slots = self.time_index()
+        lo = 0 if start is None else np.searchsorted(times, np.datetime64(_utc_key(to_utc(start)).rstrip("Z")), "left")
+        hi = len(times) if end is None else np.searchsorted(times, np.datetime64(_utc_key(to_utc(end)).rstrip("Z")), "right")
+        return times[lo:hi], chunks[lo:hi], slots[lo:hi]
+
+    def series(
+        self,
+        lats,
+        lons,
+        start: str | datetime | None = None,
+        end: str | datetime | None = None,
+        raw: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ### 多點時間序列查詢
+        - 只讀需要的格子：每個 chunk 一次 fancy indexing（memmap 只碰到對應頁面），不載入整張圖
+        #### para:
+        - lats, lons: 純量或長度 P 的陣列
+        - start, end: 時間範圍（含端點，UTC；None 表示不限）
+        - raw: True → uint8（NODATA=0）；False → float32 dBZ（NaN 為無資料）
+        #### return:
+        - (times: datetime64[s] 長度 T, 值: (T, P))；格點範圍外的點、chunk 檔遺失的時間為 NODATA / NaN
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        times, chunks, slots = self._time_range(start, end)
+        q = np.full((len(times), lats.size), NODATA, dtype=np.uint8)
+        if len(times) and lats.size:
+            geom = self.geometry
+            inside = np.flatnonzero(geom.contains(lats, lons))
+            i, j = geom.latlon_to_index(lats[inside], lons[inside])
+            for name in dict.fromkeys(chunks):
+                mm = self._chunk(name)
+                if mm is None:  # chunk 檔不在 → 這些時間保持 NODATA
+                    continue
+                rows = np.flatnonzero(chunks == name)
+                q[np.ix_(rows, inside)] = mm[slots[rows][:, None], i[None, :], j[None, :]]
+        return times, (q if raw else dequantize_dbz(q))
+
+    def pixel_series(self, i: int, j: int, raw: bool = False) -> Tuple[List[str], np.ndarray]:
+        """單一格點 (row i, col j) 的完整時間序列：(dt 清單, 值)"""
+        lat, lon = self.geometry.index_to_latlon(i, j)
+        times, vals = self.series(lat, lon, raw=raw)
+        return [f"{t}Z" for t in times.astype(str)], vals[:, 0]
+
+
+_cubes: Dict[str, HistoryCube] = {}
+_cubes_lock = threading.Lock()
+
+
+def get_history_cube(cfg: Optional[Dict[str, Any]] = None) -> HistoryCube:
+    """依 cfg['historyapi']['cube_dir'] 取得共用的 HistoryCube（memmap 與時間索引跨呼叫重用）"""
+    root = str(((cfg or {}).get("historyapi") or {}).get("cube_dir", "radar_cube"))
+    with _cubes_lock:
+        cube = _cubes.get(root)
+        if cube is None:
+            cube = _cubes[root] = HistoryCube(root)
+        return cube
+
+
+def read_grid_csv(path: str | Path) -> Dict[str, Any]:
+    """讀舊版 save_csv 輸出（一列、values 欄為 list 字串）→ parse_grid_xml 相同格式的 dict"""
+    csv.field_size_limit(max(csv.field_size_limit(), 1 << 30))  # values 欄約 4 MB
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        row = next(csv.DictReader(f))
+    nx, ny = int(row["nx"]), int(row["ny"])
+    vals = np.fromstring(row["values"].strip().strip("[]"), dtype=np.float32, sep=",")
+    if vals.size != nx * ny:
+        raise ValueError(f"{path}: grid size mismatch: got {vals.size} vs nx*ny={nx*ny}")
+    meta = {"dt": row["dt"], "nx": nx, "ny": ny, "dx_deg": float(row["dx_deg"]),
+            "lon0": float(row["lon0"]), "lat0": float(row["lat0"]), "dbz": vals.reshape(ny, nx)}
+    meta["geom"] = GridGeometry.from_meta(meta)
+    return meta
+
+
+def migrate_csv_dir(csv_dir: str | Path, cube_dir: str | Path, debug: bool = False) -> int:
+    """把 radar_grids/*.csv 全部寫進 HistoryCube；回傳轉換張數"""
+    cube = HistoryCube(cube_dir)
+    n = 0
+    for p in sorted(Path(csv_dir).glob("radar_grid_*.csv")):
+        key = cube.append(read_grid_csv(p))
+        n += 1
+        if debug:
+            print(f"[migrate] {p.name} -> {key}")
+    return n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="HistoryCube 工具")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="舊版 CSV → cube")
+    m.add_argument("csv_dir", nargs="?", default="radar_grids")
+    m.add_argument("cube_dir", nargs="?", default="radar_cube")
+    args = ap.parse_args()
+
+    if args.cmd == "migrate":
+        print(f"migrated {migrate_csv_dir(args.csv_dir, args.cube_dir, debug=True)} frames")
@@ -1,8 +1,14 @@
 from __future__ import annotations
 from typing import Dict, Any, List, Tuple
 from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import os, time, random
 import json, requests, numpy as np, pandas as pd
-import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+from api_loader.history_store import HistoryCube
+from utils import metrics
+from utils.grid_geometry import GridGeometry
 
 def fetch_history_index_json(index_url: str, timeout: int = 30, debug: bool = False) -> Dict[str, Any]:
     """抓『時間清單 JSON』（含多個 time[].ProductURL）。"""
@@ -26,51 +32,151 @@ def parse_history_index(j: Dict[str, Any]) -> List[Dict[str, str]]:
     times = data.get("time", []) if isinstance(data, dict) else []
     return [{"dt": t.get("DateTime"), "url": t.get("ProductURL")} for t in times if t.get("DateTime") and t.get("ProductURL")]
 
-def fetch_grid_xml(product_url: str, timeout: int = 60) -> str:
-    r = requests.get(product_url, timeout=timeout)
-    r.raise_for_status()
-    return r.text
+def fetch_grid(product_url: str, timeout: int = 60, chunk_size: int = 1 << 16) -> Dict[str, Any]:
+    """串流下載 O-A0059-001 XML，邊收邊解析（不保留整份文字）。"""
+    with requests.get(product_url, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        n = 0
+
+        def chunks():
+            nonlocal n
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                n += len(chunk)
+                yield chunk
+
+        meta = parse_grid_xml(chunks())
+    metrics.inc("bytes_fetched_total", n, source="history_xml")
+    return meta
+
+_GRID_PARAMS = ("DateTime", "StartPointLongitude", "StartPointLatitude",
+                "GridResolution", "GridDimensionX", "GridDimensionY")
 
-def parse_grid_xml(xml_text: str) -> Dict[str, Any]:
+class _GridXMLStream:
+    """
+    expat 串流解析器：
+      - 只收 parameterSet 內需要的欄位與 contents/content 的文字
+      - content 文字分段到達時，以最後一個逗號切開，前段直接轉成 float32，
+        尾段留到下一段 → 峰值記憶體 ≈ 最終陣列 + 一個 chunk
+    """
+
+    def __init__(self):
+        self.params: Dict[str, str] = {}
+        self._stack: List[str] = []
+        self._text: List[str] = []
+        self._tail = ""
+        self._out: np.ndarray | None = None
+        self._chunks: List[np.ndarray] = []
+        self._n = 0
+        self._p = expat.ParserCreate(namespace_separator="}")
+        self._p.buffer_text = True
+        self._p.buffer_size = 1 << 16
+        self._p.StartElementHandler = self._start
+        self._p.EndElementHandler = self._end
+        self._p.CharacterDataHandler = self._chars
+
+    @staticmethod
+    def _local(name: str) -> str:
+        return name.rsplit("}", 1)[-1]
+
+    def _start(self, name, attrs):
+        self._stack.append(self._local(name))
+        self._text = []
+        if self._stack[-1] == "content" and "contents" in self._stack:
+            nx, ny = self.params.get("GridDimensionX"), self.params.get("GridDimensionY")
+            if nx and ny:
+                self._out = np.empty(int(nx) * int(ny), dtype=np.float32)
+
+    def _end(self, name):
+        tag = self._stack.pop()
+        if tag == "content" and "contents" in self._stack:
+            self._emit(self._tail)
+            self._tail = ""
+        elif tag in _GRID_PARAMS and self._stack and self._stack[-1] == "parameterSet":
+            self.params[tag] = "".join(self._text).strip()
+        self._text = []
+
+    def _chars(self, data):
+        if not self._stack:
+            return
+        if self._stack[-1] == "content" and "contents" in self._stack:
+            buf = self._tail + data
+            cut = buf.rfind(",")
+            if cut < 0:
+                self._tail = buf
+                return
+            self._tail = buf[cut + 1:]
+            self._emit(buf[:cut])
+        elif self._stack[-1] in _GRID_PARAMS:
+            self._text.append(data)
+
+    def _emit(self, s: str) -> None:
+        # 空字串（結尾逗號、",,"、只有換行）略過，與舊版解析一致
+        vals = np.array([x for x in s.split(",") if x.strip()], dtype=np.float32)
+        if self._out is not None and self._n + vals.size <= self._out.size:
+            self._out[self._n:self._n + vals.size] = vals
+        else:
+            if self._out is not None:  # 數量超過表頭宣告 → 改用 list 收集，最後報錯
+                self._chunks.append(self._out[:self._n].copy())
+                self._out = None
+            self._chunks.append(vals)
+        self._n += vals.size
+
+    def feed(self, data, final: bool = False) -> None:
+        self._p.Parse(data, final)
+
+    def values(self) -> np.ndarray:
+        if self._out is not None:
+            return self._out[:self._n]
+        return np.concatenate(self._chunks) if self._chunks else np.empty(0, np.float32)
+
+def parse_grid_xml(xml_text) -> Dict[str, Any]:
     """
     解析 O-A0059-001 單筆 XML（格點 dBZ）。
+    xml_text 可為 str / bytes、檔案物件（.read）、或 bytes chunk 的 iterable（串流下載）。
     重要欄位：
       StartPointLongitude/Latitude, GridResolution, GridDimensionX/Y, DateTime
       contents/content -> 逗號分隔的科學記號 dBZ（-99/ -999 視為 NaN）
     """
-    root = ET.fromstring(xml_text)
-    ns_uri = root.tag.split('}')[0].strip('{') if '}' in root.tag else ''
-    ns = {'c': ns_uri} if ns_uri else {}
-    def F(node, path):
-        el = node.find(path, ns) if ns else node.find(path)
-        return (el.text or "").strip() if el is not None and el.text else None
-
-    dataset = root.find('c:dataset', ns) if ns else root.find('dataset')
-    dsinfo = dataset.find('c:datasetInfo', ns) if ns else dataset.find('datasetInfo')
-    pset = dsinfo.find('c:parameterSet', ns) if ns else dsinfo.find('parameterSet')
-
-    dt = F(pset, 'c:DateTime' if ns else 'DateTime')
-    lon0 = float(F(pset, 'c:StartPointLongitude' if ns else 'StartPointLongitude'))
-    lat0 = float(F(pset, 'c:StartPointLatitude'  if ns else 'StartPointLatitude'))
-    dx = float(F(pset, 'c:GridResolution'        if ns else 'GridResolution'))
-    nx = int(F(pset, 'c:GridDimensionX'          if ns else 'GridDimensionX'))
-    ny = int(F(pset, 'c:GridDimensionY'          if ns else 'GridDimensionY'))
-
-    contents = dataset.find('c:contents', ns) if ns else dataset.find('contents')
-    s = F(contents, 'c:content' if ns else 'content')
-    vals = np.array([float(x) for x in s.split(',') if x], dtype=np.float32)
+    ps = _GridXMLStream()
+    if isinstance(xml_text, str):
+        ps.feed(xml_text.encode("utf-8"), True)
+    elif isinstance(xml_text, (bytes, bytearray)):
+        ps.feed(bytes(xml_text), True)
+    elif hasattr(xml_text, "read"):
+        while True:
+            chunk = xml_text.read(1 << 16)
+            if not chunk:
+                break
+            ps.feed(chunk)
+        ps.feed(b"", True)
+    else:
+        for chunk in xml_text:
+            if chunk:
+                ps.feed(chunk)
+        ps.feed(b"", True)
+
+    missing = [k for k in _GRID_PARAMS if not ps.params.get(k)]
+    if missing:
+        raise ValueError(f"parameterSet 缺少欄位：{missing}")
+    dt = ps.params["DateTime"]
+    lon0 = float(ps.params["StartPointLongitude"])
+    lat0 = float(ps.params["StartPointLatitude"])
+    dx = float(ps.params["GridResolution"])
+    nx = int(ps.params["GridDimensionX"])
+    ny = int(ps.params["GridDimensionY"])
+
+    vals = ps.values()
     if vals.size != nx * ny:
         raise ValueError(f"grid size mismatch: got {vals.size} vs nx*ny={nx*ny}")
 
     arr = vals.reshape((ny, nx))
-    arr = np.where((arr <= -990) | (arr == -99.0) | (arr == -999.0), np.nan, arr)
+    arr[(arr <= -990) | (arr == -99.0)] = np.nan
 
-    # 經緯度網格（左下角起點；經度向右遞增、緯度向上遞增）
-    j = np.arange(nx, dtype=np.float32); i = np.arange(ny, dtype=np.float32)
-    lon_grid, lat_grid = np.meshgrid(lon0 + j * dx, lat0 + i * dx)
+    # 經緯度以解析式表示（左下角起點；經度向右遞增、緯度向上遞增），不再產生 meshgrid
+    geom = GridGeometry(lon0=lon0, lat0=lat0, dx=dx, nx=nx, ny=ny)
 
     return {"dt": dt, "nx": nx, "ny": ny, "dx_deg": dx, "lon0": lon0, "lat0": lat0,
-            "dbz": arr, "lon_grid": lon_grid, "lat_grid": lat_grid}
+            "dbz": arr, "geom": geom}
 
 def save_csv(meta: Dict[str, Any], out_dir: Path) -> Path:
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -84,18 +190,139 @@ def save_csv(meta: Dict[str, Any], out_dir: Path) -> Path:
     return p
 
 
-def run_historyapi(cfg: Dict[str, Any], debug: bool = False) -> None:
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def fetch_grid_with_retry(url: str, timeout: int = 60, retries: int = 3, backoff_s: float = 2.0) -> Dict[str, Any]:
+    """fetch_grid 加上重試：連線錯誤 / 串流中斷 / 429 / 5xx 以指數退避重試（backoff_s * 2^k + 抖動）；解析錯誤不重試。"""
+    for attempt in range(retries + 1):
+        try:
+            with metrics.span("history.fetch"):
+                return fetch_grid(url, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                requests.exceptions.ChunkedEncodingError) as e:
+            resp = getattr(e, "response", None)
+            transient = resp is None or resp.status_code in _RETRY_STATUS
+            if not transient or attempt >= retries:
+                raise
+            metrics.inc("history_retries_total")
+            time.sleep(backoff_s * (2 ** attempt) + random.uniform(0, backoff_s))
+    raise RuntimeError("unreachable")
+
+
+def _fetch_timed(url: str, timeout: int, retries: int, backoff_s: float) -> Tuple[Dict[str, Any], float]:
+    """worker 用：回傳 (fetch_grid_with_retry 結果, 秒數)；子 process 的 metrics 不會回到主 process"""
+    t0 = time.perf_counter()
+    meta = fetch_grid_with_retry(url, timeout, retries, backoff_s)
+    return meta, time.perf_counter() - t0
+
+
+class BackfillManifest:
+    """
+    已完成 DateTime 的持久紀錄（{out}/manifest.json）。
+    重跑時只抓 index 裡尚未完成的項目；失敗的項目記在 failed，下次會再試。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+        self.done = set(data.get("done", []))
+        self.failed: Dict[str, str] = dict(data.get("failed", {}))
+
+    def __contains__(self, dt: str) -> bool:
+        return dt in self.done
+
+    def mark_done(self, dt: str) -> None:
+        self.done.add(dt)
+        self.failed.pop(dt, None)
+        self.save()
+
+    def mark_failed(self, dt: str, err: str) -> None:
+        self.failed[dt] = err
+        self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"done": sorted(self.done), "failed": self.failed}, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def run_historyapi(cfg: Dict[str, Any], debug: bool = False) -> Dict[str, int]:
+    """
+    歷史格點 backfill：
+      - 每一張：串流下載並邊收邊解析（fetch_grid_with_retry），整份 XML 不留在記憶體；
+        失敗以指數退避重試
+      - 並行：historyapi.parse_workers > 0 → process pool（解析吃 CPU，需明確開啟）；0（預設）→ thread pool（historyapi.workers）
+      - 寫入：主 process 依完成順序寫 cube / CSV，並更新 manifest.json
+    重跑時只處理 manifest 與 cube 都還沒有的 DateTime。
+    """
+    metrics.configure(cfg)
     c = cfg["historyapi"]
     index_url = c["index_url"]; timeout = int(c.get("timeout", 30))
     limit = c.get("limit"); out_dir = Path(c.get("out_dir", "radar_grids"))
+    cube = HistoryCube(c.get("cube_dir", "radar_cube")) if c.get("format", "cube") == "cube" else None
+    workers = max(1, int(c.get("workers", 4)))
+    parse_workers = int(c.get("parse_workers", 0))
+    retries = int(c.get("retries", 3)); backoff_s = float(c.get("backoff_s", 2.0))
+    manifest = BackfillManifest((cube.root if cube is not None else out_dir) / "manifest.json")
 
-    idx_json = fetch_history_index_json(index_url, timeout=timeout, debug=debug)
+    with metrics.span("history.index"):
+        idx_json = fetch_history_index_json(index_url, timeout=timeout, debug=debug)
     items = parse_history_index(idx_json)
     if limit: items = items[:int(limit)]
+    todo = [it for it in items if it["dt"] not in manifest and (cube is None or it["dt"] not in cube)]
+    stats = {"total": len(items), "skipped": len(items) - len(todo), "done": 0, "failed": 0}
+    print(f"[history] index={len(items)} 已完成={stats['skipped']} 待抓={len(todo)}")
+
+    def save(it: Dict[str, str], meta: Dict[str, Any]) -> None:
+        with metrics.span("history.write"):
+            p = cube.append(meta) if cube is not None else save_csv(meta, out_dir)
+            manifest.mark_done(it["dt"])
+        stats["done"] += 1
+        metrics.inc("history_frames_total", result="done")
+        print(f"[{stats['done'] + stats['failed']}/{len(todo)}] {it['dt']} saved: {p}")
+
+    def fail(it: Dict[str, str], e: Exception) -> None:
+        manifest.mark_failed(it["dt"], repr(e))
+        stats["failed"] += 1
+        metrics.inc("history_frames_total", result="failed")
+        print(f"[{stats['done'] + stats['failed']}/{len(todo)}] {it['dt']} 失敗：{e}")
+
+    if parse_workers > 0:
+        pool, n = ProcessPoolExecutor(max_workers=parse_workers), parse_workers
+    else:
+        pool, n = ThreadPoolExecutor(max_workers=workers), workers
+    pending = iter(todo)
+    running: Dict[Future, Dict[str, str]] = {}
+    with pool:
+        def top_up() -> None:
+            while len(running) < n:  # 同時只解析 n 張 → 記憶體 ≈ n 張格點
+                it = next(pending, None)
+                if it is None:
+                    return
+                running[pool.submit(_fetch_timed, it["url"], timeout, retries, backoff_s)] = it
+
+        top_up()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                it = running.pop(f)
+                try:
+                    meta, fetch_s = f.result()
+                    if parse_workers > 0:  # thread pool 時 history.fetch span 已經記過
+                        metrics.observe("history.fetch_seconds", fetch_s)
+                    save(it, meta)
+                except Exception as e:
+                    fail(it, e)
+            top_up()
 
-    for k, it in enumerate(items, 1):
-        print(f"[{k}/{len(items)}] {it['dt']} -> {it['url']}")
-        xml_text = fetch_grid_xml(it["url"], timeout=timeout)
-        meta = parse_grid_xml(xml_text)
-        p = save_csv(meta, out_dir)
-        print("  saved:", p)
+    print(f"[history] 完成 {stats}")
+    if stats["done"] and (cfg.get("nowcast") or {}).get("enabled", True):
+        from utils.nowcast import update_nowcast
+        try:
+            with metrics.span("history.nowcast"):
+                update_nowcast(cfg, debug=debug)
+        except Exception as e:
+            print(f"[nowcast] 更新失敗：{e}")
+    metrics.write_textfile()
+    return stats
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import os
+import time
+import socket
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from api_loader.fileapi_client import ensure_latest_to_hf_streaming
+from api_loader.shm_store import sync_shared_frames
+from utils import metrics
+
+DEFAULT_INTERVAL_S = 120    # CWA 單站雷達約每 2 分鐘一張
+DEFAULT_OFFSET_S = 30       # 發布延遲：整點時刻後再等 30 秒才抓
+DEFAULT_LOCK_PATH = ".ingest.lock"
+DEFAULT_LOCK_STALE_S = 600
+
+
+class LeaderLock:
+    """
+    ### 單一 refresher 鎖
+    - POSIX：對 lock 檔取 fcntl.flock（非阻塞）；持有者死掉時由 kernel 釋放，不會有兩個 leader
+    - 沒有 fcntl 的平台（Windows）：O_CREAT | O_EXCL 建檔；超過 stale_s 沒 heartbeat 視為過期，
+      以暫存檔 + os.replace 原子接手後再讀回確認
+    - lock 檔內容為「token host pid 時間」；is_owner() 比對 token（發布前再確認一次仍是 leader）
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_LOCK_PATH, stale_s: float = DEFAULT_LOCK_STALE_S):
+        self.path = Path(path)
+        self.stale_s = float(stale_s)
+        self.held = False
+        self.token = uuid.uuid4().hex
+        self._fd: Optional[int] = None
+
+    def _line(self) -> str:
+        return f"{self.token} {socket.gethostname()} {os.getpid()} {datetime.now(timezone.utc).isoformat()}\n"
+
+    def _read_token(self) -> Optional[str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read().split(" ", 1)[0] or None
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self) -> bool:
+        try:
+            return time.time() - self.path.stat().st_mtime > self.stale_s
+        except FileNotFoundError:
+            return True
+
+    def acquire(self) -> bool:
+        if self.held:
+            return self.is_owner()
+        if fcntl is not None:
+            return self._acquire_flock()
+        return self._acquire_excl()
+
+    def _acquire_flock(self) -> bool:
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, self._line().encode("utf-8"))
+        self._fd = fd
+        self.held = True
+        return True
+
+    def _acquire_excl(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._is_stale():
+                return False
+            # 接手過期的鎖：一次 rename 換掉整個檔案（不會有 unlink 與建檔之間的空窗），讀回是自己的才算
+            tmp = self.path.with_name(f".{self.path.name}.{self.token}.tmp")
+            tmp.write_text(self._line(), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self.held = self._read_token() == self.token
+            return self.held
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self._line())
+        self.held = True
+        return True
+
+    def is_owner(self) -> bool:
+        """lock 檔仍是自己的（token 相同；flock 時還要是同一個檔案）"""
+        if not self.held:
+            return False
+        owner = self._read_token() == self.token
+        if owner and self._fd is not None:
+            try:
+                owner = os.fstat(self._fd).st_ino == self.path.stat().st_ino
+            except FileNotFoundError:
+                owner = False
+        if not owner:
+            print(f"[ingest] {self.path} 已被其他 process 接手")
+            self.release()
+        return owner
+
+    def heartbeat(self) -> None:
+        if self.held:
+            os.utime(self.path, None)
+
+    def release(self) -> None:
+        if not self.held:
+            return
+        self.held = False
+        if self._fd is not None:
+            # flock：只解鎖不刪檔（刪檔會讓等待中的 process 鎖到已不存在的 inode）
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+            return
+        if self._read_token() == self.token:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "LeaderLock":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def next_run_at(now: float, interval_s: float, offset_s: float = 0.0) -> float:
+    """
+    ### 下一個對齊發布時刻的 epoch 秒數
+    - 以 interval_s 為週期的整點時刻 + offset_s（例如每 2 分鐘的第 30 秒）
+    """
+    base = (now - offset_s) // interval_s * interval_s + offset_s
+    return base + interval_s
+
+
+def run_ingest_loop(
+    cfg: Dict[str, Any],
+    *,
+    once: bool = False,
+    debug: bool = False,
+    refresh: Callable[..., Optional[dict]] = ensure_latest_to_hf_streaming,
+) -> None:
+    """
+    ### 背景抓取排程（與 Streamlit session 完全分離）
+    - 只有拿到 LeaderLock 的 process 會刷新，其餘等待接手；發布前再確認一次仍持有鎖
+    - 每輪都向 CWA 查最新 obsTime；沒有新圖時 refresh 不會上傳（見 ensure_latest_to_hf_streaming）
+    #### para:
+    - cfg: load_config 的結果；排程參數讀 cfg['ingest']
+    - once: 只跑一輪（給 cron / 工作排程器用）
+    - cfg['metrics'].textfile 有設定時，每輪結束寫出 Prometheus textfile
+    - cfg['shm'].enabled 時，每輪把最新格點同步進本機共享記憶體（見 api_loader.shm_store）
+    """
+    c = cfg.get("ingest") or {}
+    interval_s = float(c.get("interval_s", DEFAULT_INTERVAL_S))
+    offset_s = float(c.get("offset_s", DEFAULT_OFFSET_S))
+    lock = LeaderLock(c.get("lock_path", DEFAULT_LOCK_PATH), stale_s=float(c.get("lock_stale_s", DEFAULT_LOCK_STALE_S)))
+    metrics.configure(cfg)
+    shm_on = bool((cfg.get("shm") or {}).get("enabled", False))
+
+    with lock:
+        while True:
+            if lock.acquire():
+                lock.heartbeat()
+                try:
+                    info = refresh(cfg, max_age_minutes=0, debug=debug, still_leader=lock.is_owner)
+                    print(f"[ingest] {datetime.now(timezone.utc).isoformat(timespec='seconds')} -> {info}")
+                except Exception as e:
+                    metrics.inc("ingest_refresh_failures_total")
+                    print(f"[ingest] 刷新失敗：{e}")
+                try:
+                    metrics.write_textfile()
+                except OSError as e:
+                    print(f"[ingest] metrics textfile 寫入失敗：{e}")
+            elif debug:
+                print(f"[ingest] 其他 process 持有 {lock.path}，本輪略過")
+
+            # 共享記憶體鏡像是每台機器各自的，不論是否為 leader 都要同步
+            if shm_on:
+                try:
+                    sync_shared_frames(cfg, debug=debug)
+                except Exception as e:
+                    print(f"[ingest] 共享記憶體同步失敗：{e}")
+
+            if once:
+                return
+            now = time.time()
+            time.sleep(max(0.0, next_run_at(now, interval_s, offset_s) - now))
@@ -0,0 +1,273 @@
+# api_loader/shm_store.py
+# 同一台機器上多個 Streamlit / 服務 process 共用的解碼後雷達格點（/dev/shm 記憶體檔）
+#
+# - 只有一個 process（ingest 排程）呼叫 sync_shared_frames：從 hf / local frame store 取最新 revision，
+#   解碼一次後寫進 {root}/{dataset_id}.dbz；其餘 process 以 ShmFrameStore（backend: shm）唯讀 mmap，零複製
+# - 檔案格式：64 bytes header + H*W 個 int8
+#     magic "RDBZ" | 格式版本 u16 | dtype u16 | H u32 | W u32 | seq u64 | obs_time_utc 32 bytes（ASCII，補 0）
+# - 換新時刻：先寫暫存檔再 os.replace（rename 原子性）→ 讀取端只會開到舊檔或新檔，不會看到寫一半的內容；
+#   已 mmap 舊檔的讀取端不受影響（inode 在最後一個 mapping 釋放前不會被回收）
+# - meta.json 最後才換，與 LocalFrameStore 相同；但格點的 revision 一律以 .dbz header 為準
+#   （revision() 與 get_frame() 讀同一個檔案，換檔途中也不會一個新一個舊）
+from __future__ import annotations
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api_loader.frame_store import FrameReader, _atomic_write, _rev_name, get_frame_store, get_publish_store
+from utils import metrics
+from utils.frame_cache import RadarFrame
+from utils.mosaic import MOSAIC_ID
+
+MAGIC = b"RDBZ"
+FORMAT_VERSION = 1
+_DTYPE_INT8 = 1
+_HEADER = struct.Struct("<4sHHIIQ32s")
+HEADER_SIZE = 64  # _HEADER.size = 56，補齊到 64 讓資料起點對齊
+
+DEFAULT_SHM_DIR = "/dev/shm/rainy_radar" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "rainy_radar")
+DEFAULT_KEEP_SIDECARS = 2
+
+
+def _pack_header(h: int, w: int, seq: int, obs_time: str) -> bytes:
+    head = _HEADER.pack(MAGIC, FORMAT_VERSION, _DTYPE_INT8, h, w, seq, obs_time.encode("ascii")[:32])
+    return head.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path: str | Path) -> Optional[Dict[str, Any]]:
+    """讀 .dbz 檔 header（不存在或格式不符 → None）"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(raw) < _HEADER.size:
+        return None
+    magic, ver, dtype, h, w, seq, obs = _HEADER.unpack(raw)
+    if magic != MAGIC or ver != FORMAT_VERSION or dtype != _DTYPE_INT8:
+        return None
+    return {"h": h, "w": w, "seq": seq, "obs_time_utc": obs.rstrip(b"\0").decode("ascii")}
+
+
+def write_shared_frame(path: str | Path, dbz: np.ndarray, obs_time: str) -> int:
+    """
+    ### 寫一張 int8 格點（暫存檔 + os.replace）
+    #### return:
+    - 新的 seq（舊檔 seq + 1）
+    """
+    p = Path(path)
+    arr = np.ascontiguousarray(dbz, dtype=np.int8)
+    h, w = arr.shape
+    prev = read_header(p)
+    seq = (prev["seq"] + 1) if prev else 1
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_pack_header(h, w, seq, obs_time))
+        f.write(memoryview(arr).cast("B"))
+    os.replace(tmp, p)
+    return seq
+
+
+def _map_frame(path: Path) -> Tuple[np.ndarray, Dict[str, Any], int]:
+    """mmap 唯讀開檔 → (int8 (H, W) view, header, inode)；陣列持有 mmap，檔案被換掉後仍有效"""
+    with open(path, "rb") as f:
+        ino = os.fstat(f.fileno()).st_ino
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, ver, dtype, h, w, seq, obs = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or ver != FORMAT_VERSION or dtype != _DTYPE_INT8 or len(mm) != HEADER_SIZE + h * w:
+        mm.close()
+        raise ValueError(f"❌ 共享記憶體格點格式不符：{path}")
+    arr = np.frombuffer(mm, dtype=np.int8, count=h * w, offset=HEADER_SIZE).reshape(h, w)
+    header = {"h": h, "w": w, "seq": seq, "obs_time_utc": obs.rstrip(b"\0").decode("ascii")}
+    return arr, header, ino
+
+
+class ShmFrameStore(FrameReader):
+    """
+    ### /dev/shm 唯讀 frame store（backend: shm；只實作 FrameReader，發布走 hf / local 再 sync_shared_frames）
+    - {root}/meta.json：來源 store 的 meta（sync_shared_frames 最後才換）
+    - {root}/{dataset_id}.dbz、{root}/mosaic.dbz：目前格點（header + int8）；revision 取自 header
+    - {root}/{dataset_id}.{rev}.png / .tiles.zip：預覽用原始 PNG 與 tile 金字塔（保留最近幾個 revision）
+    - 同一檔案（inode 未變）只 mmap 一次
+    """
+
+    name = "shm"
+
+    def __init__(self, root: str | Path = DEFAULT_SHM_DIR):
+        self.root = Path(root)
+        self._meta: Dict[str, Any] = {}
+        self._meta_mtime: Optional[int] = None
+        self._maps: Dict[str, Tuple[int, np.ndarray, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _dbz_path(self, dataset_id: str) -> Path:
+        return self.root / f"{dataset_id}.dbz"
+
+    def _sidecar(self, dataset_id: str, rev: str, suffix: str) -> Path:
+        return self.root / f"{dataset_id}.{_rev_name(rev)}{suffix}"
+
+    def get_meta(self, force: bool = False) -> Dict[str, Any]:
+        p = self.root / "meta.json"
+        try:
+            mtime = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if force or mtime != self._meta_mtime:
+                with open(p, "r", encoding="utf-8") as f:
+                    self._meta = json.load(f)
+                self._meta_mtime = mtime
+            return self._meta
+
+    def _header(self, name: str) -> Optional[Dict[str, Any]]:
+        """目前檔案的 header（與已 attach 的是同一個 inode 時不必再讀檔）"""
+        path = self._dbz_path(name)
+        try:
+            ino = os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._maps.get(name)
+            if cached and cached[0] == ino:
+                return cached[2]
+        return read_header(path)
+
+    def revision(self, dataset_id: str, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """單站 revision：.dbz header 的 obs_time_utc（與 get_frame 讀同一個檔案；meta 參數不使用）"""
+        header = self._header(dataset_id)
+        return header["obs_time_utc"] if header else None
+
+    def mosaic_revision(self, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """拼圖 revision：meta 有拼圖幾何時取 mosaic.dbz header 的 obs_time_utc"""
+        meta = self.get_meta() if meta is None else meta
+        if not meta.get("mosaic"):
+            return None
+        header = self._header(MOSAIC_ID)
+        return header["obs_time_utc"] if header else None
+
+    def _attach(self, name: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """取目前的 mmap（檔案被換過才重新 attach）"""
+        path = self._dbz_path(name)
+        ino = os.stat(path).st_ino
+        with self._lock:
+            cached = self._maps.get(name)
+            if cached and cached[0] == ino:
+                return cached[1], cached[2]
+        with metrics.span("frame_store.attach", store=self.name, dataset=name):
+            arr, header, ino = _map_frame(path)
+        with self._lock:
+            self._maps[name] = (ino, arr, header)
+        return arr, header
+
+    def get_frame(self, dataset_id: str) -> RadarFrame:
+        try:
+            dbz, header = self._attach(dataset_id)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"❌ 共享記憶體沒有 {dataset_id}（ingest 尚未同步？）")
+        rev = header["obs_time_utc"]
+        png = self._sidecar(dataset_id, rev, ".png")
+        return RadarFrame(dataset_id, rev, dbz, image_path=str(png) if png.exists() else None)
+
+    def get_tiles(self, dataset_id: str) -> Optional[bytes]:
+        rev = self.revision(dataset_id)
+        if rev is None:
+            return None
+        try:
+            return self._sidecar(dataset_id, rev, ".tiles.zip").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def get_mosaic(self) -> Optional[np.ndarray]:
+        if self.mosaic_revision() is None:
+            return None
+        try:
+            return self._attach(MOSAIC_ID)[0]
+        except FileNotFoundError:
+            return None
+
+    def list_revisions(self, dataset_id: str) -> List[str]:
+        header = read_header(self._dbz_path(dataset_id))
+        return [header["obs_time_utc"]] if header else []
+
+
+def _prune_sidecars(root: Path, dataset_id: str, keep: int) -> None:
+    for suffix in (".png", ".tiles.zip"):
+        old = sorted(root.glob(f"{dataset_id}.*{suffix}"))
+        for p in old[:-keep]:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def sync_shared_frames(cfg: Dict[str, Any], source: Optional[FrameReader] = None, debug: bool = False) -> List[str]:
+    """
+    ### 把來源 frame store 的最新 revision 同步進共享記憶體
+    - 只處理 revision 有變的站（每張圖只解碼一次，其餘 process 直接 mmap）
+    - 各站格點、拼圖、PNG / tile 都換完後才換 meta.json
+    #### para:
+    - source: 來源 store（預設 cfg['shm']['source']，未設定時同 ingest 發布的 store）
+    #### return:
+    - 本輪更新的名稱（dataset id，拼圖為 "mosaic"）
+    """
+    c = cfg.get("shm") or {}
+    if source is None:
+        source = get_frame_store(cfg, c["source"]) if c.get("source") else get_publish_store(cfg)
+    if source.name == "shm":
+        raise ValueError("shm.source 不可為 shm，請設定 hf 或 local")
+    root = Path(c.get("dir") or DEFAULT_SHM_DIR)
+    keep = max(1, int(c.get("keep_sidecars", DEFAULT_KEEP_SIDECARS)))
+    root.mkdir(parents=True, exist_ok=True)
+
+    meta = source.get_meta(force=True)
+    if not meta:
+        return []
+    updated = []
+    for ds in (meta.get("frames") or {}):
+        rev = source.revision(ds, meta)
+        header = read_header(root / f"{ds}.dbz")
+        if rev is None or (header and header["obs_time_utc"] == rev):
+            continue
+        try:
+            with metrics.span("shm.sync_frame", dataset=ds):
+                frame = source.get_frame(ds)
+                if frame.image_path:
+                    _atomic_write(root / f"{ds}.{_rev_name(rev)}.png", Path(frame.image_path).read_bytes())
+                tiles = source.get_tiles(ds)
+                if tiles:
+                    _atomic_write(root / f"{ds}.{_rev_name(rev)}.tiles.zip", tiles)
+                write_shared_frame(root / f"{ds}.dbz", frame.dbz, rev)
+        except Exception as e:
+            print(f"[shm] 同步 {ds} 失敗：{e}")
+            continue
+        _prune_sidecars(root, ds, keep)
+        updated.append(ds)
+
+    rev = source.mosaic_revision(meta)
+    header = read_header(root / f"{MOSAIC_ID}.dbz")
+    if rev is not None and not (header and header["obs_time_utc"] == rev):
+        try:
+            dbz = source.get_mosaic()
+            if dbz is not None:
+                write_shared_frame(root / f"{MOSAIC_ID}.dbz", dbz, rev)
+                updated.append(MOSAIC_ID)
+        except Exception as e:
+            print(f"[shm] 同步拼圖失敗：{e}")
+
+    data = json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")
+    try:
+        same = (root / "meta.json").read_bytes() == data
+    except FileNotFoundError:
+        same = False
+    if not same:
+        _atomic_write(root / "meta.json", data)
+    if debug:
+        print(f"[shm] {root} 更新：{updated or '無'}")
+    return updated
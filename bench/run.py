@@ -0,0 +1,293 @@
+# bench/run.py
+# 離線效能基準：合成雷達 PNG / O-A0059-001 XML + 本機替身端點，不需要任何金鑰或外網。
+#
+#     python -m bench.run                       # 全部跑，結果寫 bench/results/{commit}.json
+#     python -m bench.run --quick               # 次數較少，適合開發時快速看
+#     python -m bench.run --only check_rain     # 只跑名稱含 check_rain 的項目
+#     python -m bench.run --compare bench/results/abc1234.json
+from __future__ import annotations
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from bench.standins import StandInServer
+from bench.synthetic import history_times, make_grid_xml, make_radar_png
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "bench" / "results"
+
+# 台灣本島範圍內的隨機查詢點
+LAT_RANGE = (21.9, 25.3)
+LON_RANGE = (120.0, 122.0)
+
+
+def measure(
+    fn: Callable[[], Any],
+    *,
+    calls: int,
+    min_time_s: float = 0.0,
+    items: int = 1,
+    warmup: int = 1,
+    setup: Optional[Callable[[], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    ### 重複呼叫 fn 並統計
+    - 先 warmup 次不計；之後至少 calls 次、且累積至少 min_time_s 秒
+    - 峰值記憶體另外用 tracemalloc 量一次（不影響計時）
+    #### para:
+    - items: 每次呼叫處理幾筆（算 throughput 用，例如批次點數）
+    - setup: 每次呼叫前執行、不計時（例如清快取）
+    """
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+
+    lat: List[float] = []
+    start = time.perf_counter()
+    while len(lat) < calls or time.perf_counter() - start < min_time_s:
+        if setup: setup()
+        t = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t)
+
+    if setup: setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    a = np.array(lat) * 1000.0
+    total_s = a.sum() / 1000.0
+    return {
+        "calls": len(lat),
+        "items_per_call": items,
+        "throughput_per_s": round(len(lat) * items / total_s, 3) if total_s > 0 else None,
+        "mean_ms": round(float(a.mean()), 4),
+        "p50_ms": round(float(np.percentile(a, 50)), 4),
+        "p95_ms": round(float(np.percentile(a, 95)), 4),
+        "p99_ms": round(float(np.percentile(a, 99)), 4),
+        "max_ms": round(float(a.max()), 4),
+        "peak_mem_mb": round(peak / 2**20, 3),
+    }
+
+
+def _git_commit() -> tuple:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except Exception:
+        return "unknown", False
+
+
+class BenchEnv:
+    """暫存目錄 + 合成資料 + 替身伺服器 + 指向它們的 config.yaml"""
+
+    def __init__(self, tmp: Path, n_history: int, seed: int = 0):
+        self.tmp = tmp
+        with open(ROOT / "config.yaml", "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        self.stations = [d for d in cfg["fileapi"]["datasets"] if isinstance(d, dict)]
+
+        print("[bench] 產生合成資料…", flush=True)
+        self.png = make_radar_png(seed=seed)  # 各站共用同一張，省產生時間
+        self.xml = make_grid_xml(seed=seed)
+        xmls = [(dt, make_grid_xml(dt, seed=seed + k)) for k, dt in enumerate(history_times(n_history))]
+        self.server = StandInServer({d["id"]: self.png for d in self.stations}, "2025-08-30T12:50:00+08:00", xmls).start()
+
+        cfg["fileapi"]["base_url"] = f"{self.server.base_url}/fileapi"
+        cfg["frame_store"] = {**(cfg.get("frame_store") or {}), "backend": "local", "local_dir": str(tmp / "frame_store")}
+        cfg["historyapi"].update(
+            index_url=f"{self.server.base_url}/history/index.json",
+            format="cube", cube_dir=str(tmp / "radar_cube"), out_dir=str(tmp / "radar_grids"), limit=0,
+        )
+        cfg["nowcast"] = {**(cfg.get("nowcast") or {}), "dir": str(tmp / "nowcast")}
+        cfg["mosaic"] = {**(cfg.get("mosaic") or {}), "index_path": str(tmp / "mosaic_index.npz")}
+        geo_table = tmp / "geocode_static.json"
+        geo_table.write_text(json.dumps({"台北101": ["台北101", 25.033964, 121.564468]}, ensure_ascii=False), encoding="utf-8")
+        cfg["geocode"] = {"backend": "static", "static_path": str(geo_table), "cache_path": str(tmp / "geocode.sqlite")}
+        cfg["ingest"] = {**(cfg.get("ingest") or {}), "lock_path": str(tmp / ".ingest.lock")}
+        self.cfg = cfg
+        self.cfg_path = str(tmp / "config.yaml")
+        with open(self.cfg_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, allow_unicode=True)
+        os.environ.setdefault("CWA_API_KEY", "bench")
+
+        # 先發布一次到 env 的本地 frame store，查詢類項目才有圖可讀
+        from api_loader.fileapi_client import ensure_latest_to_hf_streaming
+        ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+
+    def close(self) -> None:
+        self.server.stop()
+
+
+def run_benchmarks(env: BenchEnv, quick: bool, only: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    # 延後 import：讓 --help 不需要整套相依
+    from check_rain import _find_nearest_dbz, check_rain, check_rain_many
+    from api_loader.fileapi_client import ensure_latest_to_hf_streaming
+    from api_loader.frame_store import decode_png
+    from api_loader.historyapi_client import parse_grid_xml, run_historyapi, save_csv
+    from locate.location import latlon_to_pixel
+    from utils.frame_cache import get_frame_cache
+    from utils.plot_utils import render_preview_pil, render_preview_window
+    from utils.select_radar import select_best_radar
+
+    rng = np.random.default_rng(0)
+    k = 1 if quick else 3
+    pts = np.column_stack([rng.uniform(*LAT_RANGE, 10_000), rng.uniform(*LON_RANGE, 10_000)])
+    rgbs = [tuple(int(c) for c in rgb) for rgb in rng.integers(0, 256, (10_000, 3))]
+    s0 = env.stations[0]
+    radar_cfg = {"lat0": s0["lat"], "lon0": s0["lon"], "h": 3600, "w": 3600, "scale": 11.97}
+    img = Image.open(io.BytesIO(env.png)).convert("RGB")
+    dbz = decode_png(env.png)
+    it = iter(range(10**9))
+
+    def point():
+        i = next(it) % len(pts)
+        return float(pts[i, 0]), float(pts[i, 1])
+
+    def run_check_rain(return_image: bool):
+        lat, lon = point()
+        return check_rain(lat, lon, return_image=return_image, cfg_path=env.cfg_path, store_backend="local")
+
+    def clear_cache():
+        get_frame_cache(env.cfg).clear()
+
+    benches: List[tuple] = [
+        # 名稱, 函式, measure 參數
+        ("ingest.publish", lambda: _publish_fresh(env), dict(calls=k, warmup=0)),
+        ("ingest.noop", lambda: ensure_latest_to_hf_streaming(env.cfg, max_age_minutes=0), dict(calls=5 * k)),
+        ("palette.find_nearest_dbz", lambda: _find_nearest_dbz(rgbs[next(it) % len(rgbs)]), dict(calls=1000 * k, min_time_s=0.2)),
+        ("palette.decode_frame", lambda: decode_png(env.png), dict(calls=2 * k)),
+        ("locate.latlon_to_pixel", lambda: latlon_to_pixel(*point(), radar_cfg), dict(calls=1000 * k, min_time_s=0.2)),
+        ("select.select_best_radar", lambda: select_best_radar(*point(), env.stations), dict(calls=1000 * k, min_time_s=0.2)),
+        ("check_rain.cold", lambda: run_check_rain(False), dict(calls=2 * k, setup=clear_cache)),
+        ("check_rain.warm", lambda: run_check_rain(False), dict(calls=200 * k, min_time_s=0.2)),
+        ("check_rain.warm_preview", lambda: run_check_rain(True), dict(calls=20 * k)),
+        ("check_rain_many.10k", lambda: check_rain_many(pts, cfg_path=env.cfg_path, store_backend="local"), dict(calls=5 * k, items=len(pts))),
+        ("historyapi.parse_grid_xml", lambda: parse_grid_xml(env.xml), dict(calls=2 * k)),
+        ("historyapi.save_csv", lambda: save_csv(_grid_meta(env), env.tmp / "csv_out"), dict(calls=k)),
+        ("historyapi.backfill", lambda: run_historyapi(_fresh_cube_cfg(env)), dict(calls=1, warmup=0)),
+        ("preview.window", lambda: render_preview_window(img, 1800, 1800, half_px=int(30 * 11.97)), dict(calls=50 * k)),
+        ("preview.dbz_window", lambda: render_preview_window(dbz, 1800, 1800, half_px=int(30 * 11.97)), dict(calls=50 * k)),
+        ("preview.full_frame", lambda: render_preview_pil(img, 1800, 1800), dict(calls=5 * k)),
+    ]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn, kw in benches:
+        if only and only not in name:
+            continue
+        print(f"[bench] {name} …", end=" ", flush=True)
+        r = measure(fn, **kw)
+        results[name] = r
+        print(f"p50={r['p50_ms']:.3f} ms  p95={r['p95_ms']:.3f} ms  {r['throughput_per_s']}/s  peak={r['peak_mem_mb']} MB")
+    return results
+
+
+_grid_cache: Dict[int, dict] = {}
+_fresh_n = iter(range(10**9))
+
+
+def _grid_meta(env: BenchEnv) -> dict:
+    if id(env) not in _grid_cache:
+        from api_loader.historyapi_client import parse_grid_xml
+        _grid_cache[id(env)] = parse_grid_xml(env.xml)
+    return _grid_cache[id(env)]
+
+
+def _publish_fresh(env: BenchEnv) -> None:
+    """每次都發布到新的本地 frame store 目錄 → 量到完整的下載 + 解碼 + tile + 發布"""
+    from api_loader import frame_store
+    from api_loader.fileapi_client import ensure_latest_to_hf_streaming
+
+    cfg = json.loads(json.dumps(env.cfg))
+    cfg["frame_store"]["local_dir"] = str(env.tmp / f"frame_store_publish_{next(_fresh_n)}")
+    frame_store._stores.pop("local", None)
+    try:
+        ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    finally:
+        frame_store._stores.pop("local", None)  # 之後的項目改回 env.cfg 的 store
+
+
+def _fresh_cube_cfg(env: BenchEnv) -> dict:
+    """每次都用新的 cube 目錄 → 量到完整 backfill（下載 + 解析 + 寫入 + nowcast）"""
+    cfg = json.loads(json.dumps(env.cfg))
+    n = next(_fresh_n)
+    cfg["historyapi"].update(cube_dir=str(env.tmp / f"radar_cube_{n}"), parse_workers=0)
+    cfg["nowcast"]["dir"] = str(env.tmp / f"nowcast_{n}")
+    return cfg
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """與另一次結果比較 p50（>1 表示變慢）"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\n[bench] 對照 {base['meta'].get('commit')} → {current['meta'].get('commit')}")
+    print(f"{'name':32s} {'base p50':>12s} {'now p50':>12s} {'ratio':>8s}")
+    for name, r in current["results"].items():
+        b = base["results"].get(name)
+        if not b:
+            continue
+        ratio = r["p50_ms"] / b["p50_ms"] if b["p50_ms"] else float("nan")
+        flag = "  ⚠️" if ratio > 1.2 else ""
+        print(f"{name:32s} {b['p50_ms']:12.3f} {r['p50_ms']:12.3f} {ratio:8.2f}{flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Rainy Forecasting 離線效能基準")
+    ap.add_argument("--quick", action="store_true", help="減少重複次數")
+    ap.add_argument("--only", default=None, help="只跑名稱包含此字串的項目")
+    ap.add_argument("--history-frames", type=int, default=6, help="backfill 用幾張合成 XML")
+    ap.add_argument("--out", default=None, help="結果 JSON 路徑（預設 bench/results/{commit}.json）")
+    ap.add_argument("--compare", default=None, help="與另一次結果 JSON 比較")
+    args = ap.parse_args(argv)
+
+    sha, dirty = _git_commit()
+    with tempfile.TemporaryDirectory(prefix="rainy_bench_") as tmp:
+        env = BenchEnv(Path(tmp), n_history=args.history_frames)
+        try:
+            results = run_benchmarks(env, args.quick, args.only)
+        finally:
+            env.close()
+
+    out = {
+        "meta": {
+            "commit": sha,
+            "dirty": dirty,
+            "timestamp_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    path = Path(args.out) if args.out else RESULTS_DIR / f"{sha}{'-dirty' if dirty else ''}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[bench] 結果 → {path}")
+
+    if args.compare:
+        compare(out, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
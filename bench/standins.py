@@ -0,0 +1,89 @@
+# bench/standins.py
+from __future__ import annotations
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class StandInServer:
+    """
+    ### 本機替身端點（不需要金鑰、不連外網）
+    - CWA FileAPI：GET /fileapi/{dataset} → 與 O-A0084-*** 相同結構的 JSON；GET /png/{dataset}.png → PNG bytes
+    - CWA HistoryAPI：GET /history/index.json → time[] 清單；GET /history/{k}.xml → O-A0059-001 XML
+    - HF：以 LocalFrameStore（frame_store.backend: local）代替，不需要網路端點
+    - hits：各路徑被請求的次數
+    """
+
+    def __init__(self, pngs: Dict[str, bytes], obs_time: str, xmls: Optional[List[tuple]] = None):
+        self.pngs = pngs
+        self.obs_time = obs_time
+        self.xmls = xmls or []   # [(dt, xml bytes), ...]
+        self.hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _route(self, path: str) -> tuple:
+        path = path.split("?", 1)[0]
+        if path.startswith("/fileapi/"):
+            ds = path.rsplit("/", 1)[-1]
+            if ds not in self.pngs:
+                return 404, "text/plain", b"not found"
+            j = {"cwaopendata": {"dataset": {
+                "DateTime": self.obs_time,
+                "resource": {"ProductURL": f"{self.base_url}/png/{ds}.png", "resourceDesc": "stand-in"},
+            }}}
+            return 200, "application/json", json.dumps(j).encode("utf-8")
+        if path.startswith("/png/"):
+            data = self.pngs.get(path[len("/png/"):-len(".png")])
+            return (200, "image/png", data) if data else (404, "text/plain", b"not found")
+        if path == "/history/index.json":
+            times = [{"DateTime": dt, "ProductURL": f"{self.base_url}/history/{k}.xml"} for k, (dt, _) in enumerate(self.xmls)]
+            j = {"dataset": {"resources": {"resource": {"data": {"time": times}}}}}
+            return 200, "application/json", json.dumps(j).encode("utf-8")
+        if path.startswith("/history/") and path.endswith(".xml"):
+            k = int(path[len("/history/"):-len(".xml")])
+            return 200, "application/xml", self.xmls[k][1]
+        return 404, "text/plain", b"not found"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                code, ctype, body = server._route(self.path)
+                with server._lock:
+                    key = self.path.split("?", 1)[0]
+                    server.hits[key] = server.hits.get(key, 0) + 1
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
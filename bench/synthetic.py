@@ -0,0 +1,71 @@
+# bench/synthetic.py
+from __future__ import annotations
+import io
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from utils.palette import SCALE_PATH
+
+ECHO_MIN_DBZ = 5.0   # 低於此值畫底色 / 當作無資料
+
+
+def _palette() -> tuple:
+    """rain_intensity_scale.yaml → (dbz 陣列, rgb 陣列)，依 dbz 升冪"""
+    with open(SCALE_PATH, "r", encoding="utf-8") as f:
+        entries = yaml.safe_load(f)["rain_intensity_scale"]
+    entries = sorted(entries, key=lambda e: e["dbz"])
+    return np.array([e["dbz"] for e in entries]), np.array([e["rgb"] for e in entries], dtype=np.uint8)
+
+
+def synthetic_dbz(shape=(3600, 3600), n_cells: int = 20, seed: int = 0, coarse: int = 8) -> np.ndarray:
+    """數個高斯雨胞疊加的 dBZ 場（先在 1/coarse 解析度算再放大，省時間）"""
+    rng = np.random.default_rng(seed)
+    h, w = shape[0] // coarse, shape[1] // coarse
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    f = np.zeros((h, w), dtype=np.float32)
+    for _ in range(n_cells):
+        cy, cx = rng.uniform(0, h), rng.uniform(0, w)
+        r = rng.uniform(0.01, 0.06) * max(h, w)
+        f += rng.uniform(20, 60) * np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / (2 * r * r))
+    f = np.kron(f, np.ones((coarse, coarse), dtype=np.float32))[: shape[0], : shape[1]]
+    f += rng.normal(0, 1.0, f.shape).astype(np.float32)
+    return np.minimum(f, 65, out=f)
+
+
+def make_radar_png(shape=(3600, 3600), seed: int = 0) -> bytes:
+    """以色階表上色的單站雷達 PNG（無回波處為色階表最低一格的底色）"""
+    dbz_levels, rgbs = _palette()
+    f = synthetic_dbz(shape, seed=seed)
+    idx = np.clip(np.searchsorted(dbz_levels, np.rint(f)), 0, len(dbz_levels) - 1)
+    img = rgbs[idx]
+    img[f < ECHO_MIN_DBZ] = rgbs[0]
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_grid_xml(dt: Optional[str] = None, nx: int = 921, ny: int = 881, seed: int = 0) -> bytes:
+    """O-A0059-001 格式的合成雷達回波 XML（科學記號，-999 為無資料）"""
+    dt = dt or "2025-08-30T12:50:00+08:00"
+    f = synthetic_dbz((ny, nx), seed=seed, coarse=1)
+    f[f < ECHO_MIN_DBZ] = -999.0
+    values = ",".join(np.char.mod("%.3E", f.ravel()).tolist())
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<cwaopendata xmlns="urn:cwa:gov:tw:cwacommon:0.1"><dataset><datasetInfo><parameterSet>'
+        f"<DateTime>{dt}</DateTime><StartPointLongitude>115.0</StartPointLongitude>"
+        f"<StartPointLatitude>18.0</StartPointLatitude><GridResolution>0.0125</GridResolution>"
+        f"<GridDimensionX>{nx}</GridDimensionX><GridDimensionY>{ny}</GridDimensionY>"
+        f"</parameterSet></datasetInfo><contents><content>{values}</content></contents></dataset></cwaopendata>"
+    ).encode("utf-8")
+
+
+def history_times(n: int, end: Optional[datetime] = None, interval_min: int = 10) -> List[str]:
+    """往回 n 個整 10 分鐘時刻（+08:00，舊到新）"""
+    end = end or datetime(2025, 8, 30, 4, 50, tzinfo=timezone.utc)
+    tz = timezone(timedelta(hours=8))
+    return [(end - timedelta(minutes=interval_min * k)).astimezone(tz).isoformat() for k in range(n - 1, -1, -1)]
@@ -1,32 +1,54 @@
 import os
-import yaml
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
 
 import numpy as np
-from PIL import Image
-from huggingface_hub import hf_hub_download
-import streamlit as st
 
-from locate.location import latlon_to_pixel as _latlon_to_pixel
-from utils.plot_utils import render_preview_pil as _render_preview_pil
-from utils.select_radar import select_best_radar as _select_best_radar
+from utils.plot_utils import render_preview_window as _render_preview_window
+from utils.station_registry import get_station_registry as _get_station_registry
+from utils.palette import get_palette_decoder as _get_palette_decoder
+from utils.frame_cache import RadarFrame, get_frame_cache as _get_frame_cache
+from utils.tiles import TilePack
+from utils.area_stats import AreaStats, DEFAULT_BLOCK_PX as _AREA_BLOCK_PX
+from utils.mosaic import Mosaic, NODATA as _NODATA_DBZ
+from utils.nowcast import get_nowcast as _get_nowcast
+from api_loader.frame_store import get_frame_store as _get_frame_store
+from api_loader.history_store import get_history_cube as _get_history_cube, to_utc as _to_utc
+from utils.config_loader import load_config as _load_config
+from utils import metrics as _metrics
+
+# 降雨等級表：(中文描述, (mm/hr 下限, 上限))；上限 None 表示以上
+# 最後一列是「無資料」（拼圖 / 歷史格點沒有雷達涵蓋的點），索引 _RAIN_CLASS_NODATA = -1 正好取到它
+_RAIN_CLASSES = (
+    ("無雨", (0, 0)),
+    ("幾乎無雨", (0, 0.1)),
+    ("小雨", (0.1, 2.5)),
+    ("中雨", (2.5, 10)),
+    ("大雨", (10, 50)),
+    ("豪雨", (50, 100)),
+    ("極端強降雨", (100, None)),
+    ("無資料", (None, None)),
+)
+_RAIN_CLASS_NODATA = -1
+# 超出雷達圖範圍的點的半徑統計
+_AREA_NODATA = {"mean_dbz": np.nan, "mean_rain_mmh": np.nan, "coverage": np.nan, "max_class": _RAIN_CLASS_NODATA}
+_RAIN_CLASS_EDGES = (20, 30, 40, 50, 60)  # dbz > 0 之後的分級門檻（含）
+_RAIN_DESC = np.array([c[0] for c in _RAIN_CLASSES], dtype=object)
+_RAIN_MIN = np.array([np.nan if c[1][0] is None else c[1][0] for c in _RAIN_CLASSES], dtype=np.float32)
+_RAIN_MAX = np.array([np.nan if c[1][1] is None else c[1][1] for c in _RAIN_CLASSES], dtype=np.float32)
+
+def _dbz_to_rain_class(dbz):
+    """dBZ（純量或陣列）→ 降雨等級索引 0..6；NODATA（int8 -128）/ NaN → _RAIN_CLASS_NODATA"""
+    dbz = np.asarray(dbz)
+    cls = (dbz > 0).astype(np.int8)
+    for edge in _RAIN_CLASS_EDGES:
+        cls += dbz >= edge
+    nodata = np.isnan(dbz) if dbz.dtype.kind == "f" else dbz == _NODATA_DBZ
+    return np.where(nodata, np.int8(_RAIN_CLASS_NODATA), cls)
 
 def _dbz_to_rain_intensity(dbz: int):
-    if dbz <= 0:
-        return "無雨", (0, 0)
-    elif dbz < 20:
-        return "幾乎無雨", (0, 0.1)
-    elif dbz < 30:
-        return "小雨", (0.1, 2.5)
-    elif dbz < 40:
-        return "中雨", (2.5, 10)
-    elif dbz < 50:
-        return "大雨", (10, 50)
-    elif dbz < 60:
-        return "豪雨", (50, 100)
-    else:
-        return "極端強降雨", (100, None)
+    return _RAIN_CLASSES[int(_dbz_to_rain_class(dbz))]
 
 def _find_nearest_dbz(rgb: tuple) -> tuple:
     """
@@ -36,21 +58,128 @@ def _find_nearest_dbz(rgb: tuple) -> tuple:
     #### return:
     - (dbz, (R, G, B))
     """
-    # 讀 scale_table
-    with open(r"./library/rain_intensity_scale.yaml", "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
+    # 量化 RGB 查表（整個 process 只建一次）
+    return _get_palette_decoder().nearest(rgb)
+
+
+def _get_frame(cfg: Dict[str, Any], dataset_id: str, store_backend: str | None = None) -> RadarFrame:
+    """從 frame store 讀雷達圖（同一觀測時刻只下載、解碼一次）"""
+    store = _get_frame_store(cfg, store_backend)
+    obs_time = store.revision(dataset_id)
+    if not _metrics.enabled():
+        return _get_frame_cache(cfg).get_or_load(
+            f"{store.name}:{dataset_id}", obs_time, lambda: store.get_frame(dataset_id)
+        )
+
+    loaded = []
+
+    def load():
+        loaded.append(True)
+        with _metrics.span("check_rain.load_frame", dataset=dataset_id):
+            return store.get_frame(dataset_id)
+
+    frame = _get_frame_cache(cfg).get_or_load(f"{store.name}:{dataset_id}", obs_time, load)
+    _metrics.inc("frame_cache_total", result="miss" if loaded else "hit")
+    if frame.obs_time_utc:
+        obs = datetime.fromisoformat(frame.obs_time_utc.replace("Z", "+00:00"))
+        age = datetime.now(timezone.utc) - (obs if obs.tzinfo else obs.replace(tzinfo=timezone.utc))
+        _metrics.set_gauge("frame_age_seconds", age.total_seconds(), dataset=dataset_id)
+    return frame
+
+
+def get_radar_tiles(
+    dataset_id: str,
+    *,
+    cfg_path: str = "./config.yaml",
+    store_backend: str | None = None,
+) -> TilePack | None:
+    """單站最新雷達圖的 tile 金字塔（ingest 沒產生時回傳 None）；同一觀測時刻只下載一次"""
+    cfg = _get_station_registry(cfg_path).cfg
+    store = _get_frame_store(cfg, store_backend)
+    obs_time = store.revision(dataset_id)
+
+    def load():
+        data = store.get_tiles(dataset_id)
+        return TilePack(data) if data else None
+
+    return _get_frame_cache(cfg).get_or_load(f"{store.name}:{dataset_id}:tiles", obs_time, load)
+
+
+def get_mosaic(*, cfg_path: str = "./config.yaml", store_backend: str | None = None) -> Mosaic | None:
+    """最新的全台拼圖（ingest 沒產生時回傳 None）；同一 revision 只下載一次"""
+    cfg = _get_station_registry(cfg_path).cfg
+    store = _get_frame_store(cfg, store_backend)
+    meta = store.get_meta()
+    rev = store.mosaic_revision(meta)
+    if rev is None:
+        return None
+
+    def load():
+        dbz = store.get_mosaic()
+        return Mosaic.from_meta(meta["mosaic"], dbz) if dbz is not None else None
 
-    rgb = np.array(rgb)
-    best_entry, min_dist = None, float("inf")
+    return _get_frame_cache(cfg).get_or_load(f"{store.name}:mosaic", rev, load)
+
+
+def _check_rain_mosaic(mosaic: Mosaic, lats: np.ndarray, lons: np.ndarray) -> Dict[str, Any]:
+    """拼圖版 check_rain_many：一次仿射換算 + 索引"""
+    dbz, i, j = mosaic.lookup(lats, lons)
+    cls = _dbz_to_rain_class(dbz)
+    return {
+        "timestamp_utc": datetime.utcnow().isoformat(timespec="seconds"),
+        "lat": lats,
+        "lon": lons,
+        "best_id": np.full(len(lats), "mosaic", dtype=object),
+        "px": j,
+        "py": i,
+        "dbz": dbz,
+        "rain_class": cls,
+        "desc": _RAIN_DESC[cls],
+        "rng_min": _RAIN_MIN[cls],
+        "rng_max": _RAIN_MAX[cls],
+    }
 
-    for entry in data["rain_intensity_scale"]:
-        entry_rgb = np.array(entry["rgb"])
-        dist = np.linalg.norm(rgb - entry_rgb)
-        if dist < min_dist:
-            min_dist = dist
-            best_entry = entry
 
-    return best_entry["dbz"], tuple(best_entry["rgb"])
+def _get_area_stats(cfg: Dict[str, Any], frame: RadarFrame, store_backend: str | None = None) -> AreaStats:
+    """單站雷達圖的積分影像（同一觀測時刻只建一次，與 frame 一起放在 frame cache）"""
+    store = _get_frame_store(cfg, store_backend)
+    block_px = int((cfg.get("area_stats") or {}).get("block_px", _AREA_BLOCK_PX))
+    return _get_frame_cache(cfg).get_or_load(
+        f"{store.name}:{frame.dataset_id}:area", frame.obs_time_utc, lambda: AreaStats(frame.dbz, block_px)
+    )
+
+
+def _preview_fields(frame: RadarFrame, px: int, py: int, px_per_km: float, preview_km: float | None) -> Dict[str, Any]:
+    """±preview_km 預覽圖與其座標換算；preview_km 為 None 時不產圖（座標即原圖座標）"""
+    preview, (x0, y0, s) = None, (0, 0, 1.0)
+    if preview_km is not None:
+        with _metrics.span("check_rain.preview"):
+            preview, (x0, y0, s) = _render_preview_window(frame.dbz, px, py, half_px=int(preview_km * px_per_km))
+    return {
+        "image": preview,
+        "image_px": (px - x0) * s,
+        "image_py": (py - y0) * s,
+        "image_px_per_km": px_per_km * s,
+    }
+
+
+def add_rain_preview(
+    result: Dict[str, Any],
+    *,
+    preview_km: float = 30,
+    cfg_path: str = "./config.yaml",
+    store_backend: str | None = None,
+) -> Dict[str, Any]:
+    """
+    ### 替 check_rain(return_image=False) 的結果補上預覽圖
+    - 同一觀測時刻的格點直接取快取，不必再查一次 check_rain
+    #### return:
+    - 同一個 result（image / image_px / image_py / image_px_per_km 已更新）
+    """
+    cfg = _get_station_registry(cfg_path).cfg
+    frame = _get_frame(cfg, result["best_id"], store_backend)
+    result.update(_preview_fields(frame, result["px"], result["py"], result["px_per_km"], preview_km))
+    return result
 
 
 def check_rain(
@@ -58,63 +187,62 @@ def check_rain(
     lon: float,
     *,
     return_image: bool = True,
+    preview_km: float = 30,
+    radius_km: float | None = None,
     cfg_path: str = "./config.yaml",
+    store_backend: str | None = None,
 ) -> Dict[str, Any]:
+    """
+    ### 單點雨勢
+    - radius_km：有給時另回傳 area（半徑內的平均 dBZ、平均 mm/hr、有雨比例、最大等級；積分影像 O(1) 查詢）
+    """
 
-    # 0) 讀 config (取得雷達站經緯度)
-    with open("./config.yaml", "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f)
-    
-    datasets = cfg["fileapi"]["datasets"]
-
-    # 1) 找最近雷達
-    best_id = _select_best_radar(lat, lon, datasets)
-    radar_info = next((d for d in datasets if d["id"] == best_id), None)
-
-    # 2) 從 HuggingFace Hub 讀雷達 PNG
-    repo_id = st.secrets["HF_REPO_ID"]
-    hf_token = st.secrets["HF_TOKEN"]
-
-    try:
-        img_path = hf_hub_download(
-            repo_id=repo_id,
-            filename=f"radar_new_png/{best_id}.png",
-            repo_type="dataset",
-            token=hf_token,
-            force_download=True,
-        )
-        img = Image.open(img_path).convert("RGB")
-    except Exception as e:
-        raise FileNotFoundError(f"❌ 從 Hugging Face Hub 下載圖檔失敗：{e}")
-    
-    # 3) 經緯度 → 像素
-    radar_cfg = {
-        "lat0": radar_info["lat"],  # 緯度
-        "lon0": radar_info["lon"],  # 經度
-        "h": 3600,                  # 影像高
-        "w": 3600,                  # 影像寬
-        "scale": 11.97              # pixel/km
-    }
-    px, py = _latlon_to_pixel(lat, lon, radar_cfg)
+    # 0) 雷達站註冊表（config 只在檔案變動時重讀）
+    t0 = time.perf_counter()
+    registry = _get_station_registry(cfg_path)
+    cfg = registry.cfg
+    _metrics.configure(cfg)
+    _metrics.observe("check_rain.config_seconds", time.perf_counter() - t0)
 
-    # 確保在圖片範圍內
-    h, w = img.size[:2]
-    px = max(0, min(px, w - 1))
-    py = max(0, min(py, h - 1))
+    # 1) 找最近雷達（歸屬網格查表）
+    with _metrics.span("check_rain.select_station"):
+        station = registry.select(lat, lon)
+    best_id = station.id
 
-    # 4) 取像素 → dBZ
-    rgb = img.getpixel((px, py))
-    dbz, _ = _find_nearest_dbz(rgb) # 找最近的 color
+    # 2) 從 frame store 讀雷達圖（同一觀測時刻只下載、解碼一次）
+    with _metrics.span("check_rain.get_frame", dataset=best_id):
+        frame = _get_frame(cfg, best_id, store_backend)
 
-    # 5) 轉 mm/hr 與等級、中文描述
-    desc, rng = _dbz_to_rain_intensity(dbz)
+    with _metrics.span("check_rain.pixel"):
+        # 3) 經緯度 → 像素（已夾在圖片範圍內）
+        xs, ys, inside = station.to_pixel([lat], [lon], return_inside=True)
+        px, py = int(xs[0]), int(ys[0])
+        h, w = frame.dbz.shape
 
-    # 6) 產預覽圖
-    preview = _render_preview_pil(
-        img=img,
-        px=px,
-        py=py,
-    ) if return_image else None
+        # 4) 取像素 → dBZ（已解碼的格點；超出雷達圖範圍 → 無資料，與拼圖一致）
+        dbz = int(frame.dbz[py, px]) if inside[0] else int(_NODATA_DBZ)
+
+        # 5) 轉 mm/hr 與等級、中文描述
+        desc, rng = _dbz_to_rain_intensity(dbz)
+
+    # 5b) 半徑內統計
+    area = None
+    if radius_km:
+        with _metrics.span("check_rain.area", dataset=best_id):
+            q = _get_area_stats(cfg, frame, store_backend).query(px, py, radius_km * station.scale)
+        if not inside[0]:
+            q = _AREA_NODATA
+        area = {
+            "radius_km": float(radius_km),
+            "mean_dbz": float(q["mean_dbz"]),
+            "mean_rain_mmh": float(q["mean_rain_mmh"]),
+            "coverage": float(q["coverage"]),       # 0..1
+            "max_class": int(q["max_class"]),
+            "max_desc": _RAIN_DESC[int(q["max_class"])],
+        }
+
+    # 6) 產預覽圖：從快取的 dBZ 格點裁 ±preview_km 的視窗再上色（不重開、重解 PNG）
+    view = _preview_fields(frame, px, py, station.scale, preview_km if return_image else None)
 
     # 7) 回傳給前端
     return {
@@ -122,18 +250,207 @@ def check_rain(
         "lat": float(lat),
         "lon": float(lon),
         "best_id": best_id,
-        "radar_name": radar_info.get("name", best_id),
+        "radar_name": station.name,
         "desc": desc,
         "rng": rng,                 # (min, max); max=None 表示以上
-        "image": preview,           # PIL.Image 或 None
-        "px": int(px),
+        "px": int(px),              # 完整雷達圖上的像素座標
         "py": int(py),
-        "px_per_km": 11.97,         # 你的比例
-        "image_w": img.size[0],
-        "image_h": img.size[1],
+        "px_per_km": station.scale,
+        **view,                     # image（PIL.Image 或 None）、image_px / image_py / image_px_per_km（預覽圖座標）
+        "image_w": w,
+        "image_h": h,
+        "area": area,               # radius_km 未給時為 None
     }
 
 
+def check_rain_many(
+    points,
+    *,
+    radius_km: float | None = None,
+    source: str | None = None,
+    cfg_path: str = "./config.yaml",
+    store_backend: str | None = None,
+) -> Dict[str, Any]:
+    """
+    ### 批次查詢多點雨勢
+    #### para:
+    - points: [(lat, lon), ...] 或 (N, 2) 陣列
+    - radius_km: 有給時另算各點半徑內統計（area_* 欄位；只查單站雷達圖）
+    - source: "station"（各點最近雷達）| "mosaic"（全台拼圖；尚未發布時退回 station）；None → cfg['mosaic']['query']
+    - store_backend: 覆寫 config 的 frame_store.backend（"hf" | "local"）
+    #### return:
+    - 欄位式 dict（每個欄位長度 N 的 ndarray）：
+      lat, lon, best_id, px, py, dbz, rain_class, desc, rng_min, rng_max（NaN 表示以上）
+    - 沒有雷達涵蓋的點 dbz 為 NODATA，rain_class 為 _RAIN_CLASS_NODATA（-1），desc 為「無資料」，rng_min / rng_max 為 NaN：
+      station 為超出服務雷達圖範圍（px / py 仍夾在影像邊緣），mosaic 為超出格點或沒有雷達涵蓋
+    - mosaic：best_id 為 "mosaic"，px / py 為格點欄 / 列
+    - radius_km 有給時另有：area_mean_dbz, area_mean_rain_mmh, area_coverage, area_max_class, area_max_desc
+      （無資料的點：前三者為 NaN，area_max_class 為 -1）
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lats, lons = pts[:, 0], pts[:, 1]
+    n = len(pts)
+
+    registry = _get_station_registry(cfg_path)
+    cfg = registry.cfg
+    stations = registry.stations
+    _metrics.configure(cfg)
+    _metrics.inc("check_rain_many_points_total", n)
+
+    if source is None:
+        source = "mosaic" if (cfg.get("mosaic") or {}).get("query", False) else "station"
+    if source == "mosaic" and not radius_km:
+        with _metrics.span("check_rain_many.mosaic"):
+            mosaic = get_mosaic(cfg_path=cfg_path, store_backend=store_backend)
+            if mosaic is not None:
+                return _check_rain_mosaic(mosaic, lats, lons)
+
+    # 1) 歸屬網格查表挑服務雷達
+    with _metrics.span("check_rain_many.select_station"):
+        owner = registry.owner_index(lats, lons) if n else np.zeros(0, dtype=np.int8)
+
+    px = np.zeros(n, dtype=np.int64)
+    py = np.zeros(n, dtype=np.int64)
+    dbz = np.zeros(n, dtype=np.int8)
+    area = {
+        "mean_dbz": np.zeros(n, dtype=np.float32),
+        "mean_rain_mmh": np.zeros(n, dtype=np.float32),
+        "coverage": np.zeros(n, dtype=np.float32),
+        "max_class": np.zeros(n, dtype=np.int8),
+    } if radius_km else None
+
+    # 2) 依站分組：每站只取一次 frame、一次 transform，用 fancy indexing 取像素
+    for k, s in enumerate(stations):
+        sel = np.flatnonzero(owner == k)
+        if sel.size == 0:
+            continue
+        with _metrics.span("check_rain_many.get_frame", dataset=s.id):
+            frame = _get_frame(cfg, s.id, store_backend)
+        with _metrics.span("check_rain_many.pixel", dataset=s.id):
+            x, y, inside = s.to_pixel(lats[sel], lons[sel], return_inside=True)
+            px[sel], py[sel] = x, y
+            dbz[sel] = np.where(inside, frame.dbz[y, x], _NODATA_DBZ)
+        if area is not None:
+            with _metrics.span("check_rain_many.area", dataset=s.id):
+                q = _get_area_stats(cfg, frame, store_backend).query(x, y, radius_km * s.scale)
+            for key, col in area.items():
+                col[sel] = np.where(inside, q[key], _AREA_NODATA[key])
+
+    # 3) dBZ → 等級、mm/hr
+    cls = _dbz_to_rain_class(dbz)
+    ids = np.array([s.id for s in stations], dtype=object)
+    out = {
+        "timestamp_utc": datetime.utcnow().isoformat(timespec="seconds"),
+        "lat": lats,
+        "lon": lons,
+        "best_id": ids[owner] if n else ids[:0],
+        "px": px,
+        "py": py,
+        "dbz": dbz,
+        "rain_class": cls,
+        "desc": _RAIN_DESC[cls],
+        "rng_min": _RAIN_MIN[cls],
+        "rng_max": _RAIN_MAX[cls],
+    }
+    if area is not None:
+        out.update({f"area_{k}": v for k, v in area.items()})
+        out["area_max_desc"] = _RAIN_DESC[area["max_class"]]
+    return out
+
+_TREND_WINDOW_MIN = 30   # 趨勢：最近 30 分鐘 vs 前 30 分鐘的平均 dBZ
+_TREND_THRESHOLD_DBZ = 3
+
+def _describe_trend(times: np.ndarray, dbz: np.ndarray) -> str:
+    """依最近兩個 _TREND_WINDOW_MIN 視窗的平均 dBZ 給出趨勢描述"""
+    ok = ~np.isnan(dbz)
+    if not ok.any():
+        return "資料不足"
+    t, v = times[ok], dbz[ok]
+    w = np.timedelta64(_TREND_WINDOW_MIN, "m")
+    recent, before = v[t > t[-1] - w], v[(t <= t[-1] - w) & (t > t[-1] - 2 * w)]
+    if before.size == 0:
+        return "資料不足"
+    diff = float(np.mean(np.maximum(recent, 0)) - np.mean(np.maximum(before, 0)))
+    if diff >= _TREND_THRESHOLD_DBZ:
+        return "回波增強中"
+    if diff <= -_TREND_THRESHOLD_DBZ:
+        return "回波減弱中"
+    return "持平"
+
+
+def rain_history(
+    lat: float,
+    lon: float,
+    *,
+    hours: float = 6,
+    end: str | datetime | None = None,
+    cfg_path: str = "./config.yaml",
+) -> Dict[str, Any]:
+    """
+    ### 查詢單點過去 N 小時的合成雷達 dBZ（HistoryCube）
+    #### para:
+    - hours: 往回幾小時
+    - end: 結束時刻（UTC）；None 表示 cube 中最新的一張
+    #### return:
+    - times（datetime64[s] UTC）、dbz（float32，NaN 為無資料）、rain_class（無資料為 -1）、desc、max_dbz、trend
+    """
+    cube = _get_history_cube(_load_config(cfg_path))
+    times, _, _ = cube.time_index()
+    dbz = np.zeros(0, dtype=np.float32)
+    if end is not None or len(times):
+        end_dt = _to_utc(end) if end is not None else _to_utc(f"{times[-1]}Z")
+        times, vals = cube.series(lat, lon, start=end_dt - timedelta(hours=hours), end=end_dt)
+        dbz = vals[:, 0]
+    cls = _dbz_to_rain_class(dbz)
+    return {
+        "lat": float(lat),
+        "lon": float(lon),
+        "times": times,
+        "dbz": dbz,
+        "rain_class": cls,
+        "desc": _RAIN_DESC[cls],
+        "max_dbz": float(np.nanmax(dbz)) if np.isfinite(dbz).any() else None,
+        "trend": _describe_trend(times, dbz),
+    }
+
+def forecast_many(points, *, cfg_path: str = "./config.yaml") -> Dict[str, Any] | None:
+    """
+    ### 多點 0–60 分鐘外推預報（讀共用的 Nowcast 立方體，每張新圖只算一次）
+    #### para:
+    - points: [(lat, lon), ...] 或 (N, 2) 陣列
+    #### return:
+    - None（尚無歷史格點可外推）或欄位式 dict：
+      base_time, lead_min (L,), dbz (L, N)（NaN 為無資料 / 範圍外）, rain_class (L, N；無資料為 -1）, max_rain_class (N,)
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    nc = _get_nowcast(_load_config(cfg_path))
+    if nc is None:
+        return None
+    lead, dbz = nc.series(pts[:, 0], pts[:, 1])
+    cls = _dbz_to_rain_class(dbz)
+    return {
+        "base_time": nc.base_time,
+        "lead_min": lead,
+        "dbz": dbz,
+        "rain_class": cls,
+        "max_rain_class": cls.max(axis=0) if len(lead) else np.zeros(len(pts), dtype=np.int8),
+    }
+
+
+def rain_forecast(lat: float, lon: float, *, cfg_path: str = "./config.yaml") -> Dict[str, Any] | None:
+    """單點外推預報：lead_min、dbz、desc（各時效的降雨描述）"""
+    fc = forecast_many([(lat, lon)], cfg_path=cfg_path)
+    if fc is None:
+        return None
+    cls = fc["rain_class"][:, 0]
+    return {
+        "base_time": fc["base_time"],
+        "lead_min": fc["lead_min"],
+        "dbz": fc["dbz"][:, 0],
+        "rain_class": cls,
+        "desc": _RAIN_DESC[cls],
+    }
+
 if __name__ == "__main__":
     # 北部三景點（樹林雷達）
     # check_rain(25.033964, 121.564468)  # 台北101
@@ -1,10 +1,21 @@
+import argparse
+
 from utils.config_loader import load_config
-from api_loader.fileapi_client import run_fileapi
 from api_loader.historyapi_client import run_historyapi
+from api_loader.ingest_scheduler import run_ingest_loop
 
 if __name__ == "__main__":
-    cfg = load_config("config.yaml")
-    run_fileapi(cfg, debug=True) # 最新即時雷達圖
+    ap = argparse.ArgumentParser(description="Rainy Forecasting 資料抓取服務")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--once", action="store_true", help="只刷新一輪後結束")
+    ap.add_argument("--history", action="store_true", help="改跑合成雷達格點（歷史多時刻）")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
 
-    # 合成雷達格點（歷史多時刻）
-    # run_historyapi(cfg, debug=True)
+    cfg = load_config(args.config)
+    if args.history:
+        # 合成雷達格點（歷史多時刻）
+        run_historyapi(cfg, debug=args.debug)
+    else:
+        # 最新即時雷達圖 → HF（排程 + leader lock，只有一個 refresher）
+        run_ingest_loop(cfg, once=args.once, debug=args.debug)
@@ -0,0 +1,185 @@
+# locate/geocode_cache.py
+from __future__ import annotations
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = ".geocode_cache.sqlite"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_EVICT_EVERY = 256  # 每寫入幾筆才清一次過期 / 超量資料（COUNT(*) 要掃整個索引，不每筆都做）
+
+GeocodeResult = Tuple[str, float, float]  # (name, lat, lon)
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(address: str) -> str:
+    """地址正規化：全形 → 半形（NFKC）、去頭尾空白、合併空白、大小寫不分、臺 → 台"""
+    q = unicodedata.normalize("NFKC", address).strip().casefold()
+    return _SPACES.sub(" ", q).replace("臺", "台")
+
+
+class GeocodeCache:
+    """
+    ### 兩層地理編碼快取
+    - 記憶體 LRU：同一 process 內重複查詢免 I/O
+    - SQLite（WAL）：跨 session / process 共用；超過 ttl 視為過期，超過 max_entries 依最後寫入時間淘汰
+      （每 evict_every 次寫入才清一次，因此筆數最多暫時超出 evict_every；過期資料讀取時本來就會略過）
+    - 每個 thread 各自一條 SQLite 連線
+    """
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_CACHE_PATH,
+        *,
+        ttl_s: float = DEFAULT_TTL_DAYS * 86400,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        evict_every: int = DEFAULT_EVICT_EVERY,
+    ):
+        self.path = str(path)
+        self.ttl_s = float(ttl_s)
+        self.max_entries = int(max_entries)
+        self.memory_entries = int(memory_entries)
+        self.evict_every = max(1, int(evict_every))
+        self._puts = 0
+        self._mem: "OrderedDict[str, Tuple[GeocodeResult, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db()  # 先建表
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " query TEXT PRIMARY KEY, name TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS geocode_created ON geocode(created)")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 記憶體層 ----------
+    def _mem_get(self, key: str, now: float) -> Optional[GeocodeResult]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is None:
+                return None
+            if now - hit[1] > self.ttl_s:
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return hit[0]
+
+    def _mem_put(self, key: str, value: GeocodeResult, created: float) -> None:
+        with self._lock:
+            self._mem[key] = (value, created)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.memory_entries:
+                self._mem.popitem(last=False)
+
+    # ---------- 對外 ----------
+    def get(self, address: str) -> Optional[GeocodeResult]:
+        key = normalize_query(address)
+        now = time.time()
+        value = self._mem_get(key, now)
+        if value is not None:
+            return value
+
+        row = self._db().execute(
+            "SELECT name, lat, lon, created FROM geocode WHERE query = ? AND created > ?",
+            (key, now - self.ttl_s),
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        value = (row[0], float(row[1]), float(row[2]))
+        self._mem_put(key, value, row[3])
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        return value
+
+    def put(self, address: str, value: GeocodeResult) -> None:
+        key = normalize_query(address)
+        now = time.time()
+        name, lat, lon = value
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO geocode (query, name, lat, lon, created) VALUES (?, ?, ?, ?, ?)",
+            (key, name, float(lat), float(lon), now),
+        )
+        self._mem_put(key, (name, float(lat), float(lon)), now)
+        with self._lock:
+            self._puts += 1
+            due = self._puts % self.evict_every == 0
+        if due:
+            self._evict(db, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        """刪過期資料；總數超過 max_entries 時刪最舊的一成"""
+        n = db.execute("DELETE FROM geocode WHERE created <= ?", (now - self.ttl_s,)).rowcount
+        count = db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        if count > self.max_entries:
+            drop = count - self.max_entries + self.max_entries // 10
+            n += db.execute(
+                "DELETE FROM geocode WHERE query IN (SELECT query FROM geocode ORDER BY created LIMIT ?)", (drop,)
+            ).rowcount
+        if n:
+            with self._lock:
+                self.stats["evictions"] += n
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+
+class CachedGeocoder:
+    """在任一 geocoder（address → (name, lat, lon)）前面加上 GeocodeCache；找不到地點的例外不快取"""
+
+    def __init__(self, geocoder: Callable[[str], GeocodeResult], cache: GeocodeCache):
+        self.geocoder = geocoder
+        self.cache = cache
+
+    def __call__(self, address: str) -> GeocodeResult:
+        hit = self.cache.get(address)
+        if hit is not None:
+            return hit
+        value = self.geocoder(address)
+        self.cache.put(address, value)
+        return value
+
+
+class StaticGeocoder:
+    """
+    ### 離線用的替身 geocoder
+    - table：{地址: [name, lat, lon]}，或 JSON 檔路徑（相同格式）
+    - 查不到 → ValueError（與 Google 找不到地點相同）
+    """
+
+    def __init__(self, table: Dict[str, Any] | str | Path):
+        if not isinstance(table, dict):
+            if not str(table).strip() or not Path(table).is_file():
+                raise ValueError(f"static geocoder 需要 {{地址: [name, lat, lon]}} 的 JSON 檔，找不到：{str(table)!r}")
+            table = json.loads(Path(table).read_text(encoding="utf-8"))
+        self.table = {normalize_query(k): (v[0], float(v[1]), float(v[2])) for k, v in table.items()}
+
+    def __call__(self, address: str) -> GeocodeResult:
+        hit = self.table.get(normalize_query(address))
+        if hit is None:
+            raise ValueError("找不到地點")
+        return hit
@@ -1,24 +1,103 @@
-import streamlit as st
-import googlemaps
+import threading
+from functools import lru_cache
 
+from locate.geocode_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_EVICT_EVERY, DEFAULT_MAX_ENTRIES, DEFAULT_MEMORY_ENTRIES, DEFAULT_TTL_DAYS,
+    CachedGeocoder, GeocodeCache, StaticGeocoder,
+)
+from utils.config_loader import load_config
+from utils.secrets import get_secret
 
-gmaps = googlemaps.Client(key=st.secrets["GEO_API_KEY"])
 
-def geocode_and_name(address: str) -> tuple:
+@lru_cache(maxsize=1)
+def _client():
+    """googlemaps.Client 第一次用到時才建立（離線 / 替身 geocoder 不需要 googlemaps 與金鑰）"""
+    import googlemaps
+    return googlemaps.Client(key=get_secret("GEO_API_KEY"))
+
+
+def google_geocode(address: str) -> tuple:
     """
-    ### 地址轉經緯度
+    ### 地址轉經緯度（直接呼叫 Google Geocoding API，不經快取）
     #### para:
     - address: 地址或地名
     #### return:
     - (name, lat, lon)"""
-    result = gmaps.geocode(address, region="TW", components={"country": "TW"})
+    result = _client().geocode(address, region="TW", components={"country": "TW"})
     if not result:
         raise ValueError("找不到地點")
     loc = result[0]["geometry"]["location"]
     name = result[0]["formatted_address"]
 
     return name, loc["lat"], loc["lng"]
-    
+
+
+_geocoders: dict = {}
+_geocoders_lock = threading.Lock()
+
+
+def get_geocoder(cfg: dict | None = None) -> CachedGeocoder:
+    """
+    ### 依 cfg['geocode'] 取得共用的快取 geocoder
+    - backend: google（預設）| static（離線替身，讀 static_path 的 JSON）
+    """
+    c = (cfg or {}).get("geocode") or {}
+    backend = c.get("backend", "google")
+    key = (backend, c.get("static_path"), c.get("cache_path", DEFAULT_CACHE_PATH))
+    with _geocoders_lock:
+        g = _geocoders.get(key)
+        if g is None:
+            if backend == "google":
+                inner = google_geocode
+            elif backend == "static":
+                if not c.get("static_path"):
+                    raise ValueError("geocode.backend: static 需要設定 geocode.static_path（{地址: [name, lat, lon]} JSON）")
+                inner = StaticGeocoder(c["static_path"])
+            else:
+                raise ValueError(f"未知的 geocode.backend：{backend}（可用 google / static）")
+            cache = GeocodeCache(
+                c.get("cache_path", DEFAULT_CACHE_PATH),
+                ttl_s=float(c.get("ttl_days", DEFAULT_TTL_DAYS)) * 86400,
+                max_entries=int(c.get("max_entries", DEFAULT_MAX_ENTRIES)),
+                memory_entries=int(c.get("memory_entries", DEFAULT_MEMORY_ENTRIES)),
+                evict_every=int(c.get("evict_every", DEFAULT_EVICT_EVERY)),
+            )
+            g = _geocoders[key] = CachedGeocoder(inner, cache)
+        return g
+
+
+def geocode_and_name(address: str, cfg_path: str = "./config.yaml") -> tuple:
+    """
+    ### 地址轉經緯度（經過記憶體 + SQLite 快取）
+    #### para:
+    - address: 地址或地名
+    - cfg_path: 設定檔路徑（讀 geocode 區塊；同一組設定共用一個 geocoder）
+    #### return:
+    - (name, lat, lon)"""
+    return get_geocoder(load_config(cfg_path))(address)
+
+
+def directions_polyline(origin: tuple, destination: tuple, mode: str = "driving") -> list:
+    """
+    ### 兩點間的路線折線（Directions API）
+    #### para:
+    - origin, destination: (lat, lon)
+    - mode: driving / walking / bicycling / transit
+    #### return:
+    - [(lat, lon), ...]；找不到路線時回傳 []
+    """
+    import googlemaps
+
+    routes = _client().directions(origin, destination, mode=mode, region="TW")
+    if not routes:
+        return []
+    pts = []
+    for leg in routes[0]["legs"]:
+        for step in leg["steps"]:
+            seg = googlemaps.convert.decode_polyline(step["polyline"]["points"])
+            pts.extend((p["lat"], p["lng"]) for p in (seg[1:] if pts else seg))
+    return pts
+
 
 # Example usage:
 
@@ -19,6 +19,22 @@ def make_aeqd_transform(lat0: float, lon0: float) -> tuple:
 
     return fwd, inv
 
+def aeqd_to_pixel(E, N, radar_cfg) -> tuple:
+    """
+    ### AEQD 平面座標 → 像素座標（支援 ndarray，未四捨五入）
+    #### para:
+    - E, N: 距雷達中心的東向、北向距離 (公尺)
+    - radar_cfg: 雷達站設定 (h, w, scale, 可選 cx, cy)
+    #### return:
+    - (x, y): 浮點像素座標
+    """
+    km_per_m = 1.0 / 1000.0
+    x0 = radar_cfg.get("cx", radar_cfg["w"] / 2)
+    y0 = radar_cfg.get("cy", radar_cfg["h"] / 2)
+    x = x0 + (E * km_per_m) * radar_cfg["scale"]
+    y = y0 - (N * km_per_m) * radar_cfg["scale"]
+    return x, y
+
 def latlon_to_pixel(lat: float, lon: float, radar_cfg) -> tuple:
     """
     ### 經緯度轉像素座標
@@ -32,12 +48,6 @@ def latlon_to_pixel(lat: float, lon: float, radar_cfg) -> tuple:
     
     # AEQD: 距雷達中心的當地平面座標 (公尺)
     E, N = _fwd.transform(lon, lat)
-    km_per_m = 1.0 / 1000.0
-    x0 = radar_cfg.get("cx", radar_cfg["w"] / 2)
-    y0 = radar_cfg.get("cy", radar_cfg["h"] / 2)
-    x = x0 + (E * km_per_m) * radar_cfg["scale"]
-    y = y0 - (N * km_per_m) * radar_cfg["scale"]
+    x, y = aeqd_to_pixel(E, N, radar_cfg)
 
     return int(round(x)), int(round(y))
-
-
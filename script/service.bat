@@ -0,0 +1 @@
+python service.py
\ No newline at end of file
@@ -0,0 +1,633 @@
+# service.py
+# 無介面的 HTTP 查詢服務（asyncio + 標準函式庫），與 Streamlit 並行跑，給其他服務以程式呼叫
+#
+#     python service.py --config config.yaml --port 8080 --workers 4
+#
+# 端點（全部回 JSON，/metrics 除外）：
+# - GET  /v1/point?lat=&lon=[&radius_km=&source=station|mosaic]   （source=mosaic 不能帶 radius_km）
+# - POST /v1/batch   {"points": [[lat, lon], ...], "radius_km"?, "source"?}
+# - POST /v1/route   {"polyline": [[lat, lon], ...]} 或 {"origin": [lat, lon], "destination": [lat, lon], "mode"?}
+#                    另可帶 step_m、segment_km、radius_km、forecast
+# - GET  /v1/series?lat=&lon=[&hours=6&forecast=1]   過去 N 小時（HistoryCube）+ 0–60 分鐘外推
+# - GET  /healthz、GET /metrics（Prometheus text format）
+#
+# - 熱路徑不 import Streamlit（金鑰由環境變數提供，見 utils.secrets）
+# - 雷達圖走 check_rain 共用的 frame cache；workers > 1 時建議 frame_store.backend: shm（各 process 零複製共用同一份格點）
+# - 同一時刻進來的單點查詢合併成一次 check_rain_many（相同座標只算一次）；
+#   其餘端點完全相同的請求（method + 路徑 + body）執行中只算一次，後到的等同一個結果
+# - 查詢都丟到執行緒池，event loop 只負責收送
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from check_rain import _RAIN_CLASS_NODATA, check_rain_many, rain_forecast, rain_history
+from utils import metrics
+from utils.config_loader import load_config
+from utils.route import DEFAULT_SEGMENT_KM, DEFAULT_STEP_M, get_route, route_rain_profile, sample_count
+from utils.station_registry import get_station_registry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_THREADS = 4
+DEFAULT_MAX_BODY_KB = 1024
+DEFAULT_MAX_POINTS = 50000
+_COORD_DECIMALS = 6     # 單點合併用的座標精度（約 0.1 m，遠小於一個雷達像素）
+_F32_DECIMALS = 6       # float32 欄位輸出時四捨五入（避免 0.10000000149 這類尾數）
+_SOURCES = (None, "station", "mosaic")
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- JSON ----------
+def _jsonable(obj: Any) -> Any:
+    """numpy / datetime → JSON 可序列化（NaN → null，datetime64 → ISO 8601 UTC）"""
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "M":
+            return np.datetime_as_string(obj, unit="s", timezone="UTC").tolist()
+        if obj.dtype == np.float32:
+            obj = np.round(obj.astype(np.float64), _F32_DECIMALS)
+        if obj.dtype.kind == "f":
+            return np.where(np.isfinite(obj), obj.astype(object), None).tolist()
+        if obj.dtype.kind == "O":
+            return [_jsonable(v) for v in obj.tolist()]
+        return obj.tolist()
+    if isinstance(obj, np.datetime64):
+        return str(np.datetime_as_string(obj, unit="s", timezone="UTC"))
+    if isinstance(obj, np.float32):
+        obj = round(float(obj), _F32_DECIMALS)
+    elif isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if obj is None or isinstance(obj, (str, int, bool)):
+        return obj
+    return None  # PIL.Image 等不回傳
+
+
+def _nodata_null(res: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """rain_class 為無資料（-1）的位置：rain_class / dbz / 半徑統計等級改成 null（desc 已是「無資料」，NaN → null）"""
+    if not res or "rain_class" not in res:
+        return res
+    nodata = np.asarray(res["rain_class"]) == _RAIN_CLASS_NODATA
+    if not nodata.any():
+        return res
+    out = dict(res)
+    for k in ("rain_class", "dbz", "area_max_class", "area_rain_class"):
+        if k in out:
+            out[k] = np.where(nodata, None, np.asarray(out[k]).astype(object))
+    return out
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(_jsonable(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ---------- 參數 ----------
+def _float(params: Dict[str, Any], name: str, default: Optional[float] = None, lo: float = -math.inf, hi: float = math.inf) -> Optional[float]:
+    v = params.get(name)
+    if v is None or v == "" or v == [""]:
+        return default
+    try:
+        x = float(v[0] if isinstance(v, list) else v)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"參數 {name} 不是數字：{v!r}")
+    if not (lo <= x <= hi):
+        raise HttpError(400, f"參數 {name} 超出範圍 [{lo}, {hi}]：{x}")
+    return x
+
+
+def _latlon(params: Dict[str, Any]) -> Tuple[float, float]:
+    lat = _float(params, "lat", lo=-90, hi=90)
+    lon = _float(params, "lon", lo=-180, hi=180)
+    if lat is None or lon is None:
+        raise HttpError(400, "缺少參數 lat / lon")
+    return lat, lon
+
+
+def _radius(params: Dict[str, Any]) -> Optional[float]:
+    r = _float(params, "radius_km", default=0.0, lo=0, hi=100)
+    return r or None
+
+
+def _source(params: Dict[str, Any]) -> Optional[str]:
+    v = params.get("source")
+    v = (v[0] if isinstance(v, list) else v) or None
+    if v not in _SOURCES:
+        raise HttpError(400, f"source 只能是 station / mosaic：{v!r}")
+    return v
+
+
+def _radius_source(params: Dict[str, Any]) -> Tuple[Optional[float], Optional[str]]:
+    """radius_km 與 source 一起驗證：半徑統計只有單站雷達圖能算，明確指定 mosaic 又帶 radius_km 直接 400（不默默改查 station）"""
+    radius_km, source = _radius(params), _source(params)
+    if radius_km and source == "mosaic":
+        raise HttpError(400, "source=mosaic 不支援 radius_km（半徑統計只查單站雷達圖），請改用 source=station 或不帶 radius_km")
+    return radius_km, source
+
+
+def _flag(params: Dict[str, Any], name: str) -> bool:
+    v = params.get(name)
+    v = v[0] if isinstance(v, list) else v
+    return v in (True, 1) or str(v).lower() in ("1", "true", "yes")
+
+
+def _points(value: Any, name: str, max_points: int, min_points: int = 1) -> np.ndarray:
+    try:
+        pts = np.asarray(value, dtype=np.float64).reshape(-1, 2)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} 需為 [[lat, lon], ...]")
+    if len(pts) < min_points:
+        raise HttpError(400, f"{name} 至少需要 {min_points} 個點")
+    if len(pts) > max_points:
+        raise HttpError(400, f"{name} 超過 {max_points} 個點")
+    if not np.isfinite(pts).all() or (np.abs(pts[:, 0]) > 90).any() or (np.abs(pts[:, 1]) > 180).any():
+        raise HttpError(400, f"{name} 含無效座標")
+    return pts
+
+
+def _json_body(body: bytes) -> Dict[str, Any]:
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError as e:
+        raise HttpError(400, f"body 不是合法 JSON：{e}")
+    if not isinstance(data, dict):
+        raise HttpError(400, "body 需為 JSON object")
+    return data
+
+
+# ---------- 查詢 ----------
+class QueryService:
+    """
+    ### 端點實作（與 HTTP 無關，每個 process 一份）
+    #### para:
+    - cfg_path: config.yaml 路徑（check_rain 系列函式依此讀註冊表 / frame store）
+    - store_backend: 覆寫 frame_store.backend
+    - threads: 查詢執行緒池大小
+    """
+
+    def __init__(
+        self,
+        cfg_path: str = "./config.yaml",
+        *,
+        store_backend: Optional[str] = None,
+        threads: int = DEFAULT_THREADS,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ):
+        self.cfg_path = cfg_path
+        self.store_backend = store_backend
+        self.max_points = int(max_points)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, int(threads)), thread_name_prefix="service")
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 單點合併：key → 尚未完成的 Future；_queue 是還沒送出的 key
+        self._points: Dict[Tuple, asyncio.Future] = {}
+        self._queue: List[Tuple] = []
+        self._flush_scheduled = False
+        self._routes = {
+            ("GET", "/v1/point"): self._point,
+            ("POST", "/v1/batch"): self._batch,
+            ("POST", "/v1/route"): self._route,
+            ("GET", "/v1/series"): self._series,
+            ("GET", "/healthz"): self._health,
+            ("GET", "/metrics"): self._metrics,
+        }
+
+    def dispatch(self, method: str, target: str, body: bytes) -> Any:
+        """
+        ### 一個請求 → 回應內容或 asyncio.Future
+        - 回傳 dict / str（立即回應）或 Future（完成後回應）
+        - 參數錯誤丟 HttpError
+        """
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                raise HttpError(405, f"{url.path} 不支援 {method}")
+            raise HttpError(404, f"沒有這個端點：{url.path}")
+        metrics.inc("service_requests_total", endpoint=url.path)
+        return handler(parse_qs(url.query), body, (method, target, body))
+
+    # ---------- 合併 ----------
+    def _coalesced(self, key: Hashable, fn: Callable[[], Any]) -> asyncio.Future:
+        """完全相同的請求執行中只跑一次"""
+        fut = self._inflight.get(key)
+        if fut is not None:
+            metrics.inc("service_coalesced_total", kind="request")
+            return fut
+        fut = asyncio.get_running_loop().run_in_executor(self.pool, fn)
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return fut
+
+    def _submit_point(self, key: Tuple) -> asyncio.Future:
+        fut = self._points.get(key)
+        if fut is not None:
+            metrics.inc("service_coalesced_total", kind="point")
+            return fut
+        loop = asyncio.get_running_loop()
+        fut = self._points[key] = loop.create_future()
+        self._queue.append(key)
+        if not self._flush_scheduled:
+            # 同一輪 event loop 收到的單點一起送出
+            self._flush_scheduled = True
+            loop.call_soon(self._flush_points)
+        return fut
+
+    def _flush_points(self) -> None:
+        self._flush_scheduled = False
+        keys, self._queue = self._queue, []
+        if not keys:
+            return
+        done = asyncio.get_running_loop().run_in_executor(self.pool, self._run_points, keys)
+        done.add_done_callback(lambda f: self._resolve_points(keys, f))
+
+    def _run_points(self, keys: List[Tuple]) -> Dict[Tuple, Any]:
+        """執行緒池內：依 (radius_km, source) 分組，每組一次 check_rain_many"""
+        groups: Dict[Tuple, List[Tuple]] = {}
+        for key in keys:
+            groups.setdefault(key[2:], []).append(key)
+        names = {s.id: s.name for s in get_station_registry(self.cfg_path).stations}
+        out: Dict[Tuple, Any] = {}
+        for (radius_km, source), group in groups.items():
+            try:
+                with metrics.span("service.point_batch"):
+                    res = check_rain_many(
+                        [k[:2] for k in group], radius_km=radius_km, source=source,
+                        cfg_path=self.cfg_path, store_backend=self.store_backend,
+                    )
+            except Exception as e:
+                out.update((k, e) for k in group)
+                continue
+            metrics.observe("service_point_batch_size", len(group))
+            for i, k in enumerate(group):
+                out[k] = _point_row(res, i, names, radius_km)
+        return out
+
+    def _resolve_points(self, keys: List[Tuple], done: asyncio.Future) -> None:
+        exc = done.exception()
+        results = {} if exc else done.result()
+        for key in keys:
+            fut = self._points.pop(key, None)
+            if fut is None or fut.done():
+                continue
+            r = results.get(key, exc)
+            if isinstance(r, BaseException):
+                fut.set_exception(r)
+            else:
+                fut.set_result(r)
+
+    # ---------- 端點 ----------
+    def _point(self, params, body, key) -> asyncio.Future:
+        lat, lon = _latlon(params)
+        return self._submit_point((round(lat, _COORD_DECIMALS), round(lon, _COORD_DECIMALS), *_radius_source(params)))
+
+    def _batch(self, params, body, key) -> asyncio.Future:
+        data = _json_body(body)
+        pts = _points(data.get("points"), "points", self.max_points)
+        radius_km, source = _radius_source(data)
+
+        def run():
+            with metrics.span("service.batch"):
+                return _nodata_null(check_rain_many(
+                    pts, radius_km=radius_km, source=source, cfg_path=self.cfg_path, store_backend=self.store_backend
+                ))
+
+        return self._coalesced(key, run)
+
+    def _route(self, params, body, key) -> asyncio.Future:
+        data = _json_body(body)
+        polyline = None
+        if data.get("polyline") is not None:
+            polyline = _points(data["polyline"], "polyline", self.max_points, min_points=2)
+        elif data.get("origin") is not None and data.get("destination") is not None:
+            origin = tuple(_points(data["origin"], "origin", 1)[0])
+            destination = tuple(_points(data["destination"], "destination", 1)[0])
+        else:
+            raise HttpError(400, "需要 polyline，或 origin + destination")
+        step_m = _float(data, "step_m", DEFAULT_STEP_M, lo=10, hi=100_000)
+        segment_km = _float(data, "segment_km", DEFAULT_SEGMENT_KM, lo=0.1, hi=1000)
+        radius_km = _radius(data)
+        forecast = _flag(data, "forecast")
+
+        def check_samples(pts, lower_bound: bool = False) -> None:
+            # 取樣點數只由折線長度與 step_m 決定：先算，超過就不做任何查詢
+            n = sample_count(pts[:, 0], pts[:, 1], step_m)
+            if n > self.max_points:
+                raise HttpError(400, f"路線取樣{'至少' if lower_bound else ''} {n} 點，超過上限 {self.max_points}，請加大 step_m")
+
+        # 道路路線不會比起訖點直線短 → 直線就超過的請求不必再查路線
+        if polyline is not None:
+            check_samples(polyline)
+        else:
+            check_samples(np.array([origin, destination], dtype=np.float64), lower_bound=True)
+
+        def run():
+            with metrics.span("service.route"):
+                if polyline is not None:
+                    pts, route_source = polyline, "polyline"
+                else:
+                    pts, route_source = get_route(origin, destination, mode=str(data.get("mode") or "driving"))
+                    check_samples(pts)
+                prof = route_rain_profile(
+                    pts, step_m=step_m, segment_km=segment_km, radius_km=radius_km, forecast=forecast,
+                    cfg_path=self.cfg_path, store_backend=self.store_backend,
+                )
+            prof.update(samples=_nodata_null(prof["samples"]), segments=_nodata_null(prof["segments"]))
+            return {"route_source": route_source, "polyline": pts, **prof}
+
+        return self._coalesced(key, run)
+
+    def _series(self, params, body, key) -> asyncio.Future:
+        lat, lon = _latlon(params)
+        hours = _float(params, "hours", 6.0, lo=0, hi=24 * 7)
+        forecast = _flag(params, "forecast")
+
+        def run():
+            with metrics.span("service.series"):
+                out = {"history": _nodata_null(rain_history(lat, lon, hours=hours, cfg_path=self.cfg_path))}
+                if forecast:
+                    out["forecast"] = _nodata_null(rain_forecast(lat, lon, cfg_path=self.cfg_path))
+            return out
+
+        return self._coalesced(key, run)
+
+    def _health(self, params, body, key) -> Dict[str, Any]:
+        return {"status": "ok", "pid": os.getpid()}
+
+    def _metrics(self, params, body, key) -> str:
+        return metrics.render_prometheus()
+
+    def warm_up(self) -> None:
+        """啟動時先讀各站雷達圖進 frame cache（第一個請求不必等解碼）"""
+        stations = get_station_registry(self.cfg_path).stations
+        try:
+            check_rain_many(
+                [(s.lat, s.lon) for s in stations], source="station",
+                cfg_path=self.cfg_path, store_backend=self.store_backend,
+            )
+        except Exception as e:
+            print(f"[service] 預熱失敗（frame store 尚無資料？）：{e}")
+
+
+def _point_row(res: Dict[str, Any], i: int, names: Dict[str, str], radius_km: Optional[float]) -> Dict[str, Any]:
+    """check_rain_many 的第 i 列 → 單點回應（沒有雷達涵蓋：dbz / rain_class 為 null，desc 為「無資料」）"""
+    best_id = res["best_id"][i]
+    nodata = int(res["rain_class"][i]) == _RAIN_CLASS_NODATA
+    row = {
+        "timestamp_utc": res["timestamp_utc"],
+        "lat": float(res["lat"][i]),
+        "lon": float(res["lon"][i]),
+        "best_id": best_id,
+        "radar_name": names.get(best_id),
+        "dbz": None if nodata else int(res["dbz"][i]),
+        "rain_class": None if nodata else int(res["rain_class"][i]),
+        "desc": res["desc"][i],
+        "rng": [res["rng_min"][i], res["rng_max"][i]],   # max 為 null 表示以上
+        "px": int(res["px"][i]),
+        "py": int(res["py"][i]),
+        "area": None,
+    }
+    if radius_km:
+        row["area"] = {
+            "radius_km": radius_km,
+            "mean_dbz": res["area_mean_dbz"][i],
+            "mean_rain_mmh": res["area_mean_rain_mmh"][i],
+            "coverage": res["area_coverage"][i],
+            "max_class": None if int(res["area_max_class"][i]) == _RAIN_CLASS_NODATA else int(res["area_max_class"][i]),
+            "max_desc": res["area_max_desc"][i],
+        }
+    return row
+
+
+# ---------- HTTP/1.1 ----------
+def _error_status(e: BaseException) -> int:
+    if isinstance(e, HttpError):
+        return e.status
+    if isinstance(e, FileNotFoundError):
+        return 503  # frame store 尚未發布
+    return 500
+
+
+class _HttpProtocol(asyncio.Protocol):
+    """
+    ### 最小 HTTP/1.1：keep-alive、pipelining（依序回應）、Content-Length body
+    - 同一條連線一次只處理一個請求，後面的先留在 buffer
+    """
+
+    def __init__(self, app: QueryService, max_body: int):
+        self.app = app
+        self.max_body = max_body
+        self.transport: Optional[asyncio.Transport] = None
+        self.buf = bytearray()
+        self.busy = False
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
+
+    def connection_lost(self, exc) -> None:
+        self.transport = None
+
+    def data_received(self, data: bytes) -> None:
+        self.buf += data
+        if not self.busy:
+            self._next()
+
+    def _parse(self) -> Optional[Tuple[str, str, bytes, bool]]:
+        end = self.buf.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self.buf) > 65536:
+                raise HttpError(431, "header 過長")
+            return None
+        lines = bytes(self.buf[:end]).decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "request line 格式錯誤")
+        headers = {}
+        for line in lines[1:]:
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if "transfer-encoding" in headers:
+            raise HttpError(501, "不支援 Transfer-Encoding，請帶 Content-Length")
+        try:
+            n = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length 格式錯誤")
+        if n > self.max_body:
+            raise HttpError(413, f"body 超過 {self.max_body // 1024} KB")
+        if len(self.buf) < end + 4 + n:
+            return None
+        body = bytes(self.buf[end + 4:end + 4 + n])
+        del self.buf[:end + 4 + n]
+        conn = headers.get("connection", "").lower()
+        keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+        return method, target, body, keep_alive
+
+    def _next(self) -> None:
+        while not self.busy and self.transport is not None:
+            try:
+                req = self._parse()
+            except HttpError as e:
+                self._respond(e.status, {"error": str(e)}, keep_alive=False)
+                return
+            if req is None:
+                return
+            method, target, body, keep_alive = req
+            try:
+                res = self.app.dispatch(method, target, body)
+            except Exception as e:
+                self._fail(e, keep_alive)
+                continue
+            if isinstance(res, asyncio.Future):
+                self.busy = True
+                res.add_done_callback(lambda f, ka=keep_alive: self._finish(f, ka))
+                return
+            self._respond(200, res, keep_alive)
+
+    def _finish(self, fut: asyncio.Future, keep_alive: bool) -> None:
+        self.busy = False
+        if fut.cancelled():
+            self._respond(503, {"error": "已取消"}, keep_alive=False)
+            return
+        e = fut.exception()
+        if e is not None:
+            self._fail(e, keep_alive)
+        else:
+            self._respond(200, fut.result(), keep_alive)
+        self._next()
+
+    def _fail(self, e: BaseException, keep_alive: bool) -> None:
+        status = _error_status(e)
+        if status >= 500:
+            print(f"[service] {type(e).__name__}: {e}")
+        self._respond(status, {"error": str(e) or type(e).__name__}, keep_alive)
+
+    def _respond(self, status: int, payload: Any, keep_alive: bool) -> None:
+        if self.transport is None:
+            return
+        if isinstance(payload, str):
+            data, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            try:
+                data, ctype = _dumps(payload), "application/json; charset=utf-8"
+            except Exception as e:
+                status, data, ctype = 500, _dumps({"error": f"回應序列化失敗：{e}"}), "application/json; charset=utf-8"
+        if status != 200:
+            metrics.inc("service_errors_total", status=status)
+        head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: {ctype}\r\nContent-Length: {len(data)}\r\n"
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        self.transport.write((head + "\r\n").encode("latin-1") + data)
+        if not keep_alive:
+            self.transport.close()
+            self.transport = None
+
+
+# ---------- 啟動 ----------
+async def serve(
+    cfg_path: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    *,
+    reuse_port: bool = False,
+    debug: bool = False,
+) -> None:
+    """
+    ### 在目前的 event loop 上跑服務（直到被取消）
+    #### para:
+    - reuse_port: 多個 process 共用同一個 port（Linux SO_REUSEPORT）
+    """
+    cfg = load_config(cfg_path)
+    c = cfg.get("service") or {}
+    metrics.configure(cfg)
+    app = QueryService(
+        cfg_path,
+        store_backend=c.get("store_backend") or None,
+        threads=int(c.get("threads", DEFAULT_THREADS)),
+        max_points=int(c.get("max_points", DEFAULT_MAX_POINTS)),
+    )
+    max_body = int(c.get("max_body_kb", DEFAULT_MAX_BODY_KB)) * 1024
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(app.pool, app.warm_up)
+    server = await loop.create_server(
+        lambda: _HttpProtocol(app, max_body), host, port, reuse_port=reuse_port or None, backlog=1024
+    )
+    if debug:
+        print(f"[service] pid {os.getpid()} 監聽 http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_worker(cfg_path: str, host: str, port: int, reuse_port: bool, debug: bool) -> None:
+    try:
+        asyncio.run(serve(cfg_path, host, port, reuse_port=reuse_port, debug=debug))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Rainy Forecasting HTTP 查詢服務")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--host", default=None, help="覆寫 service.host")
+    ap.add_argument("--port", type=int, default=None, help="覆寫 service.port")
+    ap.add_argument("--workers", type=int, default=None, help="覆寫 service.workers（process 數）")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args(argv)
+
+    c = load_config(args.config).get("service") or {}
+    host = args.host or c.get("host") or DEFAULT_HOST
+    port = int(args.port or c.get("port") or DEFAULT_PORT)
+    workers = max(1, int(args.workers or c.get("workers") or 1))
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("[service] 此平台不支援 SO_REUSEPORT，改為單一 process")
+        workers = 1
+
+    print(f"[service] http://{host}:{port}（{workers} 個 process）")
+    if workers == 1:
+        _run_worker(args.config, host, port, False, args.debug)
+        return 0
+
+    import multiprocessing as mp
+    procs = [mp.Process(target=_run_worker, args=(args.config, host, port, True, args.debug), daemon=True) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
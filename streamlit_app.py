@@ -1,25 +1,27 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timezone
 
 from locate.google_maps_client import geocode_and_name
-from api_loader.fileapi_client import ensure_latest_to_hf_streaming
-from utils.UI_view import render_rain_view
+from api_loader.frame_store import get_frame_store
+from utils.UI_view import render_rain_view, render_route_view
 from utils.geo_session import ensure_location
 from utils.config_loader import load_config
 
-def sync_hf_once() -> dict | None:
-    # 已同步過就直接回傳上次資訊
-    if st.session_state.get("hf_synced_once"):
-        return st.session_state.get("hf_sync_info")
+CONFIG_PATH = "config.yaml"
 
-    cfg = load_config("config.yaml")
-    info = ensure_latest_to_hf_streaming(cfg, max_age_minutes=2, debug=False)
+# 設定頁「資料來源」→ frame store backend
+STORE_BACKENDS = {"Hugging Face Dataset": "hf", "本地快取": "local", "共享記憶體": "shm"}
 
-    # 記錄這次結果，整個 Session 期間不再重跑
-    st.session_state["hf_synced_once"] = True
-    st.session_state["hf_sync_info"] = info
-    return info
+def read_published_meta() -> dict | None:
+    """只讀取已發布的 meta.json（更新由 get_data.py 背景排程負責）。"""
+    cfg = load_config(CONFIG_PATH)
+    meta = get_frame_store(cfg, st.session_state.get("store_backend")).get_meta()
+    obs = meta.get("obs_time_utc")
+    if not obs:
+        return None
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(obs.replace("Z", "+00:00"))
+    return {"obs_time_utc": obs, "age_minutes": round(age.total_seconds() / 60.0, 1)}
 
 # Page config
 st.set_page_config(page_title="Rainy Forecasting", page_icon="🌧️", layout="wide")
@@ -45,14 +47,12 @@ PAGES = {
 mode = st.radio("", list(PAGES.keys()), index=0, format_func=lambda x: PAGES[x], horizontal=True)
 
 
-# --- App 啟動：只做一次，同一個使用者 Session 之後不再動 ---
-with st.spinner("同步最新雷達圖…"):
-    info = sync_hf_once()
-    if info:
-        if info.get("need_update"):
-            st.success(f"已更新至 HF（obs={info['obs_time_utc']}）")
-        else:
-            st.info(f"HF 已是最新（obs={info['obs_time_utc']}，{info['age_minutes']} 分鐘前資料）")
+# --- 雷達圖由背景排程發布，頁面只讀 ---
+info = read_published_meta()
+if info:
+    st.info(f"雷達資料 obs={info['obs_time_utc']}（{info['age_minutes']} 分鐘前）")
+else:
+    st.warning("尚未取得已發布的雷達資料")
 
 
 # =============================
@@ -75,23 +75,52 @@ elif mode == 1:  # Address lookup
         address = st.text_input("地址 / 地名", placeholder="例如: 台北101、安平古堡")
         submitted = st.form_submit_button("查詢雨勢", type="primary")
     if submitted and address:
-        name, lat, lon = geocode_and_name(address)
+        name, lat, lon = geocode_and_name(address, cfg_path=CONFIG_PATH)
         render_rain_view(lat, lon, name)
 
 
 elif mode == 2:  # Route lookup
     st.header(PAGES[mode])
 
+    TRAVEL_MODES = {"開車": "driving", "機車 / 自行車": "bicycling", "步行": "walking"}
+    with st.form("form_route"):
+        origin = st.text_input("起點", placeholder="例如: 台北車站")
+        destination = st.text_input("終點", placeholder="例如: 高雄車站")
+        c1, c2, c3, c4 = st.columns(4)
+        travel = c1.selectbox("交通方式", list(TRAVEL_MODES), index=0)
+        step_m = c2.select_slider("取樣間距 (m)", [250, 500, 1000, 2000], value=500)
+        segment_km = c3.select_slider("分段長度 (km)", [1, 2, 5, 10, 20], value=5)
+        radius_km = c4.select_slider("周邊範圍 (km)", [0, 1, 2, 5], value=1)
+        submitted = st.form_submit_button("查詢沿路雨勢", type="primary")
+    if submitted and origin and destination:
+        try:
+            o_name, o_lat, o_lon = geocode_and_name(origin, cfg_path=CONFIG_PATH)
+            d_name, d_lat, d_lon = geocode_and_name(destination, cfg_path=CONFIG_PATH)
+        except Exception as e:
+            st.error(f"地點查詢失敗：{e}")
+        else:
+            st.subheader(f"🧭 {o_name} → {d_name}")
+            render_route_view(
+                (o_lat, o_lon), (d_lat, d_lon),
+                step_m=step_m, segment_km=segment_km, mode=TRAVEL_MODES[travel], radius_km=radius_km or None,
+            )
+
 
 elif mode == 3:  # Settings
     st.header(PAGES[mode])
     st.toggle("深色模式（跟隨系統）", value=True, disabled=True)
     st.selectbox("語言", ["繁體中文", "English"], index=0, disabled=True)
     st.selectbox("單位", ["mm/hr", "inch/hr"], index=0, disabled=True)
-    st.selectbox("資料來源", ["CWA FileAPI", "歷史 API", "Hugging Face Dataset", "本地快取"], index=0)
+    sources = ["CWA FileAPI", "歷史 API", "Hugging Face Dataset", "本地快取", "共享記憶體"]
+    current = st.session_state.get("store_backend") or load_config(CONFIG_PATH).get("frame_store", {}).get("backend", "hf")
+    default_src = next((k for k, v in STORE_BACKENDS.items() if v == current), "Hugging Face Dataset")
+    source = st.selectbox("資料來源", sources, index=sources.index(default_src))
+    if source in STORE_BACKENDS:
+        st.session_state["store_backend"] = STORE_BACKENDS[source]
+    else:
+        st.caption("即時查雨目前只支援 Hugging Face Dataset、本地快取與共享記憶體。")
     st.slider("地圖縮放預設", 5, 12, 8)
     st.segmented_control = st.radio("查詢預設模式", ["定位", "地址", "路線"], horizontal=True)
-    st.caption("此頁為 UI 外觀，功能稍後接上。")
 
 
 elif mode == 4:  # Info / About
@@ -0,0 +1,64 @@
+# tests/test_area_stats.py
+import numpy as np
+import pytest
+
+from utils.area_stats import AreaStats, rain_rate_mmh
+
+H, W = 300, 320
+
+
+@pytest.fixture(scope="module")
+def field():
+    """中央一團回波 + 雜訊；< 5 dBZ 當無回波（-1）"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:H, 0:W]
+    f = (40 * np.exp(-((y - 140) ** 2 + (x - 170) ** 2) / (2 * 60 ** 2)) + rng.normal(0, 3, (H, W))).astype(np.int8)
+    f[f < 5] = -1
+    return f
+
+
+def _brute(f, mask):
+    v = f[mask]
+    cls = (v > 0).astype(int) + sum((v >= e).astype(int) for e in (20, 30, 40, 50, 60))
+    return {
+        "mean_dbz": np.maximum(v, 0).mean(),
+        "mean_rain_mmh": rain_rate_mmh(v).mean(),
+        "coverage": (v > 0).mean(),
+        "max_class": cls.max(),
+        "n_pixels": v.size,
+    }
+
+
+@pytest.mark.parametrize("px, py, r", [(170, 140, 30), (50, 60, 25), (315, 5, 40)])
+def test_square_matches_brute_force_exactly(field, px, py, r):
+    y, x = np.mgrid[0:H, 0:W]
+    want = _brute(field, (np.abs(x - px) <= r) & (np.abs(y - py) <= r))
+    got = AreaStats(field, block_px=1).query(px, py, r, circle=False)
+    assert got["n_pixels"] == want["n_pixels"]
+    assert got["max_class"] == want["max_class"]
+    for k in ("mean_dbz", "mean_rain_mmh", "coverage"):
+        assert got[k] == pytest.approx(want[k], rel=1e-5, abs=1e-6)
+
+
+@pytest.mark.parametrize("block_px, tol_dbz", [(1, 0.5), (4, 1.5)])
+@pytest.mark.parametrize("px, py, r", [(170, 140, 30), (160, 150, 60), (50, 60, 25), (300, 10, 40)])
+def test_circle_close_to_brute_force_circle_mean(field, block_px, tol_dbz, px, py, r):
+    y, x = np.mgrid[0:H, 0:W]
+    want = _brute(field, (x - px) ** 2 + (y - py) ** 2 <= r * r)
+    got = AreaStats(field, block_px=block_px).query(px, py, r)
+    assert abs(float(got["mean_dbz"]) - want["mean_dbz"]) <= tol_dbz
+    assert abs(float(got["coverage"]) - want["coverage"]) <= 0.02
+    assert got["n_pixels"] == pytest.approx(want["n_pixels"], rel=0.2 if block_px > 1 else 0.1)
+
+
+def test_max_class_respects_circle_and_vectorised_queries():
+    f = np.full((100, 100), -1, np.int8)
+    f[50, 50] = 25                 # 圓心：小雨（等級 2）
+    f[50 - 19, 50 - 19] = 55       # 正方形角落（距圓心 ≈ 27 px）：只在正方形內
+    stats = AreaStats(f, block_px=1)
+    assert stats.query(50, 50, 20)["max_class"] == 2
+    assert stats.query(50, 50, 20, circle=False)["max_class"] == 5
+
+    q = stats.query(np.array([50, 5]), np.array([50, 95]), 3)
+    assert list(q["max_class"]) == [2, 0]
+    assert q["coverage"][1] == 0 and q["mean_rain_mmh"][1] == 0
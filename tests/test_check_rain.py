@@ -0,0 +1,44 @@
+# tests/test_check_rain.py
+import numpy as np
+import pytest
+import yaml
+
+import check_rain
+from api_loader import frame_store
+from utils import frame_cache
+
+OBS = "2025-08-30T04:50:00Z"
+# 兩站、各 40×40 像素、0.2 px/km（影像涵蓋 ±100 km）
+STATIONS = [
+    {"id": "RADAR-N", "name": "北站", "lat": 25.0, "lon": 121.5, "image_h": 40, "image_w": 40, "px_per_km": 0.2},
+    {"id": "RADAR-S", "name": "南站", "lat": 22.5, "lon": 120.5, "image_h": 40, "image_w": 40, "px_per_km": 0.2},
+]
+
+
+@pytest.fixture
+def stations(tmp_path, monkeypatch):
+    """本地 frame store 發布兩站格點（北站全 35 dBZ、南站全 15 dBZ），回傳 config 路徑"""
+    monkeypatch.setattr(frame_store, "_stores", {})
+    monkeypatch.setattr(frame_cache, "_shared", None)
+    cfg = {
+        "fileapi": {"datasets": STATIONS},
+        "frame_store": {"backend": "local", "local_dir": str(tmp_path / "frame_store")},
+        "mosaic": {"enabled": False},
+    }
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(cfg, allow_unicode=True), encoding="utf-8")
+    grids = {"RADAR-N": np.full((40, 40), 35, np.int8), "RADAR-S": np.full((40, 40), 15, np.int8)}
+    meta = {"obs_time_utc": OBS, "frames": {ds: {"obs_time_utc": OBS, "rev": OBS} for ds in grids}}
+    frame_store.get_frame_store(cfg).put_frames({ds: b"" for ds in grids}, meta, decoded=grids)
+    return str(path)
+
+
+def test_station_path_marks_out_of_range_as_nodata(stations):
+    res = check_rain.check_rain_many([(10.0, 100.0), (25.0, 121.5)], radius_km=5, source="station", cfg_path=stations)
+    assert list(res["rain_class"]) == [check_rain._RAIN_CLASS_NODATA, 3]
+    assert list(res["desc"]) == ["無資料", "中雨"]
+    assert np.isnan(res["rng_min"][0]) and np.isnan(res["area_coverage"][0])
+    assert res["area_max_class"][0] == check_rain._RAIN_CLASS_NODATA
+
+    one = check_rain.check_rain(10.0, 100.0, return_image=False, cfg_path=stations)
+    assert one["desc"] == "無資料" and one["rng"] == (None, None)
@@ -0,0 +1,76 @@
+# tests/test_frame_cache.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.frame_cache import FrameCache
+
+
+def _arr(nbytes):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = FrameCache(max_bytes=300)
+    for ds in ("A", "B", "C"):
+        cache.get_or_load(ds, "t1", lambda: _arr(100))
+    assert cache.total_bytes == 300
+
+    cache.get("A", "t1")                       # A 變成最近使用
+    cache.get_or_load("D", "t1", lambda: _arr(100))
+    assert cache.get("B", "t1") is None        # 最久沒用的 B 被淘汰
+    assert cache.get("A", "t1") is not None and cache.get("C", "t1") is not None
+    assert cache.total_bytes == 300 and cache.stats["evictions"] == 1
+
+
+def test_oversized_value_is_not_cached():
+    cache = FrameCache(max_bytes=100)
+    cache.get_or_load("A", "t1", lambda: _arr(101))
+    assert cache.get("A", "t1") is None and cache.total_bytes == 0
+
+
+def test_newer_obs_time_invalidates_older():
+    cache = FrameCache(max_bytes=1000)
+    cache.get_or_load("A", "t1", lambda: _arr(100))
+    cache.get_or_load("A", "t2", lambda: _arr(100))
+    assert cache.get("A", "t1") is None and cache.total_bytes == 100
+    # 比目前最新還舊的時刻 → 回傳但不入快取
+    cache.get_or_load("A", "t0", lambda: _arr(100))
+    assert cache.get("A", "t0") is None
+
+
+def test_concurrent_misses_load_once():
+    cache = FrameCache(max_bytes=1000)
+    calls = []
+    gate = threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(5)
+        return _arr(10)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("A", "t1", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    while cache.stats["misses"] + cache.stats["waits"] < 8:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert cache.stats == {"hits": 0, "misses": 1, "waits": 7, "evictions": 0}
+
+
+def test_loader_error_is_not_cached():
+    cache = FrameCache(max_bytes=1000)
+
+    def boom():
+        raise RuntimeError("下載失敗")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("A", "t1", boom)
+    assert cache.get_or_load("A", "t1", lambda: _arr(10)).size == 10
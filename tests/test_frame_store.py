@@ -0,0 +1,99 @@
+# tests/test_frame_store.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from api_loader import fileapi_client, frame_store
+
+DS = "O-A0084-001"
+
+
+def _png(rgb) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), rgb).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def cwa(tmp_path, monkeypatch):
+    """本地 frame store + 假的 CWA FileAPI（obsTime / PNG bytes 可由測試改）"""
+    state = {"obs": "2025-08-30T12:50:00+08:00", "png": _png((0, 255, 0))}
+    monkeypatch.setenv("CWA_API_KEY", "test")
+    monkeypatch.setattr(frame_store, "_stores", {})
+    monkeypatch.setattr(fileapi_client, "fetch_fileapi_json", lambda *a, **k: {
+        "cwaopendata": {"dataset": {"DateTime": state["obs"], "resource": {"ProductURL": "http://cwa.test/a.png"}}}
+    })
+    monkeypatch.setattr(fileapi_client, "_download_image_bytes", lambda *a, **k: state["png"])
+    cfg = {
+        "fileapi": {"datasets": [{"id": DS}]},
+        "frame_store": {"backend": "local", "local_dir": str(tmp_path / "frame_store")},
+        "tiles": {"enabled": False},
+        "mosaic": {"enabled": False},
+    }
+    return cfg, state
+
+
+def test_same_bytes_under_new_obs_time_keeps_file_revision(cwa):
+    cfg, state = cwa
+    fileapi_client.ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    store = frame_store.get_frame_store(cfg)
+    first = store.get_frame(DS)
+    assert first.obs_time_utc == "2025-08-30T04:50:00Z"
+
+    # CWA 換了 obsTime，但圖檔內容一模一樣 → 不寫新檔，revision 不前進
+    state["obs"] = "2025-08-30T12:52:00+08:00"
+    res = fileapi_client.ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    assert res["changed"] == []
+    meta = store.get_meta(force=True)
+    assert meta["frames"][DS]["obs_time_utc"] == "2025-08-30T04:52:00Z"
+    assert meta["frames"][DS]["rev"] == "2025-08-30T04:50:00Z"
+    frame = store.get_frame(DS)
+    assert frame.obs_time_utc == "2025-08-30T04:50:00Z"
+    np.testing.assert_array_equal(frame.dbz, first.dbz)
+
+    # 內容真的變了 → 新 revision
+    state["obs"] = "2025-08-30T12:54:00+08:00"
+    state["png"] = _png((255, 0, 0))
+    res = fileapi_client.ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    assert res["changed"] == [DS]
+    frame = store.get_frame(DS)
+    assert frame.obs_time_utc == "2025-08-30T04:54:00Z"
+    assert not np.array_equal(frame.dbz, first.dbz)
+
+
+def test_local_publish_reuses_ingest_decode(cwa, monkeypatch):
+    cfg, _ = cwa
+
+    def no_decode(*a, **k):
+        raise AssertionError("put_frames 不應再解碼一次")
+
+    monkeypatch.setattr(frame_store, "decode_png", no_decode)
+    fileapi_client.ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    assert frame_store.get_frame_store(cfg).get_frame(DS).dbz.shape == (8, 8)
+
+
+def test_shm_revision_follows_dbz_header(cwa, tmp_path):
+    from api_loader.shm_store import ShmFrameStore, sync_shared_frames, write_shared_frame
+
+    cfg, _ = cwa
+    cfg["shm"] = {"dir": str(tmp_path / "shm")}
+    fileapi_client.ensure_latest_to_hf_streaming(cfg, max_age_minutes=0)
+    assert sync_shared_frames(cfg) == [DS]
+    shm = ShmFrameStore(tmp_path / "shm")
+    assert shm.revision(DS) == shm.get_frame(DS).obs_time_utc == "2025-08-30T04:50:00Z"
+
+    # 換檔途中（.dbz 已換、meta.json 還沒換）：revision 與 get_frame 仍一致
+    write_shared_frame(tmp_path / "shm" / f"{DS}.dbz", np.full((8, 8), 30, np.int8), "2025-08-30T05:00:00Z")
+    frame = shm.get_frame(DS)
+    assert shm.revision(DS) == frame.obs_time_utc == "2025-08-30T05:00:00Z"
+    assert int(frame.dbz[0, 0]) == 30
+
+
+def test_publish_store_rejects_shm(cwa):
+    cfg, _ = cwa
+    cfg["frame_store"]["backend"] = "shm"
+    cfg["shm"] = {"source": "shm"}
+    with pytest.raises(ValueError):
+        frame_store.get_publish_store(cfg)
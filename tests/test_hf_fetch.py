@@ -0,0 +1,36 @@
+# tests/test_hf_fetch.py
+import os
+
+from api_loader import hf_fetch
+
+DS = "O-A0084-001"
+
+
+def _snapshot(root, commit, blob):
+    """HF 快取的配置：snapshots/{commit}/… 是連到 blobs/{etag} 的 symlink"""
+    (root / "blobs").mkdir(exist_ok=True)
+    (root / "blobs" / blob).write_bytes(blob.encode())
+    p = root / "snapshots" / commit / "radar_new_png" / f"{DS}.png"
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.symlink_to(os.path.relpath(root / "blobs" / blob, p.parent))
+    return str(p)
+
+
+def test_unchanged_blob_under_new_commit_is_revalidation(tmp_path, monkeypatch):
+    state = {"cached": None, "download": _snapshot(tmp_path, "c1", "etag-a")}
+    monkeypatch.setattr(hf_fetch, "try_to_load_from_cache", lambda **k: state["cached"])
+    monkeypatch.setattr(hf_fetch, "hf_hub_download", lambda **k: state["download"])
+    f = hf_fetch.HFRadarFetcher("user/radar")
+
+    f.fetch_file(DS, ".png", rev="r1")
+    assert f.get_stats()["misses"] == 1
+
+    # 新的 dataset commit（別站換圖），這張 PNG 的 blob 沒變
+    state["cached"], state["download"] = state["download"], _snapshot(tmp_path, "c2", "etag-a")
+    f.fetch_file(DS, ".png", rev="r2")
+    assert f.get_stats()["revalidations"] == 1 and f.get_stats()["misses"] == 1
+
+    # 內容真的變了 → miss
+    state["cached"], state["download"] = state["download"], _snapshot(tmp_path, "c3", "etag-b")
+    f.fetch_file(DS, ".png", rev="r3")
+    assert f.get_stats()["misses"] == 2
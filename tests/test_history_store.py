@@ -0,0 +1,80 @@
+# tests/test_history_store.py
+import numpy as np
+import pytest
+
+from api_loader.history_store import (
+    DBZ_MIN, DBZ_STEP, NODATA, HistoryCube, dequantize_dbz, migrate_csv_dir, quantize_dbz,
+)
+
+GEO = {"nx": 4, "ny": 3, "dx_deg": 0.0125, "lon0": 120.0, "lat0": 22.0}
+
+
+def _meta(dt, value):
+    return {**GEO, "dt": dt, "dbz": np.full((3, 4), value, np.float32)}
+
+
+def test_missing_chunk_reads_as_nodata(tmp_path):
+    cube = HistoryCube(tmp_path / "cube")
+    cube.append(_meta("2025-08-29T23:50:00Z", 20.0))
+    cube.append(_meta("2025-08-30T00:00:00Z", 30.0))
+    (tmp_path / "cube" / "chunk_20250829.npy").unlink()
+
+    reader = HistoryCube(tmp_path / "cube")
+    times, vals = reader.series(22.0125, 120.0125)
+    assert len(times) == 2
+    assert np.isnan(vals[0, 0]) and vals[1, 0] == pytest.approx(30.0)
+    assert np.isnan(reader.frame("2025-08-29T23:50:00Z")).all()
+
+
+def test_quantize_round_trip_within_half_step():
+    dbz = np.array([-40.0, -32.0, -0.3, 0.0, 12.25, 37.6, 95.0, 200.0, np.nan], np.float32)
+    back = dequantize_dbz(quantize_dbz(dbz))
+    assert quantize_dbz(dbz)[-1] == NODATA and np.isnan(back[-1])
+    inside = (dbz >= DBZ_MIN) & (dbz <= DBZ_MIN + 254 * DBZ_STEP)
+    assert np.all(np.abs(back[inside] - dbz[inside]) <= DBZ_STEP / 2)
+    assert back[0] == DBZ_MIN and back[-2] == DBZ_MIN + 254 * DBZ_STEP   # 範圍外夾在兩端
+
+
+def test_append_and_series_round_trip(tmp_path):
+    cube = HistoryCube(tmp_path / "cube")
+    rng = np.random.default_rng(0)
+    grids = {}
+    for k, dt in enumerate(["2025-08-30T12:40:00+08:00", "2025-08-30T12:50:00+08:00"]):
+        g = rng.uniform(-10, 60, (3, 4)).astype(np.float32)
+        g[0, 0] = np.nan
+        grids[cube.append({**GEO, "dt": dt, "dbz": g})] = g
+    assert cube.times() == ["2025-08-30T04:40:00Z", "2025-08-30T04:50:00Z"]
+
+    reader = HistoryCube(tmp_path / "cube")
+    for key, g in grids.items():
+        np.testing.assert_allclose(reader.frame(key), g, atol=DBZ_STEP / 2)
+    # 格點 (i, j) 的中心：lat0 + i*dx、lon0 + j*dx；(0, 0) 為 NaN、範圍外也是 NaN
+    lats = np.array([22.0, 22.0125, 22.025, 30.0])
+    lons = np.array([120.0, 120.025, 120.0375, 120.0])
+    times, vals = reader.series(lats, lons, start="2025-08-30T04:45:00Z")
+    assert [str(t) for t in times] == ["2025-08-30T04:50:00"]
+    g = grids["2025-08-30T04:50:00Z"]
+    np.testing.assert_allclose(vals[0, 1:3], [g[1, 2], g[2, 3]], atol=DBZ_STEP / 2)
+    assert np.isnan(vals[0, 0]) and np.isnan(vals[0, 3])
+
+
+def test_off_grid_time_is_rejected(tmp_path):
+    cube = HistoryCube(tmp_path / "cube")
+    cube.append(_meta("2025-08-30T00:00:00Z", 20.0))
+    with pytest.raises(ValueError):
+        cube.append(_meta("2025-08-30T00:07:00Z", 25.0))
+    assert "2025-08-30T00:07:00Z" not in cube
+
+
+def test_migrate_csv_dir(tmp_path):
+    from api_loader.historyapi_client import save_csv
+
+    g = np.arange(12, dtype=np.float32).reshape(3, 4) * 5
+    g[1, 1] = np.nan
+    for dt in ("2025-08-30T04:40:00Z", "2025-08-30T04:50:00Z"):
+        save_csv({**GEO, "dt": dt, "dbz": g}, tmp_path / "csv")
+    assert migrate_csv_dir(tmp_path / "csv", tmp_path / "cube") == 2
+
+    cube = HistoryCube(tmp_path / "cube")
+    assert cube.times() == ["2025-08-30T04:40:00Z", "2025-08-30T04:50:00Z"]
+    np.testing.assert_allclose(cube.frame("2025-08-30T04:50:00Z"), g, atol=DBZ_STEP / 2)
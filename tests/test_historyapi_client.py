@@ -0,0 +1,41 @@
+# tests/test_historyapi_client.py
+import numpy as np
+import pytest
+
+from api_loader import historyapi_client
+
+HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<cwaopendata xmlns="urn:cwa:gov:tw:cwacommon:0.1"><dataset><datasetInfo><parameterSet>'
+    "<DateTime>2025-08-30T12:50:00+08:00</DateTime><StartPointLongitude>115.0</StartPointLongitude>"
+    "<StartPointLatitude>18.0</StartPointLatitude><GridResolution>0.0125</GridResolution>"
+    "<GridDimensionX>3</GridDimensionX><GridDimensionY>2</GridDimensionY>"
+    "</parameterSet></datasetInfo><contents><content>"
+)
+TAIL = "</content></contents></dataset></cwaopendata>"
+
+
+def _chunks(xml: bytes, size: int):
+    return [xml[i:i + size] for i in range(0, len(xml), size)]
+
+
+@pytest.mark.parametrize("values", [
+    "1.250E+01,-9.990E+02,3.000E+01,\n4.000E+01,5.000E+01,6.000E+01,",  # 結尾逗號
+    "1.250E+01,,-9.990E+02,3.000E+01,4.000E+01,5.000E+01,6.000E+01",     # 中間 ",,"
+])
+def test_content_skips_empty_tokens(values):
+    meta = historyapi_client.parse_grid_xml(HEAD + values + TAIL)
+    np.testing.assert_array_equal(meta["dbz"], [[12.5, np.nan, 30.0], [40.0, 50.0, 60.0]])
+
+
+def test_content_split_mid_number_across_chunks():
+    xml = (HEAD + "1.250E+01,-9.990E+02,3.000E+01,4.000E+01,5.000E+01,6.000E+01," + TAIL).encode("utf-8")
+    whole = historyapi_client.parse_grid_xml(xml)["dbz"]
+    # 每 7 bytes 一塊 → 數字會被切在中間（例如 "1.25" | "0E+01"）
+    streamed = historyapi_client.parse_grid_xml(iter(_chunks(xml, 7)))["dbz"]
+    np.testing.assert_array_equal(streamed, whole)
+
+
+def test_content_size_mismatch_raises():
+    with pytest.raises(ValueError):
+        historyapi_client.parse_grid_xml(HEAD + "1,2,3,4,5" + TAIL)
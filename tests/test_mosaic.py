@@ -0,0 +1,63 @@
+# tests/test_mosaic.py
+import numpy as np
+
+from utils.grid_geometry import GridGeometry
+from utils.mosaic import NODATA, Mosaic, MosaicIndex, _signature
+from utils.station_registry import stations_from_config
+
+GEOM = GridGeometry(lon0=119.0, lat0=21.5, dx=0.05, nx=60, ny=90)
+# 兩站影像 ±100 km，中間重疊
+STATIONS = [
+    {"id": "RADAR-N", "lat": 25.0, "lon": 121.5, "image_h": 40, "image_w": 40, "px_per_km": 0.2},
+    {"id": "RADAR-S", "lat": 23.8, "lon": 120.8, "image_h": 40, "image_w": 40, "px_per_km": 0.2},
+]
+
+
+def test_merge_takes_max_where_stations_overlap():
+    geom = GridGeometry(lon0=0.0, lat0=0.0, dx=1.0, nx=3, ny=2)
+    idx = MosaicIndex(geom, {
+        "A": (np.array([0, 1, 2], np.int32), np.array([0, 1, 2], np.int32)),
+        "B": (np.array([2, 3], np.int32), np.array([0, 1], np.int32)),
+    })
+    out = idx.merge({
+        "A": np.array([[10, 20], [30, 0]], np.int8),
+        "B": np.array([[45, -5]], np.int8),
+        "C": np.array([[60]], np.int8),          # 不在對照表 → 略過
+    })
+    np.testing.assert_array_equal(out, [[10, 20, 45], [-5, NODATA, NODATA]])
+    # 缺站時只用有的站
+    np.testing.assert_array_equal(idx.merge({"B": np.array([[5, 6]], np.int8)}).ravel(),
+                                  [NODATA, NODATA, 5, 6, NODATA, NODATA])
+
+
+def test_built_index_matches_per_station_sampling(tmp_path):
+    stations = stations_from_config({"fileapi": {"datasets": STATIONS}})
+    rng = np.random.default_rng(0)
+    frames = {s.id: rng.integers(-10, 60, (s.h, s.w)).astype(np.int8) for s in stations}
+    idx = MosaicIndex.build(GEOM, stations)
+    got = idx.merge(frames)
+
+    # 逐格逐站：格點中心在影像內的站取最近像素，再取最大值
+    ii, jj = np.indices(GEOM.shape)
+    lat, lon = GEOM.index_to_latlon(ii.ravel(), jj.ravel())
+    want = np.full(lat.size, NODATA, np.int16)
+    for s in stations:
+        x, y, inside = s.to_pixel(lat, lon, return_inside=True)
+        want[inside] = np.maximum(want[inside], frames[s.id][y[inside], x[inside]])
+    np.testing.assert_array_equal(got.ravel(), want)
+    assert (got == NODATA).any() and (got != NODATA).any()
+
+    # 存檔重用；站點設定改了（簽章不同）就不讀
+    sig = _signature(GEOM, stations)
+    idx.save(tmp_path / "index.npz")
+    again = MosaicIndex.load(tmp_path / "index.npz", GEOM, sig)
+    np.testing.assert_array_equal(again.merge(frames), got)
+    assert MosaicIndex.load(tmp_path / "index.npz", GEOM, "other") is None
+
+
+def test_lookup_outside_grid_is_nodata():
+    dbz = np.arange(GEOM.nx * GEOM.ny, dtype=np.int64).reshape(GEOM.shape).astype(np.int8)
+    m = Mosaic("2025-08-30T04:50:00Z", GEOM, dbz)
+    vals, i, j = m.lookup([21.5 + 0.05 * 3, 10.0], [119.0 + 0.05 * 4, 120.0])
+    assert (int(i[0]), int(j[0])) == (3, 4) and vals[0] == dbz[3, 4]
+    assert vals[1] == NODATA and i[1] == -1 and j[1] == -1
@@ -0,0 +1,46 @@
+# tests/test_nowcast.py
+import numpy as np
+import pytest
+
+from utils import nowcast
+from utils.grid_geometry import GridGeometry
+
+
+def _blobs(shape, dy=0.0, dx=0.0):
+    """兩團平滑回波（高斯），整體平移 (dy, dx) 格"""
+    y, x = np.mgrid[0:shape[0], 0:shape[1]].astype(np.float32)
+    a = 45 * np.exp(-((y - 150 - dy) ** 2 + (x - 200 - dx) ** 2) / (2 * 25 ** 2))
+    b = 40 * np.exp(-((y - 260 - dy) ** 2 + (x - 280 - dx) ** 2) / (2 * 35 ** 2))
+    return (a + b).astype(np.float32)
+
+
+@pytest.mark.parametrize("shift", [(2, -3), (4, 4), (8, -12), (-6, 10)])
+def test_motion_recovers_smooth_shift(shift):
+    frames = [_blobs((400, 440), k * shift[0], k * shift[1]) for k in range(3)]
+    v, u = nowcast.estimate_motion(frames)
+    # 回波中心處的移動場應在一格以內
+    vy, ux = nowcast.motion_at(v, u, np.array([150.0, 260.0]), np.array([200.0, 280.0]))
+    np.testing.assert_allclose(vy, shift[0], atol=1.0)
+    np.testing.assert_allclose(ux, shift[1], atol=1.0)
+
+
+def test_advect_moves_echo_along_motion():
+    f0, f1 = _blobs((400, 440)), _blobs((400, 440), 8, -12)
+    v, u = nowcast.estimate_motion([f0, f1])
+    out = nowcast.advect(f1, v, u, steps=2)
+    peak = np.unravel_index(np.nanargmax(out[2]), out[2].shape)
+    assert abs(peak[0] - (150 + 24)) <= 2 and abs(peak[1] - (200 - 36)) <= 2
+
+
+def test_get_nowcast_is_load_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(nowcast, "_cache", {})
+    monkeypatch.setattr(nowcast, "update_nowcast", lambda *a, **k: pytest.fail("查詢端不應重算預報"))
+    cfg = {"nowcast": {"dir": str(tmp_path / "nc")}}
+    assert nowcast.get_nowcast(cfg) is None
+
+    geom = GridGeometry(lon0=118.0, lat0=20.0, dx=0.0125, nx=4, ny=3)
+    nowcast.Nowcast("2025-08-30T04:50:00Z", 10, geom, np.zeros((2, 3, 4), np.uint8)).save(tmp_path / "nc")
+    assert nowcast.get_nowcast(cfg).base_time == "2025-08-30T04:50:00Z"
+
+    cfg["nowcast"]["enabled"] = False
+    assert nowcast.get_nowcast(cfg) is None
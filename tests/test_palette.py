@@ -0,0 +1,43 @@
+# tests/test_palette.py
+import numpy as np
+import pytest
+
+import check_rain
+from utils.palette import _BITS, _N, _SHIFT, get_palette_decoder
+
+
+def _brute_force(dec, rgb):
+    """逐色階比距離（平手取較前面的色階）→ dBZ"""
+    d = ((rgb[:, None, :].astype(np.int64) - dec.rgb[None].astype(np.int64)) ** 2).sum(axis=-1)
+    return dec.dbz[d.argmin(axis=1)]
+
+
+@pytest.fixture(scope="module")
+def dec():
+    return get_palette_decoder()
+
+
+def test_decode_matches_brute_force_on_random_colors(dec):
+    rgb = np.random.default_rng(0).integers(0, 256, (200_000, 3), dtype=np.uint8)
+    np.testing.assert_array_equal(dec.decode(rgb.reshape(400, 500, 3)).ravel(), _brute_force(dec, rgb))
+
+
+def test_decode_matches_brute_force_in_boundary_cells(dec):
+    # 跨色階邊界的量化格：格內每個 8-bit 顏色都要與精確最近色階相同
+    cells = np.flatnonzero(dec._slot >= 0)[::7]
+    base = np.stack([(cells >> (2 * _BITS)) & (_N - 1), (cells >> _BITS) & (_N - 1), cells & (_N - 1)], axis=-1) << _SHIFT
+    off = np.stack([x.ravel() for x in np.meshgrid(*[np.arange(1 << _SHIFT)] * 3, indexing="ij")], axis=-1)
+    rgb = (base[:, None, :] + off[None]).reshape(-1, 3).astype(np.uint8)
+    np.testing.assert_array_equal(dec.decode(rgb[None]).ravel(), _brute_force(dec, rgb))
+
+
+def test_palette_colors_round_trip(dec):
+    np.testing.assert_array_equal(dec.decode(dec.rgb[None]).ravel(), dec.dbz)
+    np.testing.assert_array_equal(dec.colorize(dec.dbz), dec.rgb)
+
+
+def test_find_nearest_dbz_matches_decode(dec):
+    rgb = np.random.default_rng(1).integers(0, 256, (500, 3), dtype=np.uint8)
+    want = _brute_force(dec, rgb)
+    got = [check_rain._find_nearest_dbz(tuple(int(c) for c in p))[0] for p in rgb]
+    np.testing.assert_array_equal(got, want)
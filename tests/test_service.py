@@ -0,0 +1,116 @@
+# tests/test_service.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import service
+
+
+def _dispatch(app, method, target, body=None):
+    """在 event loop 內呼叫 dispatch；Future 則等它完成"""
+    async def run():
+        res = app.dispatch(method, target, json.dumps(body).encode() if body is not None else b"")
+        return await res if isinstance(res, asyncio.Future) else res
+    return asyncio.run(run())
+
+
+def _status(app, method, target, body=None):
+    try:
+        _dispatch(app, method, target, body)
+    except Exception as e:
+        return service._error_status(e)
+    return 200
+
+
+@pytest.fixture
+def app():
+    app = service.QueryService("config.yaml", threads=2, max_points=100)
+    yield app
+    app.pool.shutdown(wait=True)
+
+
+def test_mosaic_with_radius_is_rejected(app):
+    assert _status(app, "GET", "/v1/point?lat=25&lon=121.5&radius_km=2&source=mosaic") == 400
+    assert _status(app, "POST", "/v1/batch", {"points": [[25, 121.5]], "radius_km": 2, "source": "mosaic"}) == 400
+
+
+@pytest.fixture
+def fake_rain(monkeypatch):
+    """替身 check_rain_many：記錄每次呼叫的點，dbz = round(lat)"""
+    calls = []
+
+    def check_rain_many(points, *, radius_km=None, source=None, cfg_path=None, store_backend=None):
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        calls.append((pts.tolist(), radius_km, source))
+        n = len(pts)
+        dbz = np.rint(pts[:, 0]).astype(np.int8)
+        res = {
+            "timestamp_utc": "2025-08-30T04:50:00", "lat": pts[:, 0], "lon": pts[:, 1],
+            "best_id": np.full(n, "RADAR-N", dtype=object), "px": np.zeros(n, np.int64), "py": np.zeros(n, np.int64),
+            "dbz": dbz, "rain_class": np.ones(n, np.int8), "desc": np.full(n, "幾乎無雨", dtype=object),
+            "rng_min": np.zeros(n, np.float32), "rng_max": np.full(n, 0.1, np.float32),
+        }
+        if radius_km:
+            res.update(area_mean_dbz=np.zeros(n, np.float32), area_mean_rain_mmh=np.zeros(n, np.float32),
+                       area_coverage=np.zeros(n, np.float32), area_max_class=np.zeros(n, np.int8),
+                       area_max_desc=np.full(n, "無雨", dtype=object))
+        return res
+
+    monkeypatch.setattr(service, "check_rain_many", check_rain_many)
+    monkeypatch.setattr(service, "get_station_registry", lambda path: SimpleNamespace(stations=[]))
+    return calls
+
+
+@pytest.mark.parametrize("method, target, body, status", [
+    ("GET", "/healthz", None, 200),
+    ("GET", "/nope", None, 404),
+    ("POST", "/v1/point", None, 405),
+    ("GET", "/v1/point?lat=25", None, 400),
+    ("GET", "/v1/point?lat=95&lon=121", None, 400),
+    ("GET", "/v1/point?lat=25&lon=121&source=radar", None, 400),
+    ("POST", "/v1/batch", {"points": "x"}, 400),
+    ("POST", "/v1/batch", {"points": [[25, 121]] * 101}, 400),
+    ("POST", "/v1/route", {}, 400),
+    ("POST", "/v1/batch", {"points": [[25, 121]]}, 200),
+])
+def test_status_codes(app, fake_rain, method, target, body, status):
+    assert _status(app, method, target, body) == status
+
+
+def test_invalid_json_body_is_400(app):
+    async def run():
+        return app.dispatch("POST", "/v1/batch", b"{not json")
+    with pytest.raises(service.HttpError) as e:
+        asyncio.run(run())
+    assert e.value.status == 400
+
+
+def test_unpublished_frame_store_is_503(app, monkeypatch):
+    def missing(*a, **k):
+        raise FileNotFoundError("meta.json")
+    monkeypatch.setattr(service, "check_rain_many", missing)
+    monkeypatch.setattr(service, "get_station_registry", lambda path: SimpleNamespace(stations=[]))
+    assert _status(app, "GET", "/v1/point?lat=25&lon=121") == 503
+
+
+def test_concurrent_points_are_coalesced(app, fake_rain):
+    async def run():
+        targets = [
+            "/v1/point?lat=25&lon=121", "/v1/point?lat=25.0000001&lon=121",   # 同一格（6 位小數）
+            "/v1/point?lat=23&lon=120", "/v1/point?lat=25&lon=121&radius_km=2",
+        ]
+        futs = [app.dispatch("GET", t, b"") for t in targets]
+        assert futs[0] is futs[1]
+        return await asyncio.gather(*futs)
+
+    rows = asyncio.run(run())
+    # 同一輪 event loop：依 (radius_km, source) 分組，各一次 check_rain_many，相同座標只算一次
+    assert sorted(fake_rain, key=lambda c: str(c[1])) == [
+        ([[25.0, 121.0]], 2.0, None),
+        ([[25.0, 121.0], [23.0, 120.0]], None, None),
+    ]
+    assert [r["dbz"] for r in rows] == [25, 25, 23, 25]
+    assert rows[0]["area"] is None and rows[3]["area"]["radius_km"] == 2.0
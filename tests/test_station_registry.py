@@ -0,0 +1,43 @@
+# tests/test_station_registry.py
+import numpy as np
+import pytest
+
+from utils.config_loader import load_config
+from utils.select_radar import select_best_radar
+from utils.station_registry import TAIWAN_BBOX, StationRegistry
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return StationRegistry.from_config(load_config("config.yaml"))
+
+
+def _expected(registry, lats, lons):
+    datasets = [{"id": s.id, "lat": s.lat, "lon": s.lon} for s in registry.stations]
+    return [select_best_radar(float(a), float(b), datasets) for a, b in zip(lats, lons)]
+
+
+def test_owner_raster_matches_select_best_radar(registry):
+    rng = np.random.default_rng(0)
+    lon_min, lat_min, lon_max, lat_max = TAIWAN_BBOX
+    # 網格範圍內、範圍外各一批
+    lats = np.concatenate([rng.uniform(lat_min, lat_max, 300), rng.uniform(lat_min - 3, lat_max + 3, 100)])
+    lons = np.concatenate([rng.uniform(lon_min, lon_max, 300), rng.uniform(lon_min - 3, lon_max + 3, 100)])
+    ids = np.array([s.id for s in registry.stations])[registry.owner_index(lats, lons)]
+    assert list(ids) == _expected(registry, lats, lons)
+
+
+def test_owner_raster_near_station_boundaries(registry):
+    # 相鄰兩站中垂線附近（歸屬網格的跨界格）：結果仍與逐站比距離相同
+    pts = []
+    for a, b in zip(registry.stations[:-1], registry.stations[1:]):
+        mid = np.array([(a.lat + b.lat) / 2, (a.lon + b.lon) / 2])
+        normal = np.array([a.lon - b.lon, -(a.lat - b.lat)])
+        normal /= np.linalg.norm(normal)
+        for t in np.linspace(-0.5, 0.5, 41):
+            for eps in (-0.003, 0.0, 0.003):
+                pts.append(mid + t * normal + eps * np.array([a.lat - b.lat, a.lon - b.lon]))
+    pts = np.array(pts)
+    ids = np.array([s.id for s in registry.stations])[registry.owner_index(pts[:, 0], pts[:, 1])]
+    assert list(ids) == _expected(registry, pts[:, 0], pts[:, 1])
+    assert registry.select(*pts[0]).id == ids[0]
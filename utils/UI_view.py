@@ -1,14 +1,24 @@
 # utils/UI_view.py
+import pandas as pd
 import streamlit as st
-from check_rain import check_rain
-from utils.map_zoom import show_zoomable_photo_like_map
+from check_rain import add_rain_preview, check_rain, get_radar_tiles, rain_forecast, rain_history
+from utils.route import get_route, route_rain_profile
+from utils.map_zoom import show_tiled_map, show_zoomable_photo_like_map
 
-def render_rain_view(lat: float, lon: float, place_label: str = "目前位置"):
-    """呼叫 check_rain 並顯示結果畫面"""
+def render_rain_view(lat: float, lon: float, place_label: str = "目前位置", radius_km: float = 3):
+    """呼叫 check_rain 並顯示結果畫面（radius_km：另顯示周邊範圍內的雨勢統計）"""
     st.subheader(f"📍 {place_label}")
+    store_backend = st.session_state.get("store_backend")
     with st.spinner("查詢雷達圖與降雨資料中…"):
         try:
-            result = check_rain(lat, lon, return_image=True)
+            result = check_rain(lat, lon, return_image=False, radius_km=radius_km, store_backend=store_backend)
+            # 有 tile 金字塔就只送看得到的 tile；沒有才裁預覽圖
+            try:
+                pack = get_radar_tiles(result["best_id"], store_backend=store_backend)
+            except Exception:
+                pack = None
+            if pack is None:
+                result = add_rain_preview(result, store_backend=store_backend)
         except Exception as e:
             st.error(f"查雨失敗：{e}")
             return
@@ -25,16 +35,119 @@ def render_rain_view(lat: float, lon: float, place_label: str = "目前位置"):
         if result['rng'][1] is not None
         else f"{result['rng'][0]}+",
     )
+    area = result.get("area")
+    if area:
+        st.caption(
+            f"周邊 {area['radius_km']:g} km：有雨面積 {area['coverage']:.0%}、"
+            f"平均 {area['mean_rain_mmh']:.1f} mm/hr、最大 {area['max_desc']}"
+        )
 
-    if result.get("image") is not None:
-        show_zoomable_photo_like_map(
-            result["image"],
+    if pack is not None:
+        show_tiled_map(
+            pack,
             center_px=result["px"],
             center_py=result["py"],
             px_per_km=result["px_per_km"],
             init_km=20,
         )
+    elif result.get("image") is not None:
+        show_zoomable_photo_like_map(
+            result["image"],
+            center_px=result["image_px"],
+            center_py=result["image_py"],
+            px_per_km=result["image_px_per_km"],
+            init_km=20,
+        )
+
+    _render_rain_forecast(lat, lon)
+    _render_rain_history(lat, lon)
 
     # 地圖定位點
     df = {"lat": [result["lat"]], "lon": [result["lon"]]}
     st.map(df, zoom=9)
+
+
+def _render_rain_history(lat: float, lon: float, hours: int = 6):
+    """過去 N 小時的合成雷達 dBZ 折線圖 + 趨勢描述（HistoryCube 沒資料時不顯示）"""
+    try:
+        hist = rain_history(lat, lon, hours=hours)
+    except Exception as e:
+        st.caption(f"歷史雨勢讀取失敗：{e}")
+        return
+    if len(hist["times"]) == 0:
+        return
+
+    st.markdown(f"**過去 {hours} 小時回波**：{hist['trend']}"
+                + (f"（最大 {hist['max_dbz']:.0f} dBZ）" if hist["max_dbz"] is not None else ""))
+    idx = pd.DatetimeIndex(hist["times"]).tz_localize("UTC").tz_convert("Asia/Taipei")
+    st.line_chart(pd.DataFrame({"dBZ": hist["dbz"]}, index=idx))
+
+
+def render_route_view(
+    origin: tuple,
+    destination: tuple,
+    step_m: int = 500,
+    segment_km: float = 5,
+    mode: str = "driving",
+    radius_km: float | None = None,
+):
+    """A→B 路線沿路取樣雨勢：最嚴重路段、雨勢剖面與取樣點地圖（radius_km：另算路線兩側的有雨比例）"""
+    with st.spinner("規劃路線並沿路查詢雨勢中…"):
+        try:
+            polyline, source = get_route(origin, destination, mode=mode)
+            prof = route_rain_profile(
+                polyline,
+                step_m=step_m,
+                segment_km=segment_km,
+                store_backend=st.session_state.get("store_backend"),
+                forecast=True,
+                radius_km=radius_km,
+            )
+        except Exception as e:
+            st.error(f"路線查雨失敗：{e}")
+            return
+
+    seg, w = prof["segments"], prof["worst"]
+    if source == "straight":
+        st.caption("無法取得道路路線，以起訖點直線估計。")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("路線長度", f"{prof['length_km']:.1f} km")
+    col2.metric("最嚴重路段", f"{seg['start_km'][w]:.0f}–{seg['end_km'][w]:.0f} km")
+    col3.metric("", seg["desc"][w])
+
+    samples = prof["samples"]
+    st.line_chart(pd.DataFrame({"dBZ": samples["dbz"]}, index=pd.Index(samples["dist_km"], name="km")))
+    table = pd.DataFrame({
+        "起點 km": seg["start_km"], "終點 km": seg["end_km"],
+        "最大 dBZ": seg["max_dbz"], "平均 dBZ": seg["mean_dbz"], "雨勢": seg["desc"],
+    })
+    if "coverage" in seg:
+        table[f"周邊 {radius_km:g} km 有雨比例"] = seg["coverage"]
+        table["周邊最大雨勢"] = seg["area_desc"]
+    st.dataframe(
+        table,
+        hide_index=True,
+        use_container_width=True,
+    )
+    fc = prof.get("forecast")
+    if fc is not None:
+        st.caption(f"未來 {int(fc['lead_min'][-1])} 分鐘各路段最大回波（外推，基準 {fc['base_time']}）")
+        st.dataframe(
+            pd.DataFrame(fc["max_dbz"].T, columns=[f"+{m} 分" for m in fc["lead_min"]],
+                         index=[f"{a:.0f}–{b:.0f} km" for a, b in zip(seg["start_km"], seg["end_km"])]),
+            use_container_width=True,
+        )
+    st.map({"lat": samples["lat"], "lon": samples["lon"]}, zoom=8, size=60)
+
+
+def _render_rain_forecast(lat: float, lon: float):
+    """0–60 分鐘外推預報（尚無預報時不顯示）"""
+    try:
+        fc = rain_forecast(lat, lon)
+    except Exception as e:
+        st.caption(f"外推預報讀取失敗：{e}")
+        return
+    if fc is None:
+        return
+    steps = [f"+{m} 分 {d}" for m, d in zip(fc["lead_min"][1:], fc["desc"][1:])]
+    st.markdown("**未來一小時（外推）**：" + "、".join(steps))
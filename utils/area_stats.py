@@ -0,0 +1,162 @@
+# utils/area_stats.py
+# 單張雷達 dBZ 格點的積分影像（summed-area table），查任意半徑內的雨勢統計只需 O(1)
+#
+#     stats = AreaStats(frame.dbz, block_px=4)
+#     stats.query(px, py, radius_px)   # px / py 可為陣列
+#     → mean_dbz, mean_rain_mmh, coverage, max_class, n_pixels
+#
+# - 先把格點切成 block_px × block_px 的小區塊再累加（3600² 的圖 block 4 → 900² 的表，約 30 MB），
+#   查詢範圍對齊到區塊邊界（block 4 ≈ 0.33 km，遠小於一般查詢半徑）
+# - 每張表都多一列一欄的 0，矩形和 = 四個角相加減
+# - 圓形以 CIRCLE_STRIPS 條水平矩形近似（每條仍是 O(1)）
+# - 最大等級：先取各區塊的最大等級，再為每個等級 k 建「區塊最大等級 ≥ k 的區塊數」表，數到 > 0 的最大 k
+from __future__ import annotations
+from typing import Dict
+
+import numpy as np
+
+DEFAULT_BLOCK_PX = 4
+CIRCLE_STRIPS = 7            # 圓形近似的水平條數（奇數 → 中心條涵蓋圓心）
+N_RAIN_CLASSES = 7           # 與 check_rain._RAIN_CLASSES 相同（0 無雨 … 6 極端強降雨）
+_CLASS_EDGES = (1, 20, 30, 40, 50, 60)  # 等級 ≥ k 的 dBZ 門檻（k = 1..6）
+
+# Marshall–Palmer：Z = 200 R^1.6 → R = (10^(dBZ/10) / 200)^(1/1.6)
+_ZR_A, _ZR_B = 200.0, 1.6
+_LUT_DBZ = np.arange(256, dtype=np.uint8).view(np.int8).astype(np.float64)  # int8 dBZ 以 uint8 視角索引
+_RATE_LUT = np.where(_LUT_DBZ > 0, (10 ** (_LUT_DBZ / 10) / _ZR_A) ** (1 / _ZR_B), 0.0)
+_CLASS_LUT = sum((_LUT_DBZ >= e).astype(np.uint8) for e in _CLASS_EDGES)
+
+
+def rain_rate_mmh(dbz) -> np.ndarray:
+    """dBZ → 降雨率 mm/hr（Marshall–Palmer；dBZ ≤ 0 視為 0）"""
+    return _RATE_LUT[np.asarray(dbz, dtype=np.int8).view(np.uint8)]
+
+
+def _sat(blocks: np.ndarray, dtype) -> np.ndarray:
+    """(h, w) 區塊和 → (h+1, w+1) 積分影像（第 0 列 / 欄為 0）"""
+    out = np.zeros((blocks.shape[0] + 1, blocks.shape[1] + 1), dtype=dtype)
+    np.cumsum(blocks, axis=0, dtype=dtype, out=out[1:, 1:])
+    np.cumsum(out[1:, 1:], axis=1, dtype=dtype, out=out[1:, 1:])
+    return out
+
+
+class AreaStats:
+    """
+    ### 單張 dBZ 格點的鄰域統計表
+    #### para:
+    - dbz: (H, W) int8 dBZ 格點
+    - block_px: 區塊邊長（像素）；1 → 逐像素精確
+    """
+
+    def __init__(self, dbz: np.ndarray, block_px: int = DEFAULT_BLOCK_PX):
+        dbz = np.asarray(dbz, dtype=np.int8)
+        b = max(1, int(block_px))
+        h, w = dbz.shape
+        hb, wb = -(-h // b), -(-w // b)
+        self.block_px = b
+        self.shape = (h, w)
+
+        # 邊緣不滿一個區塊的部分補 -1（無回波），實際像素數 = 每列有效高 × 每欄有效寬
+        if (hb * b, wb * b) == (h, w):
+            pad = dbz
+        else:
+            pad = np.full((hb * b, wb * b), -1, dtype=np.int8)
+            pad[:h, :w] = dbz
+        rows_n = np.minimum(b, h - np.arange(hb) * b)
+        cols_n = np.minimum(b, w - np.arange(wb) * b)
+
+        def block_reduce(a, ufunc, dtype):
+            return ufunc.reduce(ufunc.reduce(a.reshape(-1, b, wb, b), axis=3, dtype=dtype), axis=1)
+
+        # 降雨率、等級分批換算，避免整張 float64 暫存陣列
+        rate = np.empty((hb, wb), dtype=np.float64)
+        cls_max = np.empty((hb, wb), dtype=np.uint8)
+        for i in range(0, hb, 64):
+            band = pad[i * b:(i + 64) * b].view(np.uint8)
+            rate[i:i + 64] = block_reduce(_RATE_LUT[band], np.add, np.float64)
+            cls_max[i:i + 64] = block_reduce(_CLASS_LUT[band], np.maximum, np.uint8)
+
+        self._n = _sat(np.outer(rows_n, cols_n).astype(np.int32), np.int32)
+        self._dbz = _sat(block_reduce(np.maximum(pad, 0), np.add, np.int32), np.int64)
+        self._rate = _sat(rate, np.float64)
+        self._wet = _sat(block_reduce(pad > 0, np.add, np.int32), np.int32)
+        self._ge = np.stack([_sat(cls_max >= k, np.int32) for k in range(2, N_RAIN_CLASSES)])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._n.nbytes + self._dbz.nbytes + self._rate.nbytes + self._wet.nbytes + self._ge.nbytes)
+
+    # ---------- 矩形 ----------
+    def _rect(self, table: np.ndarray, r0, c0, r1, c1):
+        """區塊座標 [r0, r1) × [c0, c1) 的和；table 可多一個前置維度"""
+        return table[..., r1, c1] - table[..., r0, c1] - table[..., r1, c0] + table[..., r0, c0]
+
+    def _block_range(self, lo, hi, n_blocks: int):
+        """像素範圍 [lo, hi]（含）→ 區塊範圍 [b0, b1)，夾在格點內"""
+        b = self.block_px
+        b0 = np.clip(np.floor(lo / b), 0, n_blocks).astype(np.int64)
+        b1 = np.clip(np.floor(hi / b) + 1, 0, n_blocks).astype(np.int64)
+        return b0, np.maximum(b1, b0)
+
+    def _sums(self, rects) -> Dict[str, np.ndarray]:
+        n = dbz = rate = wet = ge = 0
+        for r0, c0, r1, c1 in rects:
+            n = n + self._rect(self._n, r0, c0, r1, c1)
+            dbz = dbz + self._rect(self._dbz, r0, c0, r1, c1)
+            rate = rate + self._rect(self._rate, r0, c0, r1, c1)
+            wet = wet + self._rect(self._wet, r0, c0, r1, c1)
+            ge = ge + self._rect(self._ge, r0, c0, r1, c1)
+        return {"n": n, "dbz": dbz, "rate": rate, "wet": wet, "ge": ge}
+
+    # ---------- 對外 ----------
+    def query(self, px, py, radius_px, circle: bool = True) -> Dict[str, np.ndarray]:
+        """
+        ### 以 (px, py) 為中心、半徑 radius_px 的範圍統計
+        #### para:
+        - px, py: 像素座標（純量或長度 N 的陣列）
+        - radius_px: 半徑（像素；純量或陣列）
+        - circle: True → 圓形（水平條近似）；False → 邊長 2r 的正方形
+        #### return:
+        - mean_dbz：範圍內 max(dBZ, 0) 的平均
+        - mean_rain_mmh：平均降雨率（Marshall–Palmer）
+        - coverage：有回波（等級 ≥ 1）的像素比例
+        - max_class：範圍內最大降雨等級 0..6
+        - n_pixels：實際落在格點內的像素數
+        """
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        r = np.broadcast_to(np.maximum(np.asarray(radius_px, dtype=np.float64), 0), np.broadcast(px, py).shape)
+        hb, wb = self._n.shape[0] - 1, self._n.shape[1] - 1
+
+        rects = []
+        if not circle:
+            r0, r1 = self._block_range(py - r, py + r, hb)
+            c0, c1 = self._block_range(px - r, px + r, wb)
+            rects.append((r0, c0, r1, c1))
+        else:
+            # 把 [-r, r] 切成 CIRCLE_STRIPS 條，每條取條中心的弦寬；相鄰條以區塊邊界分開避免重複計算
+            edges = np.linspace(-1.0, 1.0, CIRCLE_STRIPS + 1)
+            prev = None
+            for k in range(CIRCLE_STRIPS):
+                mid = (edges[k] + edges[k + 1]) / 2
+                half = r * np.sqrt(1 - mid * mid)
+                r0, r1 = self._block_range(py + edges[k] * r, py + edges[k + 1] * r, hb)
+                if prev is not None:
+                    r0 = np.minimum(np.maximum(r0, prev), r1)
+                prev = r1
+                c0, c1 = self._block_range(px - half, px + half, wb)
+                rects.append((r0, c0, r1, c1))
+
+        s = self._sums(rects)
+        n = np.asarray(s["n"])
+        denom = np.maximum(n, 1)
+        wet = np.asarray(s["wet"])
+        # 等級 ≥ k 的表互為包含 → 計數 > 0 的張數 + 1 即最大等級（有回波時至少為 1）
+        max_class = ((np.asarray(s["ge"]) > 0).sum(axis=0) + (wet > 0)).astype(np.int8)
+        return {
+            "mean_dbz": (np.asarray(s["dbz"]) / denom).astype(np.float32),
+            "mean_rain_mmh": np.where(wet > 0, np.asarray(s["rate"]) / denom, 0).astype(np.float32),  # 去掉浮點相減殘差
+            "coverage": (wet / denom).astype(np.float32),
+            "max_class": max_class,
+            "n_pixels": n.astype(np.int64),
+        }
@@ -0,0 +1,160 @@
+# utils/frame_cache.py
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_MB = 256
+_MISSING = object()   # 快取查無此 key（與「已快取的 None」區分）
+
+
+@dataclass
+class RadarFrame:
+    """解碼後的單站雷達圖（int8 dBZ 格點 + 原始 PNG 本地路徑，供預覽用）。"""
+    dataset_id: str
+    obs_time_utc: Optional[str]
+    dbz: np.ndarray
+    image_path: Optional[str] = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.dbz.nbytes)
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    n = getattr(value, "nbytes", None)
+    return int(n) if n is not None else 0
+
+
+class FrameCache:
+    """
+    ### Process 內共用的雷達圖快取
+    - key = (dataset_id, obs_time_utc)
+    - 依 nbytes 計算記憶體預算，超過時以 LRU 淘汰
+    - 同站出現較新的 obs_time 時，舊時刻自動失效
+    - 同一 key 同時 miss 時只有一個呼叫者真正載入，其餘等待同一個 Future
+    - loader 回傳 None（該時刻沒有 tile / 拼圖）也會快取，同一時刻不重複查詢
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._latest: Dict[str, str] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "waits": 0, "evictions": 0}
+
+    # ---------- 內部工具（呼叫時需持有 lock） ----------
+    def _drop(self, key) -> None:
+        self._entries.pop(key, None)
+        self.total_bytes -= self._sizes.pop(key, 0)
+
+    def _invalidate_older(self, dataset_id: str, obs_time: str) -> None:
+        for key in [k for k in self._entries if k[0] == dataset_id and k[1] < obs_time]:
+            self._drop(key)
+
+    def _store(self, key, value) -> None:
+        dataset_id, obs_time = key
+        latest = self._latest.get(dataset_id)
+        if latest is not None and obs_time < latest:
+            return  # 已有更新時刻，舊圖不入快取
+        if latest != obs_time:
+            self._latest[dataset_id] = obs_time
+            self._invalidate_older(dataset_id, obs_time)
+
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    # ---------- 對外介面 ----------
+    def get(self, dataset_id: str, obs_time: str) -> Optional[Any]:
+        key = (dataset_id, obs_time)
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_or_load(self, dataset_id: str, obs_time: Optional[str], loader: Callable[[], Any]) -> Any:
+        """
+        ### 取快取，miss 時呼叫 loader()（同 key 併發只載入一次）
+        #### para:
+        - dataset_id: 雷達站 id
+        - obs_time_utc: meta.json 的觀測時間（None → 不快取，直接載入）
+        - loader: 無參數的載入函式
+        #### return:
+        - loader() 的結果（通常是 RadarFrame）
+        """
+        if obs_time is None:
+            return loader()
+
+        key = (dataset_id, obs_time)
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = Future()
+                self._inflight[key] = fut
+                self.stats["misses"] += 1
+            else:
+                self.stats["waits"] += 1
+
+        if not owner:
+            return fut.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._store(key, value)
+        fut.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._latest.clear()
+            self.total_bytes = 0
+
+
+_shared: Optional[FrameCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_frame_cache(cfg: Optional[Dict[str, Any]] = None) -> FrameCache:
+    """取得整個 process 共用的 FrameCache（第一次呼叫時依 cfg['frame_cache']['max_mb'] 建立）。"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            c = (cfg or {}).get("frame_cache") or {}
+            max_mb = float(c.get("max_mb", DEFAULT_MAX_MB))
+            _shared = FrameCache(max_bytes=int(max_mb * 1024 * 1024))
+        return _shared
@@ -0,0 +1,85 @@
+# utils/grid_geometry.py
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class GridGeometry:
+    """
+    ### 規則經緯度格點（O-A0059-001：lon0=115, lat0=18, dx=0.0125）
+    - 格點 (i, j) 位於 lon = lon0 + j*dx、lat = lat0 + i*dx（左下角起點；i 向北、j 向東）
+    - 所有換算都是解析式，不需要 meshgrid；輸入可為純量或陣列
+    """
+    lon0: float
+    lat0: float
+    dx: float
+    nx: int
+    ny: int
+
+    @classmethod
+    def from_meta(cls, meta: Dict[str, Any]) -> "GridGeometry":
+        """由 parse_grid_xml / HistoryCube header 的欄位建立"""
+        return cls(float(meta["lon0"]), float(meta["lat0"]), float(meta["dx_deg"]), int(meta["nx"]), int(meta["ny"]))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.ny, self.nx
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(lon_min, lat_min, lon_max, lat_max)，以格點中心計"""
+        return self.lon0, self.lat0, self.lon0 + (self.nx - 1) * self.dx, self.lat0 + (self.ny - 1) * self.dx
+
+    # ---------- 座標 ----------
+    def lons(self) -> np.ndarray:
+        return self.lon0 + np.arange(self.nx) * self.dx
+
+    def lats(self) -> np.ndarray:
+        return self.lat0 + np.arange(self.ny) * self.dx
+
+    def latlon_to_index(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ### 經緯度 → 最近格點索引 (i, j)
+        #### return:
+        - int64 (i, j)；超出範圍的點不會被夾住，請搭配 contains() 使用
+        """
+        i = np.rint((np.asarray(lat, dtype=np.float64) - self.lat0) / self.dx).astype(np.int64)
+        j = np.rint((np.asarray(lon, dtype=np.float64) - self.lon0) / self.dx).astype(np.int64)
+        return i, j
+
+    def index_to_latlon(self, i, j) -> Tuple[np.ndarray, np.ndarray]:
+        """格點索引 (i, j) → (lat, lon)"""
+        return self.lat0 + np.asarray(i) * self.dx, self.lon0 + np.asarray(j) * self.dx
+
+    def contains(self, lat, lon) -> np.ndarray:
+        i, j = self.latlon_to_index(lat, lon)
+        return (i >= 0) & (i < self.ny) & (j >= 0) & (j < self.nx)
+
+    # ---------- 區域 ----------
+    def bbox_slice(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> Tuple[slice, slice]:
+        """經緯度範圍 → (row slice, col slice)，已夾在格點範圍內"""
+        i0 = max(0, int(np.floor((lat_min - self.lat0) / self.dx)))
+        i1 = min(self.ny, int(np.ceil((lat_max - self.lat0) / self.dx)) + 1)
+        j0 = max(0, int(np.floor((lon_min - self.lon0) / self.dx)))
+        j1 = min(self.nx, int(np.ceil((lon_max - self.lon0) / self.dx)) + 1)
+        return slice(i0, max(i0, i1)), slice(j0, max(j0, j1))
+
+    def subgrid(self, rows: slice, cols: slice) -> "GridGeometry":
+        """切片後的子格點幾何"""
+        i0, i1, _ = rows.indices(self.ny)
+        j0, j1, _ = cols.indices(self.nx)
+        return GridGeometry(self.lon0 + j0 * self.dx, self.lat0 + i0 * self.dx, self.dx, j1 - j0, i1 - i0)
+
+    def window(self, arr: np.ndarray, lat: float, lon: float, radius: int) -> Tuple[np.ndarray, "GridGeometry"]:
+        """
+        ### 以 (lat, lon) 為中心取 ±radius 格的視窗
+        #### return:
+        - (arr 視窗（view，不複製）, 視窗的 GridGeometry)
+        """
+        i, j = self.latlon_to_index(lat, lon)
+        rows = slice(max(0, int(i) - radius), max(0, min(self.ny, int(i) + radius + 1)))
+        cols = slice(max(0, int(j) - radius), max(0, min(self.nx, int(j) + radius + 1)))
+        return arr[..., rows, cols], self.subgrid(rows, cols)
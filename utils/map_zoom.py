@@ -1,6 +1,9 @@
 # --- utils/plotly_viewer.py ---
+import base64
+
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
 def show_zoomable_photo_like_map(
@@ -10,7 +13,11 @@ def show_zoomable_photo_like_map(
     px_per_km: float,
     init_km: int = 20,
 ):
-    """以 st.map 風格顯示圖片，可拖曳/縮放；初始視窗=±init_km。"""
+    """
+    以 st.map 風格顯示圖片，可拖曳/縮放；初始視窗=±init_km。
+    img_pil 建議傳 check_rain 裁好的預覽視窗（center/px_per_km 用視窗座標），
+    圖片以 PNG 編碼送到瀏覽器（binary_string），不傳整張陣列。
+    """
     img_arr = np.array(img_pil)
     h, w = img_arr.shape[:2]
 
@@ -23,7 +30,7 @@ def show_zoomable_photo_like_map(
     y0 = max(0, center_py - half_h)
     y1 = min(h - 1, center_py + half_h)
 
-    fig = px.imshow(img_arr)
+    fig = px.imshow(img_arr, binary_string=True)
     # 隱藏軸、鎖 1:1
     fig.update_xaxes(
         showticklabels=False,
@@ -57,3 +64,78 @@ def show_zoomable_photo_like_map(
         ),
     )
     st.markdown('</div>', unsafe_allow_html=True)
+
+
+def show_tiled_map(
+    pack,
+    center_px,
+    center_py,
+    px_per_km: float,
+    init_km: int = 20,
+    out_px: int = 768,
+    margin_tiles: int = 1,
+    key: str = "tiled_map",
+):
+    """
+    以 tile 金字塔顯示雷達圖（utils.tiles.TilePack，ingest 時已編碼好）。
+    只挑 ±視野範圍（外加 margin_tiles 圈供拖曳）看得到的 tile，
+    直接把 PNG bytes 放進 layout.images，不在伺服器端重新編碼。
+    座標皆為原圖像素（雷達 AEQD 像素空間）。
+
+    限制：st.plotly_chart 不會把瀏覽器端的平移 / 縮放（relayout）回傳給伺服器，
+    所以細節 tile 只在伺服器端依「視野範圍」選一次：
+      - 「視野範圍」滑桿改變時 rerun，依新範圍重新挑層級與 tile
+      - 最粗一層（整張圖通常只有 1 塊 tile）一律墊在底下，拖出細節範圍外仍看得到低解析度的雨區
+    """
+    view_km = st.select_slider(
+        "視野範圍（km）",
+        options=sorted({5, 10, 20, 50, 100, 150, int(init_km)}),
+        value=int(init_km),
+        key=f"{key}_km",
+    )
+    half = view_km * px_per_km
+    z = pack.level_for(2 * half, out_px)
+    pad = margin_tiles * (pack.tile_px << z)
+    x0, x1 = center_px - half, center_px + half
+    y0, y1 = center_py - half, center_py + half
+
+    def add_tile(lz: int, r: int, c: int) -> None:
+        tx, ty, tw, th = pack.tile_box(lz, r, c)
+        fig.add_layout_image(
+            source="data:image/png;base64," + base64.b64encode(pack.tile(lz, r, c)).decode("ascii"),
+            xref="x", yref="y", x=tx, y=ty, sizex=tw, sizey=th,
+            xanchor="left", yanchor="top", sizing="stretch", layer="below",
+        )
+
+    fig = go.Figure()
+    top = len(pack.levels) - 1
+    if z < top:  # 底圖：最粗一層（layout.images 依序繪製，先加的在下面）
+        for r, c in pack.visible(top, 0, 0, pack.manifest["w"], pack.manifest["h"]):
+            add_tile(top, r, c)
+    for r, c in pack.visible(z, x0 - pad, y0 - pad, x1 + pad, y1 + pad):
+        add_tile(z, r, c)
+    # 中心紅點
+    fig.add_trace(go.Scatter(
+        x=[center_px], y=[center_py], mode="markers", hoverinfo="skip",
+        marker=dict(size=9, color="rgb(255,36,36)", line=dict(color="rgb(220,0,0)", width=2)),
+    ))
+    fig.update_xaxes(visible=False, range=[x0, x1], constrain="domain")
+    fig.update_yaxes(visible=False, range=[y1, y0], scaleanchor="x", scaleratio=1, constrain="domain")
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=0, b=0),
+        dragmode="pan",
+        uirevision=f"{key}:{view_km}",  # 視野範圍改變時套用新的 range；其餘 rerun 保留使用者的平移 / 縮放
+        showlegend=False,
+        plot_bgcolor="rgba(0,0,0,0)",
+    )
+
+    st.markdown(
+        '<div class="photo-like-map"><div class="photo-like-map__toolbar"></div>',
+        unsafe_allow_html=True,
+    )
+    st.plotly_chart(
+        fig,
+        use_container_width=True,
+        config=dict(displayModeBar=False, scrollZoom=True, doubleClick="reset"),
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
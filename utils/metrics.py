@@ -0,0 +1,247 @@
+# utils/metrics.py
+# 輕量 tracing / metrics（預設關閉；關閉時 span() 只回傳共用的空 context manager）
+#
+#     from utils import metrics
+#     with metrics.span("check_rain.get_frame", dataset="O-A0084-001"):
+#         ...
+#     metrics.inc("bytes_fetched_total", len(data), source="cwa_png")
+#     metrics.observe("frame_age_seconds", age)
+#
+# 匯出：
+# - render_prometheus()：Prometheus text format（span 會成為 {name}_seconds histogram）
+# - snapshot()：JSON 可序列化的 dict
+# - export: json 時，每個 span 結束另外寫一行結構化 JSON log
+from __future__ import annotations
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_enabled = False
+_json_log = None          # 檔案物件；None → 不寫 JSON log
+_textfile = None          # write_textfile() 的預設路徑
+_applied = object()       # 上次套用的 cfg['metrics']（同一個 dict 不重設）
+_lock = threading.Lock()
+_counters: Dict[_Key, float] = {}
+_gauges: Dict[_Key, float] = {}
+_hists: Dict[_Key, list] = {}   # key -> [bucket counts..., +Inf count, sum]
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def configure(cfg: Optional[Dict[str, Any]] = None) -> None:
+    """
+    ### 依 cfg['metrics'] 開關
+    - enabled: true / false
+    - export: prometheus（只累積，由 render_prometheus / write_textfile 輸出）| json（另寫每個 span 的 JSON log）
+    - json_log: JSON log 路徑（空白 → stderr）
+    - textfile: Prometheus textfile 路徑（ingest 每輪結束時寫出）
+    同一份 cfg 重複呼叫直接返回，可放在每次查詢的開頭。
+    """
+    global _enabled, _json_log, _textfile, _applied
+    c = (cfg or {}).get("metrics")
+    if c is _applied:
+        return
+    with _lock:
+        _applied = c
+        c = c or {}
+        _enabled = bool(c.get("enabled", False))
+        _textfile = c.get("textfile") or None
+        if _json_log not in (None, sys.stderr):
+            _json_log.close()
+        _json_log = None
+        if _enabled and c.get("export", "prometheus") == "json":
+            path = c.get("json_log")
+            _json_log = open(path, "a", encoding="utf-8", buffering=1) if path else sys.stderr
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _hists.clear()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# ---------- 記錄 ----------
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """counter += value"""
+    if not _enabled:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """histogram（固定 DEFAULT_BUCKETS，單位由名稱決定，例如 *_seconds）"""
+    if not _enabled:
+        return
+    k = _key(name, labels)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = [0] * (len(DEFAULT_BUCKETS) + 1) + [0.0]
+        for i, b in enumerate(DEFAULT_BUCKETS):
+            if value <= b:
+                h[i] += 1
+                break
+        else:
+            h[len(DEFAULT_BUCKETS)] += 1
+        h[-1] += value
+
+
+@contextmanager
+def _span(name: str, labels: Dict[str, Any]):
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        observe(f"{name}_seconds", dt, **labels)
+        if error:
+            inc(f"{name}_errors_total", **labels)
+        log = _json_log
+        if log is not None:
+            rec = {"ts": round(time.time(), 6), "span": name, "duration_ms": round(dt * 1000, 3), "pid": os.getpid(), **labels}
+            if error:
+                rec["error"] = error
+            try:
+                log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            except Exception:
+                pass
+
+
+def span(name: str, **labels):
+    """計時區塊；關閉時零配置（回傳共用的空 context manager）"""
+    if not _enabled:
+        return _NOOP
+    return _span(name, labels)
+
+
+# ---------- 匯出 ----------
+def _metric_name(name: str) -> str:
+    return "rainy_" + "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def _fmt_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format"""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        hists = {k: list(v) for k, v in _hists.items()}
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), v in sorted(counters.items()):
+        m = _metric_name(name)
+        header(m, "counter")
+        lines.append(f"{m}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), v in sorted(gauges.items()):
+        m = _metric_name(name)
+        header(m, "gauge")
+        lines.append(f"{m}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), h in sorted(hists.items()):
+        m = _metric_name(name)
+        header(m, "histogram")
+        cum = 0
+        for b, n in zip(DEFAULT_BUCKETS, h):
+            cum += n
+            lines.append(f"{m}_bucket{_fmt_labels(labels, ('le', f'{b:g}'))} {cum}")
+        cum += h[len(DEFAULT_BUCKETS)]
+        lines.append(f"{m}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {cum}")
+        lines.append(f"{m}_sum{_fmt_labels(labels)} {h[-1]:.6g}")
+        lines.append(f"{m}_count{_fmt_labels(labels)} {cum}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, Any]:
+    """JSON 可序列化的目前數值（histogram 附 count / sum / 估計的 p50、p95）"""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        hists = {k: list(v) for k, v in _hists.items()}
+
+    def lab(labels):
+        return dict(labels)
+
+    def quantile(h, q):
+        total = sum(h[:-1])
+        if total == 0:
+            return None
+        target, cum = q * total, 0
+        for b, n in zip(DEFAULT_BUCKETS + (math.inf,), h[:-1]):
+            cum += n
+            if cum >= target:
+                return b
+        return math.inf
+
+    return {
+        "counters": [{"name": n, "labels": lab(l), "value": v} for (n, l), v in sorted(counters.items())],
+        "gauges": [{"name": n, "labels": lab(l), "value": v} for (n, l), v in sorted(gauges.items())],
+        "histograms": [
+            {"name": n, "labels": lab(l), "count": sum(h[:-1]), "sum": h[-1],
+             "p50_le": quantile(h, 0.5), "p95_le": quantile(h, 0.95)}
+            for (n, l), h in sorted(hists.items())
+        ],
+    }
+
+
+def write_textfile(path: str | Path | None = None) -> None:
+    """寫 Prometheus textfile（給 node_exporter textfile collector；原子替換）；未設定路徑時不做事"""
+    path = path or _textfile
+    if not _enabled or not path:
+        return
+    p = Path(path)
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
+    tmp.write_text(render_prometheus(), encoding="utf-8")
+    os.replace(tmp, p)
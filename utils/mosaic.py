@@ -0,0 +1,185 @@
+# utils/mosaic.py
+# 全台雷達拼圖：把各站 AEQD 雷達圖重新取樣到一張規則經緯度格點（與 O-A0059-001 相同幾何）
+#
+# - MosaicIndex：每站一組「格點扁平索引 → 該站影像扁平索引」的對照表，只在站點 / 格點設定改變時用 pyproj 算一次，
+#   並存成 .npz 給其他 process 重用；之後每張新圖只需一次 gather + np.maximum 合併
+# - Mosaic：合併後的 int8 dBZ 格點；點查詢 = 一次仿射換算 + 索引，不需要 pyproj
+# - 沒有任何雷達涵蓋的格點為 NODATA
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.grid_geometry import GridGeometry
+
+NODATA = -128
+DEFAULT_GEOMETRY = GridGeometry(lon0=115.0, lat0=18.0, dx=0.0125, nx=921, ny=881)  # O-A0059-001
+DEFAULT_INDEX_PATH = ".mosaic_index.npz"
+MOSAIC_ID = "mosaic"   # frame store 內的名稱
+
+
+def mosaic_geometry(cfg: Optional[Dict[str, Any]] = None) -> GridGeometry:
+    """cfg['mosaic'] 的格點幾何（未設定的欄位用 O-A0059-001 的值）"""
+    c = (cfg or {}).get("mosaic") or {}
+    d = DEFAULT_GEOMETRY
+    return GridGeometry(
+        lon0=float(c.get("lon0", d.lon0)),
+        lat0=float(c.get("lat0", d.lat0)),
+        dx=float(c.get("dx", d.dx)),
+        nx=int(c.get("nx", d.nx)),
+        ny=int(c.get("ny", d.ny)),
+    )
+
+
+def _signature(geom: GridGeometry, stations: Sequence) -> str:
+    key = {
+        "geom": [geom.lon0, geom.lat0, geom.dx, geom.nx, geom.ny],
+        "stations": [[s.id, s.lat, s.lon, s.h, s.w, s.scale] for s in stations],
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class MosaicIndex:
+    """
+    ### 各站 → 拼圖格點的預先計算對照表
+    - maps[station_id] = (grid_idx, pix_idx)：int32 扁平索引，只含落在該站影像範圍內的格點
+    - 格點中心以最近像素取樣（與 RadarStation.to_pixel 相同的 rint）
+    """
+
+    def __init__(self, geom: GridGeometry, maps: Dict[str, Tuple[np.ndarray, np.ndarray]], signature: str = ""):
+        self.geom = geom
+        self.maps = maps
+        self.signature = signature
+
+    @classmethod
+    def build(cls, geom: GridGeometry, stations: Sequence) -> "MosaicIndex":
+        """stations：RadarStation 清單（需含 to_aeqd 與影像幾何）"""
+        from locate.location import aeqd_to_pixel
+
+        maps = {}
+        for s in stations:
+            # 只投影該站影像外接經緯度框內的格點（半對角線 + 一格餘裕）
+            half_km = 0.5 * np.hypot(s.w, s.h) / s.scale + geom.dx * 111.32
+            dlat = half_km / 111.32
+            dlon = half_km / (111.32 * max(np.cos(np.radians(s.lat + np.sign(s.lat) * dlat)), 1e-6))
+            rows, cols = geom.bbox_slice(s.lat - dlat, s.lat + dlat, s.lon - dlon, s.lon + dlon)
+            ii, jj = np.meshgrid(np.arange(rows.start, rows.stop), np.arange(cols.start, cols.stop), indexing="ij")
+            glat, glon = geom.index_to_latlon(ii.ravel(), jj.ravel())
+
+            E, N = s.to_aeqd(glat, glon)
+            x, y = aeqd_to_pixel(E, N, s.radar_cfg)
+            px, py = np.rint(x), np.rint(y)
+            inside = (px >= 0) & (px < s.w) & (py >= 0) & (py < s.h)
+            grid_idx = (ii.ravel()[inside] * geom.nx + jj.ravel()[inside]).astype(np.int32)
+            pix_idx = (py[inside].astype(np.int64) * s.w + px[inside].astype(np.int64)).astype(np.int32)
+            maps[s.id] = (grid_idx, pix_idx)
+        return cls(geom, maps, _signature(geom, stations))
+
+    # ---------- 存讀 ----------
+    def save(self, path: str | Path) -> None:
+        p = Path(path)
+        arrays = {"signature": np.array(self.signature)}
+        for sid, (g, px) in self.maps.items():
+            arrays[f"grid:{sid}"] = g
+            arrays[f"pix:{sid}"] = px
+        tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, p)
+
+    @classmethod
+    def load(cls, path: str | Path, geom: GridGeometry, signature: str) -> Optional["MosaicIndex"]:
+        """讀 .npz；簽章不同（站點 / 格點設定改了）或檔案不存在 → None"""
+        try:
+            with np.load(path) as z:
+                if str(z["signature"]) != signature:
+                    return None
+                maps = {
+                    k.split(":", 1)[1]: (z[k], z["pix:" + k.split(":", 1)[1]])
+                    for k in z.files if k.startswith("grid:")
+                }
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        return cls(geom, maps, signature)
+
+    # ---------- 合併 ----------
+    def merge(self, frames: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        ### 各站 int8 dBZ 格點 → 拼圖（重疊處取最大值）
+        #### para:
+        - frames: {station_id: (H, W) int8}；缺少的站直接略過
+        #### return:
+        - (ny, nx) int8，沒有涵蓋的格點為 NODATA
+        """
+        out = np.full(self.geom.nx * self.geom.ny, NODATA, dtype=np.int8)
+        for sid, dbz in frames.items():
+            m = self.maps.get(sid)
+            if m is None:
+                continue
+            grid_idx, pix_idx = m
+            vals = np.asarray(dbz).reshape(-1)[pix_idx]
+            np.maximum(out[grid_idx], vals, out=vals)
+            out[grid_idx] = vals
+        return out.reshape(self.geom.shape)
+
+
+_indexes: Dict[str, MosaicIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_mosaic_index(cfg: Dict[str, Any], stations: Sequence) -> MosaicIndex:
+    """取得（必要時建立並存檔）對照表；同一組站點 / 格點設定在 process 內只載入一次"""
+    geom = mosaic_geometry(cfg)
+    sig = _signature(geom, stations)
+    with _indexes_lock:
+        idx = _indexes.get(sig)
+        if idx is None:
+            path = ((cfg.get("mosaic") or {}).get("index_path")) or DEFAULT_INDEX_PATH
+            idx = MosaicIndex.load(path, geom, sig)
+            if idx is None:
+                idx = MosaicIndex.build(geom, stations)
+                try:
+                    idx.save(path)
+                except OSError as e:
+                    print(f"[mosaic] 對照表存檔失敗：{e}")
+            _indexes[sig] = idx
+        return idx
+
+
+@dataclass
+class Mosaic:
+    """已發布的拼圖：int8 dBZ 格點 + 幾何"""
+    obs_time_utc: Optional[str]
+    geom: GridGeometry
+    dbz: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.dbz.nbytes)
+
+    def lookup(self, lats, lons) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        ### 多點 → (dbz, i, j)
+        - 超出格點的點 dbz 為 NODATA，i / j 為 -1
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        i, j = self.geom.latlon_to_index(lats, lons)
+        inside = (i >= 0) & (i < self.geom.ny) & (j >= 0) & (j < self.geom.nx)
+        dbz = np.full(lats.shape, NODATA, dtype=np.int8)
+        dbz[inside] = self.dbz[i[inside], j[inside]]
+        return dbz, np.where(inside, i, -1), np.where(inside, j, -1)
+
+    def meta(self) -> Dict[str, Any]:
+        """寫進 meta.json["mosaic"] 的欄位"""
+        g = self.geom
+        return {"obs_time_utc": self.obs_time_utc, "lon0": g.lon0, "lat0": g.lat0, "dx": g.dx, "nx": g.nx, "ny": g.ny}
+
+    @classmethod
+    def from_meta(cls, meta: Dict[str, Any], dbz: np.ndarray) -> "Mosaic":
+        return cls(meta.get("obs_time_utc"), GridGeometry(meta["lon0"], meta["lat0"], meta["dx"], meta["nx"], meta["ny"]), dbz)
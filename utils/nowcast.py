@@ -0,0 +1,352 @@
+# utils/nowcast.py
+from __future__ import annotations
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api_loader.history_store import dequantize_dbz, get_history_cube, quantize_dbz
+from utils.grid_geometry import GridGeometry
+
+DEFAULT_STEPS = 6            # 10 分鐘 × 6 = 0–60 分鐘
+DEFAULT_HISTORY_FRAMES = 3   # 估計移動場用幾張（n 張 → n-1 組相鄰配對）
+DEFAULT_DOWNSAMPLE = 4       # 估計移動場前先縮小（921×881 → 231×221）
+DEFAULT_BLOCK = 32           # 區塊比對的區塊大小（縮小後像素）
+DEFAULT_SEARCH = 6           # 區塊比對的搜尋半徑（縮小後像素 / frame）
+ECHO_DBZ = 10.0              # 區塊內超過此值的格子才算有回波
+
+
+# ---------- 移動場 ----------
+def _prep(dbz: np.ndarray, downsample: int) -> np.ndarray:
+    """NaN / 負值 → 0，再以 downsample × downsample 區塊平均縮小"""
+    a = np.nan_to_num(np.asarray(dbz, dtype=np.float32), nan=0.0)
+    np.maximum(a, 0, out=a)
+    ny, nx = (a.shape[0] // downsample) * downsample, (a.shape[1] // downsample) * downsample
+    return a[:ny, :nx].reshape(ny // downsample, downsample, nx // downsample, downsample).mean(axis=(1, 3))
+
+
+def _blocks(a: np.ndarray, block: int, stride: int) -> np.ndarray:
+    """切成重疊區塊 → (nby, nbx, block, block) 的 view"""
+    return np.lib.stride_tricks.sliding_window_view(a, (block, block))[::stride, ::stride]
+
+
+def _block_match(prev: np.ndarray, curr: np.ndarray, block: int, stride: int, search: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ### 區塊比對（SSD）
+    - 每個 prev 區塊在 curr 的 ±search 範圍內找差平方和最小的位移，範圍外當作無回波（0）
+    - 所有區塊一起算：每個候選位移整張相減一次，再以積分影像取各區塊總和
+    #### return:
+    - (dy, dx)：區塊網格上 curr ≈ prev 平移 (dy, dx)，含拋物線次像素修正
+    """
+    ny, nx = prev.shape
+    nby, nbx = (ny - block) // stride + 1, (nx - block) // stride + 1
+    y0 = np.arange(nby) * stride
+    x0 = np.arange(nbx) * stride
+    padded = np.pad(curr, search)
+    shifts = np.arange(-search, search + 1)
+    cost = np.empty((len(shifts), len(shifts), nby, nbx), dtype=np.float64)
+    integral = np.zeros((ny + 1, nx + 1), dtype=np.float64)
+    for a, dy in enumerate(shifts):
+        for b, dx in enumerate(shifts):
+            d = prev - padded[search + dy:search + dy + ny, search + dx:search + dx + nx]
+            np.cumsum(np.cumsum(d * d, axis=0), axis=1, out=integral[1:, 1:])
+            cost[a, b] = (integral[np.ix_(y0 + block, x0 + block)] - integral[np.ix_(y0, x0 + block)]
+                          - integral[np.ix_(y0 + block, x0)] + integral[np.ix_(y0, x0)])
+
+    n = len(shifts)
+    k = cost.reshape(n * n, nby, nbx).argmin(axis=0)
+    py, px = np.divmod(k, n)
+    by, bx = np.indices((nby, nbx))
+
+    def subpixel(p, take):
+        inner = (p > 0) & (p < n - 1)
+        q = np.clip(p, 1, n - 2)
+        m, c, e = take(q - 1), take(p), take(q + 1)
+        den = m - 2 * c + e
+        off = np.where(inner & (den > 1e-9), 0.5 * (m - e) / np.where(den > 1e-9, den, 1.0), 0.0)
+        return shifts[p] + np.clip(off, -0.5, 0.5)
+
+    dy = subpixel(py, lambda q: cost[q, px, by, bx])
+    dx = subpixel(px, lambda q: cost[py, q, by, bx])
+    return dy, dx
+
+
+def _smooth3(a: np.ndarray) -> np.ndarray:
+    """3×3 平均（邊界以最近值延伸）"""
+    p = np.pad(a, 1, mode="edge")
+    return sum(p[i:i + a.shape[0], j:j + a.shape[1]] for i in range(3) for j in range(3)) / 9.0
+
+
+def estimate_motion(
+    frames: Sequence[np.ndarray],
+    *,
+    downsample: int = DEFAULT_DOWNSAMPLE,
+    block: int = DEFAULT_BLOCK,
+    search: int = DEFAULT_SEARCH,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ### 由時間序列估計移動場（每個 frame 間隔移動幾格）
+    - 縮小後切重疊區塊，在 ±search 內做區塊比對
+    - 回波太少的區塊權重為 0，改以加權平均移動補上，再 3×3 平滑
+    #### para:
+    - frames: 依時間排序的 2D dBZ 格點（NaN 為無資料），至少兩張
+    #### return:
+    - (v, u)：區塊網格上的 (列方向, 行方向) 位移，單位為原解析度格點 / frame
+    - 另以 motion_at(v, u, ...) 內插到任意位置
+    """
+    if len(frames) < 2:
+        raise ValueError("estimate_motion 需要至少兩張格點")
+    small = [_prep(f, downsample) for f in frames]
+    stride = block // 2
+    vy, vx, wt = [], [], []
+    for a, b in zip(small[:-1], small[1:]):
+        wa, wb = _blocks(a, block, stride), _blocks(b, block, stride)
+        dy, dx = _block_match(a, b, block, stride, search)
+        echo = np.minimum((wa > ECHO_DBZ).mean(axis=(-2, -1)), (wb > ECHO_DBZ).mean(axis=(-2, -1)))
+        vy.append(dy); vx.append(dx); wt.append(echo)
+    vy, vx, wt = np.stack(vy), np.stack(vx), np.stack(wt)
+
+    # 配對間加權平均；回波稀少的區塊退回全域加權平均
+    wsum = wt.sum(axis=0)
+    total = wsum.sum()
+    gy = float((vy * wt).sum() / total) if total > 0 else 0.0
+    gx = float((vx * wt).sum() / total) if total > 0 else 0.0
+    ok = wsum > 0.05 * len(wt)
+    v = np.where(ok, (vy * wt).sum(axis=0) / np.maximum(wsum, 1e-9), gy)
+    u = np.where(ok, (vx * wt).sum(axis=0) / np.maximum(wsum, 1e-9), gx)
+    return (_smooth3(v) * downsample).astype(np.float32), (_smooth3(u) * downsample).astype(np.float32)
+
+
+def _block_centers(nby: int, nbx: int, downsample: int, block: int) -> Tuple[np.ndarray, np.ndarray]:
+    """區塊中心在原解析度的 (列, 行) 座標"""
+    stride = block // 2
+    cy = (np.arange(nby) * stride + (block - 1) / 2 + 0.5) * downsample - 0.5
+    cx = (np.arange(nbx) * stride + (block - 1) / 2 + 0.5) * downsample - 0.5
+    return cy, cx
+
+
+def _bilinear(a: np.ndarray, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """在 a 上以雙線性內插取 (y, x)（超出範圍夾在邊界）"""
+    ny, nx = a.shape
+    y = np.clip(y, 0, ny - 1)
+    x = np.clip(x, 0, nx - 1)
+    y0 = np.minimum(y.astype(np.int64), ny - 2) if ny > 1 else np.zeros_like(y, dtype=np.int64)
+    x0 = np.minimum(x.astype(np.int64), nx - 2) if nx > 1 else np.zeros_like(x, dtype=np.int64)
+    fy, fx = (y - y0).astype(np.float32), (x - x0).astype(np.float32)
+    y1, x1 = np.minimum(y0 + 1, ny - 1), np.minimum(x0 + 1, nx - 1)
+    top = a[y0, x0] * (1 - fx) + a[y0, x1] * fx
+    bot = a[y1, x0] * (1 - fx) + a[y1, x1] * fx
+    return top * (1 - fy) + bot * fy
+
+
+def motion_at(
+    v: np.ndarray,
+    u: np.ndarray,
+    y: np.ndarray,
+    x: np.ndarray,
+    *,
+    downsample: int = DEFAULT_DOWNSAMPLE,
+    block: int = DEFAULT_BLOCK,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """區塊網格上的移動場 → 原解析度座標 (y, x) 的 (v, u)"""
+    cy, cx = _block_centers(*v.shape, downsample, block)
+    by = np.interp(y, cy, np.arange(len(cy)))
+    bx = np.interp(x, cx, np.arange(len(cx)))
+    return _bilinear(v, by, bx), _bilinear(u, by, bx)
+
+
+# ---------- 外推 ----------
+def advect(
+    dbz: np.ndarray,
+    v: np.ndarray,
+    u: np.ndarray,
+    steps: int = DEFAULT_STEPS,
+    *,
+    downsample: int = DEFAULT_DOWNSAMPLE,
+    block: int = DEFAULT_BLOCK,
+) -> np.ndarray:
+    """
+    ### 半拉格朗日外推
+    - 每一步從目標格點沿移動場往回追一個 frame 間隔，到最新觀測取雙線性內插值
+    - 來源落在格點外 → NaN；來源最近格為 NaN → NaN
+    #### return:
+    - (steps + 1, ny, nx) float32；第 0 層為最新觀測
+    """
+    dbz = np.asarray(dbz, dtype=np.float32)
+    ny, nx = dbz.shape
+    nan = np.isnan(dbz)
+    filled = np.where(nan, np.float32(-32.0), dbz)
+
+    y, x = np.mgrid[0:ny, 0:nx].astype(np.float32)
+    # 移動場很平滑：先內插到原解析度一次，之後每步取最近格即可
+    vf, uf = (a.astype(np.float32) for a in motion_at(v, u, y, x, downsample=downsample, block=block))
+    out = np.empty((steps + 1, ny, nx), dtype=np.float32)
+    out[0] = dbz
+    for k in range(1, steps + 1):
+        iy = np.clip(np.rint(y).astype(np.int64), 0, ny - 1)
+        ix = np.clip(np.rint(x).astype(np.int64), 0, nx - 1)
+        y -= vf[iy, ix]
+        x -= uf[iy, ix]
+        layer = _bilinear(filled, y, x)
+        inside = (y >= 0) & (y <= ny - 1) & (x >= 0) & (x <= nx - 1)
+        src_nan = nan[np.clip(np.rint(y).astype(np.int64), 0, ny - 1), np.clip(np.rint(x).astype(np.int64), 0, nx - 1)]
+        layer[~inside | src_nan] = np.nan
+        out[k] = layer
+    return out
+
+
+# ---------- 預報立方體 ----------
+@dataclass
+class Nowcast:
+    """
+    ### 0–60 分鐘外推預報
+    - base_time：最新觀測（UTC key）；lead_min：各層的預報時效（分鐘）
+    - q：(L, ny, nx) uint8（與 HistoryCube 同一套量化，0 = NaN）
+    """
+    base_time: str
+    step_min: int
+    geometry: GridGeometry
+    q: np.ndarray
+
+    @property
+    def lead_min(self) -> np.ndarray:
+        return np.arange(self.q.shape[0]) * self.step_min
+
+    def series(self, lats, lons, raw: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ### 多點預報序列
+        #### return:
+        - (lead_min 長度 L, 值 (L, P))；格點範圍外為 NODATA / NaN
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        out = np.zeros((self.q.shape[0], lats.size), dtype=np.uint8)
+        inside = np.flatnonzero(self.geometry.contains(lats, lons))
+        i, j = self.geometry.latlon_to_index(lats[inside], lons[inside])
+        out[:, inside] = self.q[:, i, j]
+        return self.lead_min, (out if raw else dequantize_dbz(out))
+
+    # ---------- 存取 ----------
+    def save(self, root: str | Path) -> Path:
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        name = self.base_time.replace("-", "").replace(":", "")
+        npy = root / f"{name}.npy"
+        tmp = root / f".{name}.{os.getpid()}.tmp.npy"
+        np.save(tmp, self.q)
+        os.replace(tmp, npy)
+        header = {"base_time": self.base_time, "step_min": self.step_min, "file": npy.name,
+                  "lon0": self.geometry.lon0, "lat0": self.geometry.lat0, "dx_deg": self.geometry.dx,
+                  "nx": self.geometry.nx, "ny": self.geometry.ny}
+        tmp = root / f".latest.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(header), encoding="utf-8")
+        os.replace(tmp, root / "latest.json")
+        for old in root.glob("*.npy"):
+            if old.name != npy.name:
+                old.unlink(missing_ok=True)
+        return npy
+
+    @classmethod
+    def load(cls, root: str | Path) -> Optional["Nowcast"]:
+        """讀 {root}/latest.json 指向的預報（memmap）；沒有則 None"""
+        root = Path(root)
+        try:
+            header = json.loads((root / "latest.json").read_text(encoding="utf-8"))
+            q = np.load(root / header["file"], mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        return cls(header["base_time"], int(header["step_min"]), GridGeometry.from_meta(header), q)
+
+
+def compute_nowcast(
+    frames: Sequence[np.ndarray],
+    base_time: str,
+    geometry: GridGeometry,
+    *,
+    step_min: int = 10,
+    steps: int = DEFAULT_STEPS,
+    downsample: int = DEFAULT_DOWNSAMPLE,
+    block: int = DEFAULT_BLOCK,
+    search: int = DEFAULT_SEARCH,
+) -> Nowcast:
+    """frames（間隔 step_min，依時間排序）→ Nowcast"""
+    v, u = estimate_motion(frames, downsample=downsample, block=block, search=search)
+    fc = advect(frames[-1], v, u, steps, downsample=downsample, block=block)
+    return Nowcast(base_time, step_min, geometry, quantize_dbz(fc))
+
+
+_cache: Dict[str, Tuple[int, Nowcast]] = {}
+_cache_lock = threading.Lock()
+
+
+def _cfg(cfg: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Path]:
+    c = (cfg or {}).get("nowcast") or {}
+    root = Path(c.get("dir") or Path(((cfg or {}).get("historyapi") or {}).get("cube_dir", "radar_cube")) / "nowcast")
+    return c, root
+
+
+def update_nowcast(cfg: Optional[Dict[str, Any]] = None, debug: bool = False) -> Optional[Nowcast]:
+    """
+    ### 依 HistoryCube 最新幾張重算預報並寫檔（ingest / backfill 後呼叫，每張新圖只算一次）
+    - 最新一張與已存預報的 base_time 相同 → 直接回傳既有結果
+    - 只取與最新一張間隔剛好 interval 的連續 frame
+    """
+    c, root = _cfg(cfg)
+    cube = get_history_cube(cfg)
+    times, _, _ = cube.time_index()
+    if len(times) < 2:
+        return None
+    base = f"{times[-1]}Z"
+    existing = Nowcast.load(root)
+    if existing is not None and existing.base_time == base:
+        return existing
+
+    step_min = int(cube.header.get("interval_min", 10))
+    n = int(c.get("history_frames", DEFAULT_HISTORY_FRAMES))
+    want = [times[-1] - np.timedelta64(step_min * k, "m") for k in range(n - 1, -1, -1)]
+    have = [t for t in want if np.isin(t, times)]
+    if len(have) < 2 or have[-1] != times[-1]:
+        return None
+    frames = [cube.frame(f"{t}Z") for t in have]
+    nc = compute_nowcast(
+        frames, base, cube.geometry,
+        step_min=step_min,
+        steps=int(c.get("steps", DEFAULT_STEPS)),
+        downsample=int(c.get("downsample", DEFAULT_DOWNSAMPLE)),
+        block=int(c.get("block", DEFAULT_BLOCK)),
+        search=int(c.get("search", DEFAULT_SEARCH)),
+    )
+    nc.save(root)
+    if debug:
+        print(f"[nowcast] base={base} frames={len(frames)} -> {root}")
+    return nc
+
+
+def get_nowcast(cfg: Optional[Dict[str, Any]] = None) -> Optional[Nowcast]:
+    """
+    ### 讀取共用預報（查詢端用，只讀不算）
+    - 預報只由 backfill 在 nowcast.enabled 時寫檔；這裡 memmap 讀最後存的那份
+    - latest.json 換了才重新載入；可能落後 cube 最新一張，呼叫端以 base_time 判斷
+    - nowcast.enabled 為 false 或尚未產生 → None
+    """
+    c, root = _cfg(cfg)
+    if not c.get("enabled", True):
+        return None
+    try:
+        mtime = (root / "latest.json").stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        hit = _cache.get(str(root))
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        nc = Nowcast.load(root)
+        if nc is None:
+            # 寫檔途中（舊 .npy 剛被換掉）→ 先沿用上一份
+            return hit[1] if hit is not None else None
+        _cache[str(root)] = (mtime, nc)
+        return nc
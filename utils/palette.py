@@ -0,0 +1,162 @@
+# utils/palette.py
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import yaml
+
+SCALE_PATH = Path(__file__).resolve().parent.parent / "library" / "rain_intensity_scale.yaml"
+
+# 每個色版保留 6 bits → 64^3 = 262,144 格的量化 RGB 立方體
+_BITS = 6
+_SHIFT = 8 - _BITS
+_N = 1 << _BITS
+_SUB = 1 << (3 * _SHIFT)   # 每格內的完整 8-bit 顏色數（4^3 = 64）
+_AMBIGUOUS = -128          # 查表值：此格跨越色階邊界，改查該格的完整解析度表
+
+
+class PaletteDecoder:
+    """
+    ### 雷達色階 → dBZ 解碼器
+    - 建立一次「量化 RGB 立方體」查表（每格存最近色階的索引）
+    - 整格都落在同一色階 Voronoi 區內的格直接查表；跨越邊界的格（抗鋸齒、圖例邊緣附近的顏色）
+      另建完整 8-bit 解析度的子表，結果與逐色精確最近色階相同
+    - 整張 (H, W, 3) 影像只需一次位元運算 + 一次 take 即可轉成 int8 dBZ
+    """
+
+    def __init__(self, entries: list):
+        self.dbz = np.array([e["dbz"] for e in entries], dtype=np.int8)
+        self.rgb = np.array([e["rgb"] for e in entries], dtype=np.uint8)
+        self._lut_idx, self._slot, self._sub_idx = self._build_lut()
+        self.lut = np.where(self._slot >= 0, _AMBIGUOUS, self.dbz[self._lut_idx]).astype(np.int8)  # (N^3,) int8
+        self._sub_lut = self.dbz[self._sub_idx]  # (n_ambiguous * _SUB,) int8
+        # dBZ → RGB（以 int8 的位元組值索引）；不在色階內的值（例如 NODATA）給最低一階的底色
+        self._rgb_lut = np.repeat(self.rgb[self.dbz.argmin()][None], 256, axis=0)
+        self._rgb_lut[self.dbz.view(np.uint8)] = self.rgb
+
+    def _exact_idx(self, rgb: np.ndarray) -> np.ndarray:
+        """(..., 3) → 精確最近色階索引（平手取較前面的色階）"""
+        d = ((np.asarray(rgb, dtype=np.int32)[..., None, :3] - self.rgb.astype(np.int32)) ** 2).sum(axis=-1)
+        return d.argmin(axis=-1).astype(np.uint8)
+
+    def _build_lut(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 各量化格的中心色
+        centers = (np.arange(_N, dtype=np.int32) << _SHIFT) + (1 << _SHIFT) // 2
+        r, g, b = np.meshgrid(centers, centers, centers, indexing="ij")
+        r, g, b = r.ravel(), g.ravel(), b.ravel()
+
+        best = np.zeros(r.size, dtype=np.uint8)
+        best_d = np.full(r.size, np.iinfo(np.int32).max, dtype=np.int32)
+        for k, (cr, cg, cb) in enumerate(self.rgb.astype(np.int32)):
+            d = (r - cr) ** 2 + (g - cg) ** 2 + (b - cb) ** 2
+            closer = d < best_d
+            best[closer] = k
+            best_d[closer] = d[closer]
+
+        # 格內任一色 p 都比色階 k 更接近最近色階 a ⇔ |p-a|² - |p-k|² = 2p·(k-a) + |a|² - |k|² 在整格 < 0；
+        # 線性函數在格的角落取最大值 → 逐色階檢查一次，有任何 ≥ 0 的 k 就是跨界格，k 為該格的候選色階
+        pal = self.rgb.astype(np.int32)
+        a = pal[best]
+        a2 = (a * a).sum(axis=-1)
+        lo = [ch - (1 << _SHIFT) // 2 for ch in (r, g, b)]
+        cand = np.zeros((r.size, len(pal)), dtype=bool)
+        for k, pk in enumerate(pal):
+            gain = a2 - int(pk @ pk)
+            for c in range(3):
+                diff = int(pk[c]) - a[:, c]
+                gain += 2 * (lo[c] + np.where(diff > 0, (1 << _SHIFT) - 1, 0)) * diff
+            cand[:, k] = gain >= 0
+        cand[np.arange(r.size), best] = False
+        cells = np.flatnonzero(cand.any(axis=1))
+        slot = np.full(r.size, -1, dtype=np.int32)
+        slot[cells] = np.arange(cells.size, dtype=np.int32)
+
+        # 邊界格：格內 64 個完整 8-bit 顏色只跟最近色階與候選色階精確比對
+        cand = cand[cells]
+        m = int(cand.sum(axis=1).max()) if cells.size else 0
+        order = np.argsort(~cand, axis=1, kind="stable")[:, :m]
+        ks = np.where(np.take_along_axis(cand, order, axis=1), order, best[cells, None])
+        ks = np.concatenate([best[cells, None], ks], axis=1).astype(np.uint8)  # (n, m+1)，平手時依色階順序
+        ks = np.sort(ks, axis=1)
+
+        off = np.arange(1 << _SHIFT, dtype=np.int32)
+        sub = np.stack([x.ravel() for x in np.meshgrid(off, off, off, indexing="ij")], axis=-1)  # (64, 3)
+        base = np.stack([(cells >> (2 * _BITS)) & (_N - 1), (cells >> _BITS) & (_N - 1), cells & (_N - 1)], axis=-1) << _SHIFT
+        colors = base[:, None, :] + sub                       # (n, 64, 3)
+        d = ((colors[:, :, None, :] - pal[ks][:, None, :, :]) ** 2).sum(axis=-1)  # (n, 64, m+1)
+        sub_idx = np.take_along_axis(ks[:, None, :], d.argmin(axis=-1)[..., None], axis=-1)[..., 0]
+        return best, slot, sub_idx.ravel()
+
+    @staticmethod
+    def _index(rgb: np.ndarray) -> np.ndarray:
+        """(..., 3) uint8 → 量化立方體索引 (...,) int32"""
+        q = np.asarray(rgb, dtype=np.uint8)[..., :3] >> _SHIFT
+        idx = q[..., 0].astype(np.int32) << (2 * _BITS)
+        idx |= q[..., 1].astype(np.int32) << _BITS
+        idx |= q[..., 2]
+        return idx
+
+    def decode(self, rgb_arr: np.ndarray, rows: int = 16) -> np.ndarray:
+        """
+        ### 整張雷達圖 → dBZ 格點
+        #### para:
+        - rgb_arr: (H, W, 3) 或 (H, W, 4) uint8 陣列
+        - rows: 每批處理的列數（讓暫存陣列留在 CPU cache 內）
+        #### return:
+        - (H, W) int8 dBZ
+        """
+        arr = np.asarray(rgb_arr, dtype=np.uint8)
+        h, w = arr.shape[:2]
+        out = np.empty((h, w), dtype=np.int8)
+        idx = np.empty((rows, w), dtype=np.int32)
+        tmp = np.empty_like(idx)
+        for y in range(0, h, rows):
+            blk = arr[y:y + rows]
+            n = blk.shape[0]
+            i, t = idx[:n], tmp[:n]
+            np.right_shift(blk[..., 0], _SHIFT, out=i, casting="unsafe")
+            np.left_shift(i, 2 * _BITS, out=i)
+            np.right_shift(blk[..., 1], _SHIFT, out=t, casting="unsafe")
+            np.left_shift(t, _BITS, out=t)
+            i |= t
+            np.right_shift(blk[..., 2], _SHIFT, out=t, casting="unsafe")
+            i |= t
+            o = out[y:y + n]
+            self.lut.take(i, out=o)
+            amb = o == _AMBIGUOUS
+            if amb.any():
+                px = blk[amb]
+                sub = ((px[:, 0] & 3).astype(np.int32) << 4) | ((px[:, 1] & 3).astype(np.int32) << 2) | (px[:, 2] & 3)
+                o[amb] = self._sub_lut[self._slot[i[amb]] * _SUB + sub]
+        return out
+
+    @property
+    def rgb_table(self) -> np.ndarray:
+        """(256, 3) uint8：int8 dBZ 的位元組值 → RGB（可直接當 PIL "P" 模式的調色盤）"""
+        return self._rgb_lut
+
+    def colorize(self, dbz: np.ndarray) -> np.ndarray:
+        """(...) int8 dBZ 格點 → (..., 3) uint8 RGB（decode 的反向；一次 take）"""
+        return self._rgb_lut.take(np.asarray(dbz, dtype=np.int8).view(np.uint8), axis=0)
+
+    def nearest(self, rgb: tuple) -> Tuple[int, tuple]:
+        """
+        ### 單一像素查表
+        #### para:
+        - rgb: (R, G, B)
+        #### return:
+        - (dbz, (R, G, B))：最接近的色階
+        """
+        cell = int(self._index(np.array(rgb[:3], dtype=np.uint8)))
+        k = self._lut_idx[cell] if self._slot[cell] < 0 else int(self._exact_idx(np.array(rgb[:3]))[()])
+        return int(self.dbz[k]), tuple(int(c) for c in self.rgb[k])
+
+
+@lru_cache(maxsize=None)
+def get_palette_decoder(path: str | Path = SCALE_PATH) -> PaletteDecoder:
+    """讀取色階 YAML 並建立解碼器（每個 process 只建一次）。"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    return PaletteDecoder(data["rain_intensity_scale"])
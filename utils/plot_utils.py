@@ -1,18 +1,51 @@
 # --- plot_tool.py ---
-from typing import Optional
-from PIL import ImageDraw
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
 
-def render_preview_pil(img, px: int, py: int, marker_radius_px: Optional[int] = None):
-    """在完整雷達圖上畫紅點。"""
-    out = img.copy()
-    draw = ImageDraw.Draw(out)
+from utils.palette import get_palette_decoder
 
-    r = marker_radius_px or 2
+def _draw_marker(img, px: float, py: float, r: int):
     # 亮紅填滿 + 深紅描邊
-    draw.ellipse(
+    ImageDraw.Draw(img).ellipse(
         (px - r, py - r, px + r, py + r),
         fill=(255, 36, 36),
         outline=(220, 0, 0),
         width=2,
     )
-    return out
\ No newline at end of file
+
+def render_preview_pil(img, px: int, py: int, marker_radius_px: Optional[int] = None):
+    """在完整雷達圖上畫紅點。"""
+    out = img.copy()
+    _draw_marker(out, px, py, marker_radius_px or 2)
+    return out
+
+def render_preview_window(
+    img,
+    px: int,
+    py: int,
+    half_px: int,
+    max_side: int = 800,
+    marker_radius_px: Optional[int] = None,
+) -> Tuple[Image.Image, Tuple[int, int, float]]:
+    """
+    ### 只裁出 (px, py) 周圍 ±half_px 的視窗並畫紅點
+    - img 可為 PIL.Image，或已解碼的 (H, W) int8 dBZ 格點（裁切後以色階上色，不必重開、重解 PNG）
+    - 先裁切再轉 RGB，不複製整張 3600×3600
+    - 視窗邊長超過 max_side 時以最近鄰縮小（保留色階）
+    #### return:
+    - (預覽圖, (x0, y0, scale))：原圖座標 = 視窗座標 / scale + (x0, y0)
+    """
+    h, w = img.shape[:2] if isinstance(img, np.ndarray) else img.size[::-1]
+    x0, y0 = max(0, px - half_px), max(0, py - half_px)
+    x1, y1 = min(w, px + half_px + 1), min(h, py + half_px + 1)
+    if isinstance(img, np.ndarray):
+        out = Image.fromarray(get_palette_decoder().colorize(img[y0:y1, x0:x1]), "RGB")
+    else:
+        out = img.crop((x0, y0, x1, y1)).convert("RGB")
+
+    scale = min(1.0, max_side / max(out.size))
+    if scale < 1.0:
+        out = out.resize((max(1, round(out.width * scale)), max(1, round(out.height * scale))), Image.NEAREST)
+    _draw_marker(out, (px - x0) * scale, (py - y0) * scale, marker_radius_px or 3)
+    return out, (x0, y0, scale)
@@ -0,0 +1,145 @@
+# utils/route.py
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from check_rain import check_rain_many, forecast_many, _RAIN_CLASS_NODATA, _RAIN_DESC, _dbz_to_rain_class
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_STEP_M = 500        # 沿路取樣間距
+DEFAULT_SEGMENT_KM = 5      # 雨勢剖面的分段長度
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """兩組經緯度（可為陣列）間的大圓距離（公尺）"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def resample_polyline(lats, lons, step_m: float = DEFAULT_STEP_M) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ### 折線依固定距離重新取樣（含起訖點）
+    #### para:
+    - lats, lons: 折線頂點
+    - step_m: 取樣間距（公尺）
+    #### return:
+    - (lats, lons, 累積距離 m)
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    cum = np.concatenate(([0.0], np.cumsum(haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:]))))
+    total = cum[-1]
+    dist = np.append(np.arange(0.0, total, float(step_m)), total) if total > 0 else np.zeros(1)
+    # 頂點間以經緯度線性內插（500 m 等級的間距誤差可忽略）
+    return np.interp(dist, cum, lats), np.interp(dist, cum, lons), dist
+
+
+def sample_count(lats, lons, step_m: float = DEFAULT_STEP_M) -> int:
+    """resample_polyline 會產生的取樣點數（只算折線長度，不內插；可先拿來擋太長的路線）"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    total = float(haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:]).sum())
+    return int(np.ceil(total / float(step_m))) + 1 if total > 0 else 1
+
+
+def straight_line(origin: Tuple[float, float], destination: Tuple[float, float]) -> np.ndarray:
+    """沒有路線資料時的退路：起訖點直線"""
+    return np.array([origin, destination], dtype=np.float64)
+
+
+def get_route(origin: Tuple[float, float], destination: Tuple[float, float], mode: str = "driving") -> Tuple[np.ndarray, str]:
+    """
+    ### 取得 A→B 路線折線
+    #### return:
+    - ((N, 2) 的 [lat, lon] 陣列, 來源 "directions" | "straight")
+    """
+    try:
+        from locate.google_maps_client import directions_polyline
+        pts = directions_polyline(origin, destination, mode=mode)
+    except Exception as e:
+        print(f"[route] Directions 失敗，改用直線：{e}")
+        pts = []
+    if len(pts) >= 2:
+        return np.asarray(pts, dtype=np.float64), "directions"
+    return straight_line(origin, destination), "straight"
+
+
+def route_rain_profile(
+    polyline,
+    *,
+    step_m: float = DEFAULT_STEP_M,
+    segment_km: float = DEFAULT_SEGMENT_KM,
+    cfg_path: str = "./config.yaml",
+    store_backend: Optional[str] = None,
+    forecast: bool = False,
+    radius_km: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    ### 沿路線取樣雨勢
+    - 重新取樣後一次丟給 check_rain_many（每站一次取圖、一次投影）
+    - 依 segment_km 分段，取每段最大 dBZ
+    #### para:
+    - polyline: (N, 2) 的 [lat, lon]
+    #### return:
+    - samples：check_rain_many 的欄位式結果 + dist_km
+    - segments：start_km, end_km, max_dbz, mean_dbz, rain_class, desc（長度 S 的陣列；整段無資料時 dBZ 為 NaN、desc 為「無資料」）
+      radius_km 有給時另有 coverage（路線兩側 radius_km 內平均有雨比例）、area_rain_class、area_desc
+    - worst：最大 dBZ 的分段索引
+    - length_km
+    - forecast（forecast=True 且有預報時）：lead_min (L,)、各分段各時效最大 dBZ (L, S)
+    """
+    pts = np.asarray(polyline, dtype=np.float64).reshape(-1, 2)
+    lats, lons, dist = resample_polyline(pts[:, 0], pts[:, 1], step_m)
+    samples = check_rain_many(
+        np.column_stack([lats, lons]), radius_km=radius_km, cfg_path=cfg_path, store_backend=store_backend
+    )
+    dist_km = dist / 1000.0
+    samples["dist_km"] = dist_km
+
+    length_km = float(dist_km[-1])
+    n_seg = max(1, int(np.ceil(length_km / segment_km)))
+    seg = np.minimum((dist_km // segment_km).astype(np.int64), n_seg - 1)
+    valid = samples["rain_class"] != _RAIN_CLASS_NODATA   # 沒有雷達涵蓋的取樣點不算進分段統計
+    dbz = samples["dbz"].astype(np.float32)
+    max_dbz = np.full(n_seg, -np.inf, dtype=np.float32)
+    np.maximum.at(max_dbz, seg[valid], dbz[valid])
+    n_valid = np.bincount(seg[valid], minlength=n_seg)
+    mean_dbz = (np.bincount(seg[valid], weights=np.maximum(dbz[valid], 0), minlength=n_seg) / np.maximum(n_valid, 1)).astype(np.float32)
+    max_dbz[n_valid == 0] = np.nan
+    mean_dbz[n_valid == 0] = np.nan
+    cls = _dbz_to_rain_class(max_dbz)   # 整段都沒有資料 → 無資料
+
+    start_km = np.arange(n_seg) * float(segment_km)
+    segments = {
+        "start_km": start_km,
+        "end_km": np.minimum(start_km + segment_km, length_km),
+        "max_dbz": max_dbz,
+        "mean_dbz": mean_dbz,
+        "rain_class": cls,
+        "desc": _RAIN_DESC[cls],
+    }
+    if radius_km:
+        area_cls = np.zeros(n_seg, dtype=np.int8)
+        np.maximum.at(area_cls, seg[valid], samples["area_max_class"][valid])
+        area_cls[n_valid == 0] = _RAIN_CLASS_NODATA
+        coverage = np.bincount(seg[valid], weights=samples["area_coverage"][valid], minlength=n_seg) / np.maximum(n_valid, 1)
+        coverage[n_valid == 0] = np.nan
+        segments["coverage"] = coverage.astype(np.float32)
+        segments["area_rain_class"] = area_cls
+        segments["area_desc"] = _RAIN_DESC[area_cls]
+
+    fc = forecast_many(np.column_stack([lats, lons]), cfg_path=cfg_path) if forecast else None
+    if fc is not None:
+        fc_max = np.full((len(fc["lead_min"]), n_seg), -np.inf, dtype=np.float32)
+        np.maximum.at(fc_max, (slice(None), seg), np.nan_to_num(fc["dbz"], nan=-np.inf))
+        fc_max[~np.isfinite(fc_max)] = np.nan
+        fc = {"base_time": fc["base_time"], "lead_min": fc["lead_min"], "max_dbz": fc_max}
+    return {
+        "samples": samples,
+        "segments": segments,
+        "worst": int(np.argmax(np.nan_to_num(max_dbz, nan=-np.inf))),   # 全線無資料時為第 0 段
+        "length_km": length_km,
+        "forecast": fc,
+    }
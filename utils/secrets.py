@@ -0,0 +1,27 @@
+# utils/secrets.py
+from __future__ import annotations
+import os
+from typing import Optional
+
+_MISSING = object()
+
+
+def get_secret(name: str, default=_MISSING) -> Optional[str]:
+    """
+    ### 讀取金鑰（環境變數優先，其次 st.secrets）
+    - 背景排程 / HTTP 服務不需要 Streamlit，直接用環境變數即可
+    - Streamlit 只有在環境變數沒有時才 import
+    #### para:
+    - name: 例如 "HF_TOKEN"、"CWA_API_KEY"
+    - default: 找不到時的回傳值（未給 → KeyError）
+    """
+    v = os.environ.get(name)
+    if v:
+        return v
+    try:
+        import streamlit as st
+        return st.secrets[name]
+    except Exception:
+        if default is _MISSING:
+            raise KeyError(f"找不到金鑰 {name}（請設定環境變數或 .streamlit/secrets.toml）")
+        return default
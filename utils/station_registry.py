@@ -0,0 +1,176 @@
+# utils/station_registry.py
+from __future__ import annotations
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from locate.location import aeqd_to_pixel, make_aeqd_transform
+from utils.config_loader import load_config
+
+# 單站雷達 PNG 幾何（CWA O-A0084-***）
+DEFAULT_IMAGE_H = 3600
+DEFAULT_IMAGE_W = 3600
+DEFAULT_PX_PER_KM = 11.97
+
+# 台灣周邊的歸屬網格範圍 (lon_min, lat_min, lon_max, lat_max) 與解析度
+TAIWAN_BBOX = (118.0, 21.0, 123.0, 26.5)
+OWNER_RES_DEG = 0.02
+_AMBIGUOUS = -1
+
+
+@dataclass(frozen=True)
+class RadarStation:
+    """單一雷達站：中心、影像幾何與預先建好的 AEQD 轉換器。"""
+    id: str
+    name: str
+    lat: float
+    lon: float
+    h: int = DEFAULT_IMAGE_H
+    w: int = DEFAULT_IMAGE_W
+    scale: float = DEFAULT_PX_PER_KM  # pixel/km
+    fwd: Any = field(default=None, repr=False, compare=False)
+    inv: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def radar_cfg(self) -> Dict[str, Any]:
+        """與 latlon_to_pixel 相容的 radar_cfg dict。"""
+        return {"lat0": self.lat, "lon0": self.lon, "h": self.h, "w": self.w, "scale": self.scale}
+
+    def to_aeqd(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        E, N = self.fwd.transform(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+        return np.asarray(E), np.asarray(N)
+
+    def to_pixel(self, lats, lons, return_inside: bool = False):
+        """
+        ### 經緯度（可為陣列）→ 影像內像素座標
+        #### para:
+        - return_inside: True → 另回傳夾住之前是否落在影像內（超出雷達圖範圍的點為 False）
+        #### return:
+        - (px, py): int64 陣列，已夾在影像範圍內；return_inside 時為 (px, py, inside)
+        """
+        E, N = self.to_aeqd(lats, lons)
+        x, y = aeqd_to_pixel(E, N, self.radar_cfg)
+        x, y = np.rint(x).astype(np.int64), np.rint(y).astype(np.int64)
+        px = np.clip(x, 0, self.w - 1)
+        py = np.clip(y, 0, self.h - 1)
+        if return_inside:
+            return px, py, (px == x) & (py == y)
+        return px, py
+
+
+def stations_from_config(cfg: Dict[str, Any]) -> List[RadarStation]:
+    """cfg['fileapi']['datasets'] 中有經緯度的站 → RadarStation 清單（不建歸屬網格）"""
+    stations = []
+    for d in cfg["fileapi"]["datasets"]:
+        if not isinstance(d, dict) or "lat" not in d or "lon" not in d:
+            continue
+        fwd, inv = make_aeqd_transform(d["lat"], d["lon"])
+        stations.append(RadarStation(
+            id=d["id"],
+            name=d.get("name", d["id"]),
+            lat=float(d["lat"]),
+            lon=float(d["lon"]),
+            h=int(d.get("image_h", DEFAULT_IMAGE_H)),
+            w=int(d.get("image_w", DEFAULT_IMAGE_W)),
+            scale=float(d.get("px_per_km", DEFAULT_PX_PER_KM)),
+            fwd=fwd,
+            inv=inv,
+        ))
+    return stations
+
+
+class StationRegistry:
+    """
+    ### 雷達站註冊表（由 load_config 建一次）
+    - stations：RadarStation 清單（含 AEQD 轉換器）
+    - 歸屬網格：台灣範圍內每格最近的雷達站索引；
+      四個角點歸屬不一致的格子標為 -1，查詢時改用精確距離（結果與逐站比距離相同）
+    """
+
+    def __init__(
+        self,
+        stations: List[RadarStation],
+        *,
+        cfg: Optional[Dict[str, Any]] = None,
+        bbox: Tuple[float, float, float, float] = TAIWAN_BBOX,
+        res_deg: float = OWNER_RES_DEG,
+    ):
+        if not stations:
+            raise ValueError("StationRegistry 需要至少一個雷達站")
+        self.stations = stations
+        self.by_id = {s.id: s for s in stations}
+        self.cfg = cfg or {}
+        self.bbox = bbox
+        self.res_deg = float(res_deg)
+        self.owner = self._build_owner_raster()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "StationRegistry":
+        return cls(stations_from_config(cfg), cfg=cfg)
+
+    # ---------- 精確（逐站比距離） ----------
+    def _nearest_exact(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        d2 = np.empty((len(self.stations), lats.size))
+        for k, s in enumerate(self.stations):
+            E, N = s.to_aeqd(lats, lons)
+            d2[k] = E**2 + N**2
+        return np.argmin(d2, axis=0).astype(np.int8)
+
+    def _build_owner_raster(self) -> np.ndarray:
+        lon_min, lat_min, lon_max, lat_max = self.bbox
+        nx = int(round((lon_max - lon_min) / self.res_deg))
+        ny = int(round((lat_max - lat_min) / self.res_deg))
+        # 角點 (ny+1, nx+1) 的歸屬
+        glon, glat = np.meshgrid(
+            lon_min + np.arange(nx + 1) * self.res_deg,
+            lat_min + np.arange(ny + 1) * self.res_deg,
+        )
+        corner = self._nearest_exact(glat.ravel(), glon.ravel()).reshape(ny + 1, nx + 1)
+        owner = corner[:-1, :-1].copy()
+        mixed = (owner != corner[1:, :-1]) | (owner != corner[:-1, 1:]) | (owner != corner[1:, 1:])
+        owner[mixed] = _AMBIGUOUS
+        return owner
+
+    # ---------- 查詢 ----------
+    def owner_index(self, lats, lons) -> np.ndarray:
+        """
+        ### 多點 → 服務雷達站索引（self.stations 的位置）
+        #### para:
+        - lats, lons: 經緯度陣列
+        #### return:
+        - int8 陣列
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lon_min, lat_min = self.bbox[0], self.bbox[1]
+        ny, nx = self.owner.shape
+        j = np.floor((lons - lon_min) / self.res_deg).astype(np.int64)
+        i = np.floor((lats - lat_min) / self.res_deg).astype(np.int64)
+        inside = (i >= 0) & (i < ny) & (j >= 0) & (j < nx)
+
+        out = np.full(lats.shape, _AMBIGUOUS, dtype=np.int8)
+        out[inside] = self.owner[i[inside], j[inside]]
+        todo = np.flatnonzero(out == _AMBIGUOUS)
+        if todo.size:
+            out[todo] = self._nearest_exact(lats[todo], lons[todo])
+        return out
+
+    def select(self, lat: float, lon: float) -> RadarStation:
+        """單點 → 最近雷達站"""
+        return self.stations[int(self.owner_index(lat, lon)[0])]
+
+
+@lru_cache(maxsize=8)
+def _build_registry(path: str, mtime_ns: int) -> StationRegistry:
+    return StationRegistry.from_config(load_config(path))
+
+
+def get_station_registry(cfg_path: str | Path = "config.yaml") -> StationRegistry:
+    """取得 config 對應的註冊表（config 檔未變動時直接重用）。"""
+    p = str(Path(cfg_path).resolve())
+    mtime_ns = os.stat(p).st_mtime_ns if os.path.exists(p) else 0
+    return _build_registry(p, mtime_ns)
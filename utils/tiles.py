@@ -0,0 +1,114 @@
+# utils/tiles.py
+from __future__ import annotations
+import io
+import json
+import zipfile
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from utils.palette import get_palette_decoder
+
+DEFAULT_TILE_PX = 256
+_NODATA = -128  # 縮小時補邊用（比任何 dBZ 都小，不影響取最大值）
+MANIFEST = "manifest.json"
+
+
+def _levels(w: int, h: int, tile_px: int) -> List[Dict[str, int]]:
+    """z=0 為原始解析度，每層長寬減半，直到整張圖塞進一塊 tile"""
+    levels, z = [], 0
+    while True:
+        lw, lh = -(-w // (1 << z)), -(-h // (1 << z))
+        levels.append({"z": z, "w": lw, "h": lh, "cols": -(-lw // tile_px), "rows": -(-lh // tile_px)})
+        if max(lw, lh) <= tile_px:
+            return levels
+        z += 1
+
+
+def _downsample_max(dbz: np.ndarray) -> np.ndarray:
+    """每 2×2 取最大 dBZ（保留強回波核心，不會把色階混成不存在的顏色）；奇數邊以 NODATA 補齊"""
+    h, w = dbz.shape
+    if h % 2 or w % 2:
+        dbz = np.pad(dbz, ((0, h % 2), (0, w % 2)), constant_values=_NODATA)
+    return dbz.reshape(dbz.shape[0] // 2, 2, dbz.shape[1] // 2, 2).max(axis=(1, 3))
+
+
+def build_tile_pack(src: np.ndarray | bytes | Image.Image, tile_px: int = DEFAULT_TILE_PX) -> bytes:
+    """
+    ### 單張雷達圖 → tile 金字塔（zip，ingest 時每張新圖做一次）
+    - src：(H, W) int8 dBZ 格點；給 PNG bytes / PIL.Image 時先以色階解碼
+    - 在 dBZ 格點上逐層 2×2 取最大值縮小，再以色階上色（調色盤 PNG）；不在 RGB 上平均，
+      避免縮小後出現色階之間的混色
+    - {z}/{row}_{col}.png：第 z 層（縮小 2^z 倍）的 tile_px × tile_px 圖塊，座標為雷達 AEQD 像素空間
+    - manifest.json：原圖尺寸、tile_px、各層 rows / cols
+    #### return:
+    - zip bytes（PNG 已壓縮，zip 只打包不再壓）
+    """
+    pal = get_palette_decoder()
+    if isinstance(src, np.ndarray):
+        dbz = np.asarray(src, dtype=np.int8)
+    else:
+        img = src if isinstance(src, Image.Image) else Image.open(io.BytesIO(src))
+        dbz = pal.decode(np.asarray(img.convert("RGB")))
+    h, w = dbz.shape
+    levels = _levels(w, h, tile_px)
+    palette = pal.rgb_table.tobytes()
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        level = dbz
+        for lv in levels:
+            if lv["z"] > 0:
+                level = _downsample_max(level)
+            for r in range(lv["rows"]):
+                for c in range(lv["cols"]):
+                    # 右 / 下緣的 tile 可能不滿 tile_px
+                    block = np.ascontiguousarray(level[r * tile_px:(r + 1) * tile_px, c * tile_px:(c + 1) * tile_px])
+                    tile = Image.frombytes("P", block.shape[::-1], block.view(np.uint8).tobytes())
+                    tile.putpalette(palette)
+                    out = io.BytesIO()
+                    tile.save(out, format="PNG")
+                    zf.writestr(f"{lv['z']}/{r}_{c}.png", out.getvalue())
+        zf.writestr(MANIFEST, json.dumps({"w": w, "h": h, "tile_px": tile_px, "levels": levels}))
+    return buf.getvalue()
+
+
+class TilePack:
+    """讀取 build_tile_pack 產生的 zip；只解出用得到的 tile"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._zf = zipfile.ZipFile(io.BytesIO(data))
+        self.manifest: Dict[str, Any] = json.loads(self._zf.read(MANIFEST))
+        self.tile_px: int = self.manifest["tile_px"]
+        self.levels: List[Dict[str, int]] = self.manifest["levels"]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def tile(self, z: int, row: int, col: int) -> bytes:
+        return self._zf.read(f"{z}/{row}_{col}.png")
+
+    def tile_box(self, z: int, row: int, col: int) -> Tuple[int, int, int, int]:
+        """tile 在原圖像素空間的 (x, y, w, h)"""
+        lv, t = self.levels[z], self.tile_px
+        tw, th = min(t, lv["w"] - col * t), min(t, lv["h"] - row * t)
+        return (col * t) << z, (row * t) << z, tw << z, th << z
+
+    def level_for(self, span_px: float, out_px: int) -> int:
+        """原圖 span_px 寬的視窗要以約 out_px 顯示 → 夠用的最粗一層"""
+        z = 0
+        while z + 1 < len(self.levels) and span_px / (1 << (z + 1)) >= out_px:
+            z += 1
+        return z
+
+    def visible(self, z: int, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[int, int]]:
+        """原圖像素範圍 [x0, x1] × [y0, y1] 在第 z 層涵蓋的 (row, col)"""
+        lv, size = self.levels[z], self.tile_px << z
+        c0, c1 = max(0, int(x0 // size)), min(lv["cols"] - 1, int(x1 // size))
+        r0, r1 = max(0, int(y0 // size)), min(lv["rows"] - 1, int(y1 // size))
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                yield r, c